@@ -2,22 +2,31 @@
 # -*- coding: utf-8 -*-
 import os
 import time
-import glob
-import yaml
 import random
 import pygame
+import numpy as np
+from collections import OrderedDict
 from datetime import datetime as dt
 from lib.panels import MainPanel, NightPanel, NewsPanel, SearchPanel, \
     SystemInfoPanel, StockPanel, MapPanel, CameraPanel, GamePanel, \
     CalculatorPanel, QRCodePanel
 from lib.backgrounds import Background, DynamicImage, \
     DynamicTriangle, DynamicTrace, VideoPlayer
+from lib.assets import assets
+from lib.settings import SettingsStore
+from lib.watchlist import StockScheduler
+from lib.metrics import MetricsCollector
+from lib.exporter import MetricsExporter, registry
+from lib.profiler import FrameProfiler, StartupTimer
+from lib.replay import EventRecorder, EventReplayer
 from lib.util import log_to_file, shift_pressed, ctrl_pressed
 
 
 class App:
-    def __init__(self, args=None):
-        pygame.init()
+    def __init__(self, args=None, setting_file='settings.yaml'):
+        self.startup_timer = StartupTimer()
+        with self.startup_timer.section("pygame"):
+            pygame.init()
 
         self.args = args
 
@@ -28,16 +37,23 @@ class App:
         self._normal_frame_rate = 60 if self._performance_mode else 10
         self._game_frame_rate = 60 if self._performance_mode else 30
         self._frame_rate = self._normal_frame_rate
+
+        # game logic advances in fixed steps of logic time, however long the frames take to draw
+        self._tick_interval = 1.0 / self._game_frame_rate
+        self._max_ticks = max(int(0.25 / self._tick_interval), 1)
+        self._tick_time = 0
+        self._last_tick_update = time.time()
         self._fullscreen = self.args.fullscreen if self.args else False
         self._debug_mode = self.args.debug if self.args else False
         self._dryrun_timeout = self.args.dryrun if self.args else -1
         self._dryrun_background_timeout = 2
         self._dryrun_background_last_update = time.time()
 
-        if self._fullscreen:
-            self.display = pygame.display.set_mode(self._screen_size, pygame.FULLSCREEN)
-        else:
-            self.display = pygame.display.set_mode(self._screen_size)
+        with self.startup_timer.section("display"):
+            if self._fullscreen:
+                self.display = pygame.display.set_mode(self._screen_size, pygame.FULLSCREEN)
+            else:
+                self.display = pygame.display.set_mode(self._screen_size)
 
         self._window_icon = pygame.image.load(os.path.join('images', 'icon', 'small-rpi.png')).convert_alpha()
         pygame.display.set_icon(self._window_icon)
@@ -46,39 +62,78 @@ class App:
         self.screen = pygame.Surface(self._screen_size)
         self._invert_screen = self.args.invert if self.args else False
 
-        self._setting_file = 'settings.yaml'
-        self._settings = None
-        self._load_settings()
+        self._setting_file = setting_file
+        self.settings = SettingsStore(setting_file)
+        self.settings.start()
+
+        assets.cache_directory = self.get_setting('asset_cache_directory', default='asset_cache')
 
         self._main_brightness = self.get_setting('main_brightness', default=9)
         self._night_brightness = self.get_setting('night_brightness', default=3)
 
         self._done = False
 
+        # a replay runs on the recorded clock with the recorded seed, so every frame sees what it saw
+        self._frame_index = 0
+        self.recorder = None
+        self.replayer = None
+        self._replay_speed = self.args.replay_speed if self.args else "real"
+        seed = self.args.seed if self.args else None
+        if self.args and self.args.replay:
+            self.replayer = EventReplayer(self.args.replay)
+            self.replayer.install()
+            seed = self.replayer.seed
+        if seed is None:
+            seed = random.randrange(2 ** 32)
+        random.seed(seed)
+        np.random.seed(seed)
+        if self.args and self.args.record:
+            self.recorder = EventRecorder(self.args.record, seed, time.time())
+
         self._mouse_last_move = time.time()
         self._mouse_timeout = 5
+
+        # static screens are only redrawn a few times a second, or right away on input
+        self._idle_frame_rate = self.get_setting('idle_frame_rate', default=2)
+        self._idle_timeout = 3
+        self._last_input = time.time()
+        self._wake_event = pygame.USEREVENT + 1
+        self._game_running = False
+        self._input_events = (pygame.KEYDOWN, pygame.KEYUP, pygame.MOUSEMOTION, pygame.MOUSEBUTTONDOWN,
+                              pygame.MOUSEBUTTONUP)
         self._mouse_visible = False
         pygame.mouse.set_cursor(*pygame.cursors.arrow)
 
         self.clock = pygame.time.Clock()
-
-        self.main_panel = MainPanel(self)
-        self.main_panel.always_update = True
-        self.night_panel = NightPanel(self)
-        self.news_panel = NewsPanel(self)
-        self.news_panel.always_update = True
-        self.search_panel = SearchPanel(self)
-        self.system_info_panel = SystemInfoPanel(self)
-        self.system_info_panel.always_update = True
-        self.stock_panel = StockPanel(self)
-        self.map_panel = MapPanel(self)
-        self.camera_panel = CameraPanel(self)
-        self.game_panel = GamePanel(self)
-        self.calculator_panel = CalculatorPanel(self)
-        self.qrcode_panel = QRCodePanel(self)
-        self.panels = [self.main_panel, self.night_panel, self.news_panel, self.search_panel,
-                       self.system_info_panel, self.stock_panel, self.map_panel, self.camera_panel,
-                       self.game_panel, self.calculator_panel, self.qrcode_panel]
+        self.profiler = FrameProfiler(enabled=(self.args.profile or self.replayer is not None) if self.args else False)
+
+        self.stock_scheduler = StockScheduler(keys=self.get_setting('stock_api_keys', default=None),
+                                              cache_directory=self.get_setting('stock_cache_directory',
+                                                                               default='stock_cache'))
+        self.stock_scheduler.start()
+
+        self.metrics = MetricsCollector(interval=self.get_setting('metrics_interval', default=0.5),
+                                        history_path=self.get_setting('metrics_history_file', default=None))
+        self.metrics.start()
+
+        self.exporter = None
+        metrics_port = self.args.metrics_port if self.args else None
+        metrics_file = self.args.metrics_file if self.args else None
+        if metrics_port is not None or metrics_file:
+            self.exporter = MetricsExporter(collector=self.metrics, port=metrics_port, textfile=metrics_file)
+            self.exporter.start()
+
+        # panels are built the first time they are used, see __getattr__; the ones that keep
+        # updating in the background are built right after the first frame, one per frame
+        self._panel_types = OrderedDict([
+            ("main_panel", MainPanel), ("night_panel", NightPanel), ("news_panel", NewsPanel),
+            ("search_panel", SearchPanel), ("system_info_panel", SystemInfoPanel),
+            ("stock_panel", StockPanel), ("map_panel", MapPanel), ("camera_panel", CameraPanel),
+            ("game_panel", GamePanel), ("calculator_panel", CalculatorPanel), ("qrcode_panel", QRCodePanel)
+        ])
+        self._always_update_panels = ["main_panel", "news_panel", "system_info_panel"]
+        self._preload_panels = ["news_panel", "system_info_panel"]
+        self.panels = []
         self.active_panel = None
 
         self.blank_background = Background(width=self._screen_width,
@@ -124,23 +179,70 @@ class App:
 
         self._frame_rate_font = pygame.font.Font('fonts/FreeSans.ttf', 15)
         self._actual_frame_rate = 0
-        self._frame_last_update = time.time()
         self._frame_text_last_update = time.time()
 
         self._start_time = time.time()
 
         self._setup()
 
+    def __getattr__(self, name):
+        # only called for attributes that don't exist yet, which is how panels get built on first use
+        panel_types = self.__dict__.get("_panel_types")
+        if panel_types is None or name not in panel_types:
+            raise AttributeError("'{}' object has no attribute '{}'".format(type(self).__name__, name))
+        return self._create_panel(name)
+
+    def _create_panel(self, name):
+        start_time = time.perf_counter()
+        panel = self._panel_types[name](self)
+        panel.always_update = name in self._always_update_panels
+        setattr(self, name, panel)
+        panel.setup()
+        elapsed = time.perf_counter() - start_time
+
+        self.panels = [self.__dict__[panel_name] for panel_name in self._panel_types if panel_name in self.__dict__]
+        if name in self._preload_panels:
+            self._preload_panels.remove(name)
+        if self._frame_index:
+            log_to_file("Created {} in {:.0f} ms".format(name, elapsed * 1000))
+        else:
+            self.startup_timer.record(name, elapsed)
+        return panel
+
+    def load_panels(self):
+        """Build every panel that hasn't been used yet"""
+        for name in self._panel_types:
+            getattr(self, name)
+        return self.panels
+
+    def _preload_panel(self):
+        if self._preload_panels and not self._game_running:
+            getattr(self, self._preload_panels[0])
+
     def _setup(self):
-        if self.backgrounds:
-            self.backgrounds[self._background_type].enter()
+        with self.startup_timer.section("background"):
+            if self.backgrounds:
+                self.backgrounds[self._background_type].enter()
 
-        for panel in self.panels:
-            panel.setup()
         self.set_active_panel(self.main_panel)
 
+    def _get_events(self):
+        if self.replayer:
+            # only closing the window is taken from the devices while replaying
+            events = [event for event in pygame.event.get() if event.type == pygame.QUIT]
+            events += self.replayer.get_events(self._frame_index)
+        else:
+            events = [event for event in pygame.event.get() if event.type != self._wake_event]
+
+        if self.recorder:
+            self.recorder.record(time.time(), events)
+        return events
+
     def _handle_events(self):
-        for event in pygame.event.get():
+        for event in self._get_events():
+            if event.type in self._input_events:
+                self._last_input = time.time()
+
             handled = self.active_panel.handle_events(event)
 
             if event.type == pygame.QUIT:
@@ -150,6 +252,10 @@ class App:
                 if event.key == pygame.K_q and ctrl_pressed():
                     self._done = True
                     return
+                elif event.key == pygame.K_F11:
+                    self.profiler.toggle_overlay()
+                elif event.key == pygame.K_F12:
+                    self.profiler.dump()
             
             if event.type == pygame.KEYDOWN and \
                self.active_panel is self.main_panel and \
@@ -187,15 +293,18 @@ class App:
     def _draw_screen(self):
         self.screen.fill((0, 0, 0))
 
-        self._draw_background(self.screen)
+        with self.profiler.section("background draw"):
+            self._draw_background(self.screen)
         self.active_panel.draw(self.screen)
         if self._debug_mode:
             self._draw_frame_rate(self.screen)
+        self.profiler.draw(self.screen)
         if self._invert_screen:
             self.screen = pygame.transform.rotate(self.screen, 180)
         self.display.blit(self.screen, (0, 0))
 
-        pygame.display.flip()
+        with self.profiler.section("flip"):
+            pygame.display.flip()
 
     def _update_screen(self):
         current_time = time.time()
@@ -203,27 +312,23 @@ class App:
         if self._mouse_visible and current_time - self._mouse_last_move > self._mouse_timeout:
             self._set_mouse_visible(False)
 
-        self.backgrounds[self._background_type].update()
+        with self.profiler.section("background update"):
+            self.backgrounds[self._background_type].update()
 
         for panel in self.panels:
             if panel == self.active_panel or panel.is_always_update():
                 panel.update()
 
     def _toggle_background_type(self, reverse=False):
-        self.backgrounds[self._background_type].exit()
-        if reverse:
-            self._background_type -= 1
-        else:
-            self._background_type += 1
-        
-        total_backgrounds = len(self.backgrounds)
-        if self._background_type >= total_backgrounds:
-            self._background_type = 0
-        elif self._background_type < 0:
-            self._background_type = total_backgrounds - 1
+        background_type = self._background_type - 1 if reverse else self._background_type + 1
+        self.set_background_type(background_type % len(self.backgrounds))
 
+    def set_background_type(self, background_type, save=True):
+        self.backgrounds[self._background_type].exit()
+        self._background_type = background_type
         self.backgrounds[self._background_type].enter()
-        self.set_setting('background_type', self._background_type)
+        if save:
+            self.set_setting('background_type', self._background_type)
 
     def _draw_background(self, screen):
         background_surface = pygame.Surface((self._screen_width, self._screen_height))
@@ -232,10 +337,10 @@ class App:
         self._apply_brightness(screen)
 
     def _apply_brightness(self, screen):
-        if self.active_panel is self.camera_panel:
+        if isinstance(self.active_panel, CameraPanel):
             return
 
-        brightness = self._night_brightness if self.active_panel is self.night_panel else self._main_brightness
+        brightness = self._night_brightness if isinstance(self.active_panel, NightPanel) else self._main_brightness
 
         brightness_surface = pygame.Surface((self._screen_width, self._screen_height))
         brightness_surface.fill((0, 0, 0))
@@ -245,11 +350,10 @@ class App:
 
     def _draw_frame_rate(self, screen):
         current_time = time.time()
-        update_interval = time.time() - self._frame_last_update
-        self._frame_last_update = current_time
 
+        # the clock averages the last frames, a single interval would jump around
         if current_time - self._frame_text_last_update > 1:
-            self._actual_frame_rate = int(1 / update_interval)
+            self._actual_frame_rate = int(round(self.clock.get_fps()))
             self._frame_text_last_update = current_time
 
         framerate_text = self._frame_rate_font.render('FPS: {}'.format(self._actual_frame_rate), True, (0, 255, 0))
@@ -263,50 +367,26 @@ class App:
     def _cleanup(self):
         # clean up background
         self.backgrounds[self._background_type].exit()
-        
-        # delete cached news images
-        if os.path.isdir('news_images'):
-            for image_file in glob.glob('news_images/*'):
-                os.remove(image_file)
-
-    def _load_settings(self):
-        settings = {}
-        if not os.path.isfile(self._setting_file):
-            self._settings = settings
-            return
-
-        with open(self._setting_file, 'r') as f:
-            try:
-                settings = yaml.safe_load(f)
-            except yaml.YAMLError as e:
-                print("Unable to load settings from {}".format(self._setting_file))
-
-        self._settings = settings
-
-    def _save_settings(self):
-        with open(self._setting_file, 'w') as f:
-            yaml.dump(self._settings, f)
-        log_to_file("Settings saved to {}".format(self._setting_file))
+        self.stock_scheduler.stop()
+        self.metrics.stop()
+        if self.exporter:
+            self.exporter.stop()
+        self.settings.stop()
+        if self.recorder:
+            self.recorder.close()
+        if self.replayer:
+            self.replayer.uninstall()
+            log_to_file("Replayed {} frames from {}".format(self._frame_index, self.replayer.path))
+            print(self.profiler.format_stats())
 
     def get_setting(self, name, default=None):
-        if self._settings is None:
-            log_to_file("Unable to get value for {}. Setting is not ready.".format(name))
-            return default
-
-        if name not in self._settings:
-            self._settings[name] = default
-            self._save_settings()
-
-        return self._settings[name]
+        return self.settings.get(name, default=default)
 
     def set_setting(self, name, value):
-        if self._settings is None:
-            log_to_file("Unable to set {}={}. Setting is not ready.".format(name, value))
-            return False
+        return self.settings.set(name, value)
 
-        self._settings[name] = value
-        self._save_settings()
-        return True
+    def watch_setting(self, name, callback):
+        self.settings.add_listener(name, callback)
 
     def set_active_panel(self, panel):
         if self.active_panel is not panel:
@@ -326,6 +406,7 @@ class App:
         return self._screen_height
 
     def game_frame_rate(self, status):
+        self._game_running = status
         if status:
             self._frame_rate = self._game_frame_rate
         else:
@@ -343,12 +424,76 @@ class App:
         self.set_setting("main_brightness", main)
         self.set_setting("night_brightness", night)
 
-    def start(self):
-        while not self._done:
+    def run_frame(self):
+        """Handle events, update and draw one frame without waiting for the frame rate"""
+        frame_start = time.perf_counter()
+        self.profiler.begin_frame()
+        with self.profiler.section("events"):
             self._handle_events()
+        with self.profiler.section("update"):
             self._update_screen()
-            self._draw_screen()
-            self.clock.tick(self._frame_rate)
+        with self.profiler.section("tick"):
+            self._run_ticks()
+        with self.profiler.section("draw"):
+            self.render()
+        self.profiler.end_frame()
+        registry.observe("frame_seconds", time.perf_counter() - frame_start)
+        self._frame_index += 1
+
+    def _run_ticks(self):
+        current_time = time.time()
+        self._tick_time += max(current_time - self._last_tick_update, 0)
+        self._last_tick_update = current_time
+
+        ticks = 0
+        while self._tick_time >= self._tick_interval and ticks < self._max_ticks:
+            self.tick(self._tick_interval)
+            self._tick_time -= self._tick_interval
+            ticks += 1
+
+        # after a long stall (or an idle wait) the backlog is dropped instead of fast-forwarding through it
+        if self._tick_time >= self._tick_interval:
+            self._tick_time %= self._tick_interval
+
+    def tick(self, dt):
+        """Advance background and panel logic by one fixed step"""
+        self.backgrounds[self._background_type].tick(dt)
+        for panel in self.panels:
+            if panel == self.active_panel or panel.is_always_update():
+                panel.tick(dt)
+
+    def render(self):
+        """Draw the current state as of the last tick"""
+        self._draw_screen()
+
+    def _is_idle(self):
+        if self.replayer is not None or self._game_running or self._dryrun_timeout != -1:
+            return False
+        if time.time() - self._last_input < self._idle_timeout:
+            return False
+        return not self.backgrounds[self._background_type].is_animated() and not self.active_panel.is_animated()
+
+    def _wait_for_input(self):
+        """Sleep until an input event arrives or the next idle frame is due"""
+        pygame.time.set_timer(self._wake_event, int(1000 / self._idle_frame_rate))
+        event = pygame.event.wait()
+        pygame.time.set_timer(self._wake_event, 0)
+        if event.type != self._wake_event:
+            pygame.event.post(event)
+        self.clock.tick()
+
+    def start(self):
+        while not self._done:
+            self.run_frame()
+            self.startup_timer.report()
+            self._preload_panel()
+            if self._is_idle():
+                self._wait_for_input()
+            elif self.replayer is None or self._replay_speed != "max":
+                self.clock.tick(self._frame_rate)
+            if self.replayer and self.replayer.is_done(self._frame_index):
+                self._done = True
+            registry.set("fps", self.clock.get_fps())
 
             curr_time = time.time()
             if self._dryrun_timeout != -1:
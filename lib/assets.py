@@ -0,0 +1,110 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+import os
+import glob
+import zlib
+import struct
+import hashlib
+import pygame
+from lib.util import log_to_file
+
+
+pixel_formats = {"alpha": "RGBA", "opaque": "RGB"}
+
+
+def read_pixels(path, format="alpha"):
+    """Return the surface saved by write_pixels, or None when the file is missing or damaged"""
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+
+    width, height = struct.unpack_from("<II", data) if len(data) >= 8 else (0, 0)
+    try:
+        pixels = zlib.decompress(data[8:])
+    except zlib.error:
+        pixels = b""
+    if not width or len(pixels) != width * height * len(pixel_formats[format]):
+        log_to_file("Ignoring damaged pixel cache {}".format(path))
+        return None
+    return pygame.image.fromstring(pixels, (width, height), pixel_formats[format])
+
+
+def write_pixels(path, surface, format="alpha", compression_level=1):
+    """Save the size and compressed pixels of a surface, returning the bytes written"""
+    # written next to the target and renamed, so a crash never leaves a partial file behind
+    temp_path = path + ".tmp"
+    data = struct.pack("<II", *surface.get_size()) + \
+        zlib.compress(pygame.image.tostring(surface, pixel_formats[format]), compression_level)
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+    return len(data)
+
+
+class AssetCache:
+    """Images loaded, scaled and converted once per (path, size, format) and shared by every widget,
+    with the scaled pixels kept on disk so later starts skip decoding and scaling"""
+
+    version = 1
+    # level 1 inflates about twice as fast as decoding and scaling the png, and is smaller than raw
+    # pixels on an SD card
+    compression_level = 1
+
+    def __init__(self, cache_directory="asset_cache"):
+        self.cache_directory = cache_directory
+
+        self._surfaces = {}
+        self.loaded = 0
+        self.cached = 0
+
+    def get(self, path, size=None, format="alpha"):
+        """Return the image at path scaled to size, as a surface in the display format, which
+        callers share and must not draw on"""
+        size = (size, size) if isinstance(size, int) else tuple(size) if size else None
+        key = (os.path.normpath(path), size, format)
+        surface = self._surfaces.get(key)
+        if surface is None:
+            surface = self._surfaces[key] = self._load(*key)
+        return surface
+
+    def get_directory(self, directory, size=None, format="alpha", pattern="*.png"):
+        """Return {file name without extension: surface} of the images in a directory"""
+        return {os.path.basename(path).split('.')[0]: self.get(path, size, format)
+                for path in sorted(glob.glob(os.path.join(directory, pattern)))}
+
+    def _get_cache_path(self, path, size, format):
+        stat = os.stat(path)
+        # any change to the source file or the requested size gives a new cache file
+        key = repr((self.version, os.path.abspath(path), stat.st_mtime_ns, stat.st_size, size, format))
+        return os.path.join(self.cache_directory, hashlib.sha1(key.encode('utf-8')).hexdigest() + ".raw")
+
+    def _load(self, path, size, format):
+        cache_path = self._get_cache_path(path, size, format) if self.cache_directory else None
+        surface = read_pixels(cache_path, format) if cache_path else None
+        if surface is None:
+            surface = pygame.image.load(path)
+            if size and surface.get_size() != size:
+                surface = pygame.transform.scale(surface, size)
+            if cache_path:
+                self._write_cache(cache_path, surface, format)
+            self.loaded += 1
+        else:
+            self.cached += 1
+
+        return surface.convert_alpha() if format == "alpha" else surface.convert()
+
+    def _write_cache(self, cache_path, surface, format):
+        try:
+            if not os.path.isdir(self.cache_directory):
+                os.makedirs(self.cache_directory)
+            write_pixels(cache_path, surface, format, self.compression_level)
+        except OSError as e:
+            log_to_file("Unable to cache asset {}: {}".format(cache_path, e))
+
+    def clear(self):
+        self._surfaces.clear()
+
+
+assets = AssetCache()
@@ -7,7 +7,7 @@ import os
 import glob
 import time
 import math
-import ffmpeg
+from lib.assets import assets
 from lib.threads import ImageRotateThread
 from lib.util import log_to_file, distance, choices
 
@@ -59,10 +59,16 @@ class Background:
     def update(self):
         pass
 
+    def tick(self, dt):
+        pass
+
     def draw(self, surface):
         surface.fill(self.color)
         surface.set_alpha(self.alpha)
 
+    def is_animated(self):
+        return type(self) is not Background
+
     def enter(self):
         self._on_enter()
 
@@ -91,12 +97,16 @@ class DynamicImage(Background):
         self.y_offset = int((self.height - self.image_size) / 2)
         self.rotated_image_queue = queue.Queue()
 
+    def _load_images(self):
         for image_path in glob.glob(os.path.join(self.image_directory, "*.png")):
-            image = pygame.image.load(image_path)
-            image = pygame.transform.scale(image, (self.image_size, self.image_size))
-            self.images.append(image)
+            self.images.append(assets.get(image_path, self.image_size))
         self.images.reverse()
 
+    def _on_enter(self):
+        # loaded the first time the background is shown instead of at startup
+        if not self.images:
+            self._load_images()
+
     def update(self):
         current_time = int(time.time() * 100)
 
@@ -201,6 +211,11 @@ class DynamicTrace(Background):
         self.colors2 = [[c - c / self.trace_length * (self.trace_length - i) for c in self.color2]
                         for i in range(self.trace_length)]
 
+        # a trace point is added every interval of logic time, whatever the frame rate is
+        self.trace_interval = 0.1
+        self._time = 0
+        self._trace_time = 0
+
     def _reset_trace(self):
         self.speeds1 = [random.uniform(0.1 * math.pi, 0.5 * math.pi) for _ in range(self.steps)]
         self.speeds2 = [random.uniform(0.1 * math.pi, 0.5 * math.pi) for _ in range(self.steps)]
@@ -213,8 +228,16 @@ class DynamicTrace(Background):
 
     def _on_enter(self):
         self._reset_trace()
+        self._time = time.time()
+        self._trace_time = 0
+
+    def tick(self, dt):
+        self._time += dt
+        self._trace_time += dt
+        if self._trace_time < self.trace_interval:
+            return
+        self._trace_time -= self.trace_interval
 
-    def update(self):
         if self.queue1.full():
             self.queue1.get_nowait()
         if self.queue2.full():
@@ -223,7 +246,7 @@ class DynamicTrace(Background):
         self.queue1.put_nowait((int(self.x1), int(self.y1)))
         self.queue2.put_nowait((int(self.x2), int(self.y2)))
 
-        current_time = time.time()
+        current_time = self._time
         self.x1, self.y1 = self.origin
         self.x2, self.y2 = self.origin
         for ind in range(self.steps):
@@ -282,15 +305,23 @@ class VideoPlayer(Background):
             log_to_file("Error: Unable to load video file {}. File doesn't exist.".format(video_path))
             return None
 
-        process = (
-            ffmpeg
-            .input(video_path)
-            .output('pipe:', format='rawvideo', pix_fmt='rgb24')
-            .run_async(pipe_stdout=True, pipe_stderr=True)
-        )
+        import ffmpeg
+        try:
+            process = (
+                ffmpeg
+                .input(video_path)
+                .output('pipe:', format='rawvideo', pix_fmt='rgb24')
+                .run_async(pipe_stdout=True, pipe_stderr=True)
+            )
+        except OSError as e:
+            log_to_file("Error: Unable to start ffmpeg for {}: {}".format(video_path, e))
+            return None
 
         return process
 
+    def is_animated(self):
+        return self._video_process is not None
+
     def _on_enter(self):
         self._video_process = self._load_video(self.video_path)
 
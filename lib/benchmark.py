@@ -0,0 +1,270 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+import os
+import gc
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+from datetime import timedelta
+from types import SimpleNamespace
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import yaml  # noqa: E402
+import numpy as np  # noqa: E402
+import requests  # noqa: E402
+from lib.clock import VirtualClock  # noqa: E402
+from lib.util import percentile  # noqa: E402
+
+
+class FixtureResponse:
+    """The parts of requests.Response that the widgets read"""
+
+    def __init__(self, url, content, status_code=200):
+        self.url = url
+        self.content = content
+        self.status_code = status_code
+        self.headers = {}
+        self.elapsed = timedelta(0)
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', 'replace')
+
+    def json(self):
+        # parsed again on every call, so widgets that change a response don't change the fixture
+        return json.loads(self.text)
+
+    def raise_for_status(self):
+        pass
+
+
+class FixtureResponses:
+    """Answer HTTP requests from recorded responses instead of the network"""
+
+    def __init__(self, path="fixtures/responses.json"):
+        with open(path, 'r') as f:
+            fixtures = json.load(f)
+
+        self.misses = []
+        self._responses = []
+        for fixture in fixtures:
+            if "file" in fixture:
+                with open(fixture["file"], 'rb') as f:
+                    content = f.read()
+            elif "json" in fixture:
+                content = json.dumps(fixture["json"]).encode('utf-8')
+            else:
+                content = fixture.get("text", "").encode('utf-8')
+            self._responses.append((fixture["url"], fixture.get("params", {}), content))
+
+        # the longest matching url wins, so specific fixtures can override general ones
+        self._responses.sort(key=lambda response: -len(response[0]))
+        self._real_request = None
+
+    def get_response(self, url, params=None):
+        params = params or {}
+        for prefix, fixture_params, content in self._responses:
+            if url.startswith(prefix) and all(str(params.get(name)) == str(value)
+                                              for name, value in fixture_params.items()):
+                return FixtureResponse(url, content)
+
+        self.misses.append(url)
+        raise requests.exceptions.ConnectionError("No fixture for {}".format(url))
+
+    def install(self):
+        fixtures = self
+
+        def request(session, method, url, params=None, **kwargs):
+            return fixtures.get_response(url, params)
+
+        # requests.get and friends all end up in Session.request
+        self._real_request = requests.sessions.Session.request
+        requests.sessions.Session.request = request
+
+    def uninstall(self):
+        if self._real_request is not None:
+            requests.sessions.Session.request = self._real_request
+            self._real_request = None
+
+
+def get_stats(frame_times, elapsed):
+    frame_times = sorted(frame_times)
+    return {
+        "frames": len(frame_times),
+        "fps": len(frame_times) / elapsed if elapsed else 0.0,
+        "frame_ms": {
+            "mean": sum(frame_times) / len(frame_times) * 1000 if frame_times else 0.0,
+            "p50": percentile(frame_times, 50) * 1000,
+            "p95": percentile(frame_times, 95) * 1000,
+            "p99": percentile(frame_times, 99) * 1000,
+            "max": frame_times[-1] * 1000 if frame_times else 0.0,
+        }
+    }
+
+
+def run_combination(app, clock, panel, background_type, frames=60, warmup=5, seed=0, trace_allocations=False):
+    """Render frames of one panel over one background and return their timings"""
+    random.seed(seed)
+    np.random.seed(seed)
+    app.set_background_type(background_type, save=False)
+    app.set_active_panel(panel)
+    for _ in range(warmup):
+        clock.advance()
+        app.run_frame()
+
+    gc.collect()
+    frame_times = []
+    allocated_bytes = []
+    collections = sum(stats["collections"] for stats in gc.get_stats())
+    blocks = sys.getallocatedblocks()
+    if trace_allocations:
+        tracemalloc.start()
+
+    start_time = time.perf_counter()
+    for _ in range(frames):
+        clock.advance()
+        if trace_allocations:
+            tracemalloc.reset_peak()
+            traced_start = tracemalloc.get_traced_memory()[0]
+        frame_start = time.perf_counter()
+        app.run_frame()
+        frame_times.append(time.perf_counter() - frame_start)
+        if trace_allocations:
+            allocated_bytes.append(tracemalloc.get_traced_memory()[1] - traced_start)
+    elapsed = time.perf_counter() - start_time
+
+    if trace_allocations:
+        tracemalloc.stop()
+
+    report = get_stats(frame_times, elapsed)
+    report.update({
+        "panel": type(panel).__name__,
+        "background": "{}:{}".format(background_type, type(app.backgrounds[background_type]).__name__),
+        "allocated_blocks_per_frame": (sys.getallocatedblocks() - blocks) / float(frames),
+        "gc_collections": sum(stats["collections"] for stats in gc.get_stats()) - collections,
+        "frame_times": frame_times
+    })
+    if trace_allocations:
+        report["peak_allocated_kib_per_frame"] = sum(allocated_bytes) / float(frames) / 1024
+    return report
+
+
+def run_benchmark(frames=60, warmup=5, seed=0, panels=None, backgrounds=None, frame_rate=10,
+                  fixture_path="fixtures/responses.json", trace_allocations=False):
+    """Render every panel over every background with a virtual clock and recorded responses"""
+    from lib.app import App
+    import pygame
+
+    clock = VirtualClock(step=1.0 / frame_rate)
+    fixtures = FixtureResponses(fixture_path)
+    # caches and the calendar start empty in a directory of their own, so a run neither depends on
+    # nor changes the data of the installed app
+    data_directory = tempfile.mkdtemp(prefix="benchmark-")
+    setting_file = os.path.join(data_directory, "settings.yaml")
+    with open(setting_file, 'w') as f:
+        yaml.dump({"background_type": 0, "camera_source": "test", "stock_watchlist": [],
+                   "asset_cache_directory": os.path.join(data_directory, "asset_cache"),
+                   "stock_cache_directory": os.path.join(data_directory, "stock_cache"),
+                   "news_image_directory": os.path.join(data_directory, "news_images"),
+                   "calendar_database": os.path.join(data_directory, "calendar.db")}, f)
+
+    clock.install()
+    fixtures.install()
+    # there is no cursor on the dummy video driver
+    set_cursor = pygame.mouse.set_cursor
+    pygame.mouse.set_cursor = lambda *args: None
+    random.seed(seed)
+    np.random.seed(seed)
+    try:
+        args = SimpleNamespace(invert=False, fullscreen=False, performance=False, debug=False, dryrun=-1,
+                               profile=False, metrics_port=None, metrics_file=None, record=None,
+                               replay=None, replay_speed="max", seed=seed)
+        app = App(args=args, setting_file=setting_file)
+
+        results = []
+        for panel in app.load_panels():
+            if panels and type(panel).__name__ not in panels:
+                continue
+            for background_type, background in enumerate(app.backgrounds):
+                if backgrounds and type(background).__name__ not in backgrounds and \
+                   str(background_type) not in backgrounds:
+                    continue
+                results.append(run_combination(app, clock, panel, background_type, frames=frames,
+                                               warmup=warmup, seed=seed, trace_allocations=trace_allocations))
+        app._cleanup()
+    finally:
+        pygame.mouse.set_cursor = set_cursor
+        fixtures.uninstall()
+        clock.uninstall()
+        shutil.rmtree(data_directory, ignore_errors=True)
+
+    frame_times = [frame_time for result in results for frame_time in result.pop("frame_times")]
+    report = {
+        "frames": frames,
+        "warmup": warmup,
+        "seed": seed,
+        "frame_rate": frame_rate,
+        "python": sys.version.split()[0],
+        "pygame": pygame.version.ver,
+        "fixture_misses": sorted(set(fixtures.misses)),
+        "results": results,
+        "total": get_stats(frame_times, sum(frame_times))
+    }
+    return report
+
+
+def print_report(report):
+    for result in report["results"]:
+        frame_ms = result["frame_ms"]
+        print("{:<16} {:<18} {:>7.1f} fps | p50 {:6.2f} | p95 {:6.2f} | p99 {:6.2f} | max {:6.2f} ms | "
+              "{:+.1f} blocks/frame".format(result["panel"], result["background"], result["fps"],
+                                            frame_ms["p50"], frame_ms["p95"], frame_ms["p99"],
+                                            frame_ms["max"], result["allocated_blocks_per_frame"]))
+    total = report["total"]
+    print("total: {} frames at {:.1f} fps | p50 {:.2f} | p95 {:.2f} | p99 {:.2f} ms".format(
+        total["frames"], total["fps"], total["frame_ms"]["p50"], total["frame_ms"]["p95"],
+        total["frame_ms"]["p99"]))
+    if report["fixture_misses"]:
+        print("requests without fixtures: {}".format(", ".join(report["fixture_misses"])))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--frames', action='store', type=int,
+                        default=60, help="frames to render for each panel and background")
+    parser.add_argument('-w', '--warmup', action='store', type=int,
+                        default=5, help="frames to render before measuring")
+    parser.add_argument('-s', '--seed', action='store', type=int,
+                        default=0, help="seed of the random generators")
+    parser.add_argument('-p', '--panel', action='append',
+                        help="panel class to render, can be repeated (default: all)")
+    parser.add_argument('-b', '--background', action='append',
+                        help="background class or index to render, can be repeated (default: all)")
+    parser.add_argument('-f', '--fixtures', action='store',
+                        default="fixtures/responses.json", help="recorded responses to answer requests with")
+    parser.add_argument('-a', '--trace-allocations', action='store_true',
+                        default=False, help="also measure allocated memory per frame, which is slower")
+    parser.add_argument('-j', '--json', action='store_true',
+                        default=False, help="print the report as JSON")
+    parser.add_argument('-o', '--output', action='store',
+                        default=None, help="write the report as JSON to this file")
+    args = parser.parse_args()
+
+    report = run_benchmark(frames=args.frames, warmup=args.warmup, seed=args.seed, panels=args.panel,
+                           backgrounds=args.background, fixture_path=args.fixtures,
+                           trace_allocations=args.trace_allocations)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
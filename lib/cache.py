@@ -0,0 +1,133 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+import os
+import json
+import gzip
+import time
+from collections import OrderedDict
+from threading import Lock
+from lib.util import log_to_file
+
+
+class ResponseCache:
+    """LRU cache of JSON responses with per-kind timeouts and an optional gzipped disk tier, which
+    evicts its least recently used files once they take more than max_disk_bytes"""
+
+    def __init__(self, max_entries=32, timeouts=None, default_timeout=300, directory=None,
+                 max_disk_bytes=16 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.timeouts = timeouts if timeouts else {}
+        self.default_timeout = default_timeout
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self.disk_bytes = 0
+
+        self._entries = OrderedDict()
+        # file name to size, least recently used first
+        self._files = OrderedDict()
+        self._lock = Lock()
+
+        if self.directory:
+            self._load_index()
+
+    def _load_index(self):
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+        # file times are when the responses were fetched, as they tell whether a response is fresh,
+        # so the use order starts from them instead of being kept by touching files on reads
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".json.gz") and entry.is_file():
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name, stat.st_size))
+            elif entry.name.endswith(".tmp"):
+                self._remove(entry.name)
+        for _, name, size in sorted(entries):
+            self._files[name] = size
+            self.disk_bytes += size
+
+    def _get_name(self, key):
+        name = "_".join(str(part) for part in key if part is not None)
+        return "{}.json.gz".format(name.replace(os.sep, "-"))
+
+    def _get_path(self, key):
+        return os.path.join(self.directory, self._get_name(key))
+
+    def _remove(self, name):
+        try:
+            os.remove(os.path.join(self.directory, name))
+        except OSError:
+            pass
+
+    def is_fresh(self, key, timestamp):
+        """Keys are tuples whose second element selects the timeout"""
+        return time.time() - timestamp < self.timeouts.get(key[1], self.default_timeout)
+
+    def get(self, key):
+        """Return (timestamp, response) from memory, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def load(self, key):
+        """Return (timestamp, response) from memory or disk, or None. Reading disk can be slow."""
+        entry = self.get(key)
+        if entry is not None or not self.directory:
+            return entry
+
+        name = self._get_name(key)
+        with self._lock:
+            if name not in self._files:
+                return None
+
+        path = self._get_path(key)
+        try:
+            with gzip.open(path, 'rt') as f:
+                response = json.load(f)
+            entry = (os.path.getmtime(path), response)
+        except (OSError, ValueError) as e:
+            log_to_file("Unable to load cached response {}: {}".format(path, e))
+            return None
+
+        with self._lock:
+            if name in self._files:
+                self._files.move_to_end(name)
+        self._add(key, entry)
+        return entry
+
+    def put(self, key, response):
+        entry = (time.time(), response)
+        self._add(key, entry)
+
+        if self.directory:
+            # write to a temporary file first, so a crash never leaves a truncated entry
+            path = self._get_path(key)
+            temp_path = path + ".tmp"
+            try:
+                with gzip.open(temp_path, 'wt') as f:
+                    json.dump(response, f)
+                os.replace(temp_path, path)
+                size = os.path.getsize(path)
+            except OSError as e:
+                log_to_file("Unable to save cached response {}: {}".format(path, e))
+                return
+
+            name = self._get_name(key)
+            with self._lock:
+                self.disk_bytes += size - self._files.pop(name, 0)
+                self._files[name] = size
+                # the newest file is always kept, even when it alone is over the budget
+                while self.disk_bytes > self.max_disk_bytes and len(self._files) > 1:
+                    evicted, evicted_size = self._files.popitem(last=False)
+                    self.disk_bytes -= evicted_size
+                    self._remove(evicted)
+
+    def _add(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
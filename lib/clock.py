@@ -0,0 +1,29 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+import time
+
+
+class VirtualClock:
+    """Replace time.time with a clock that only moves when a frame is rendered. Dates are read
+    with datetime.fromtimestamp(time.time()) rather than datetime.now() so they follow it too"""
+
+    def __init__(self, start=1602345600.0, step=0.1):
+        self.now = start
+        self.step = step
+
+        self._real_time = None
+
+    def time(self):
+        return self.now
+
+    def advance(self, seconds=None):
+        self.now += self.step if seconds is None else seconds
+
+    def install(self):
+        self._real_time = time.time
+        time.time = self.time
+
+    def uninstall(self):
+        if self._real_time is not None:
+            time.time = self._real_time
+            self._real_time = None
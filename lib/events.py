@@ -0,0 +1,226 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+import os
+import time
+import heapq
+import sqlite3
+import argparse
+import calendar
+from datetime import date, timedelta
+from collections import OrderedDict
+from xml.sax.saxutils import escape
+from lib.util import log_to_file, iter_occurrences
+
+
+class EventStore:
+    """Calendar events in SQLite, indexed by date and status"""
+
+    recurrences = ['', 'daily', 'weekly', 'monthly', 'yearly']
+    schema = [
+        """CREATE TABLE IF NOT EXISTS events (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            date TEXT NOT NULL,
+            status INTEGER NOT NULL DEFAULT 1,
+            recurrence TEXT NOT NULL DEFAULT ''
+        )""",
+        "CREATE INDEX IF NOT EXISTS events_date ON events (date)",
+        "CREATE INDEX IF NOT EXISTS events_status_date ON events (status, date)"
+    ]
+
+    def __init__(self, path="calendars/calendar.db", xml_path="calendars/calendar.xml"):
+        self.path = path
+
+        # expanded occurrences of the last few months viewed by (year, month), cleared on every change
+        self._month_cache = OrderedDict()
+        self._month_cache_size = 6
+
+        self._connection = sqlite3.connect(self.path)
+        # the schema and the first import are one transaction, so an import that fails leaves no
+        # table behind and is tried again on the next start
+        with self._connection:
+            self._connection.execute("BEGIN")
+            is_new = self._connection.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'events'").fetchone() is None
+            for statement in self.schema:
+                self._connection.execute(statement)
+
+            columns = [row[1] for row in self._connection.execute("PRAGMA table_info(events)")]
+            # databases made before events could recur lack the column
+            if 'recurrence' not in columns:
+                self._connection.execute("ALTER TABLE events ADD COLUMN recurrence TEXT NOT NULL DEFAULT ''")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS events_recurrence ON events (recurrence, date)")
+
+            # events used to live in an XML file, which is imported once when the database is created
+            if is_new and xml_path and os.path.isfile(xml_path):
+                total = self._insert_events(self._read_xml(xml_path))
+                log_to_file("Imported {} events from {}".format(total, xml_path))
+
+    def get_events(self, start=None, end=None, active_since=None, recurring=None, offset=0, limit=-1):
+        """Return (id, name, date, status, recurrence) rows ordered by date. Dates are YYYY-MM-DD
+        strings, and active_since keeps active events plus any event on or after that date."""
+        conditions = []
+        params = []
+        if recurring is not None:
+            conditions.append("recurrence != ''" if recurring else "recurrence = ''")
+        if start is not None:
+            conditions.append("date >= ?")
+            params.append(start)
+        if end is not None:
+            conditions.append("date <= ?")
+            params.append(end)
+        if active_since is not None:
+            conditions.append("(status = 1 OR date >= ?)")
+            params.append(active_since)
+
+        query = "SELECT id, name, date, status, recurrence FROM events"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY date, status, id LIMIT ? OFFSET ?"
+        return self._connection.execute(query, params + [limit, offset]).fetchall()
+
+    def get_occurrences(self, start, end):
+        """Return (id, name, date, status, recurrence) rows for every occurrence between the
+        start and end dates, with recurring events expanded"""
+        start_text = start.isoformat()
+        end_text = end.isoformat()
+        occurrences = []
+        year, month = start.year, start.month
+        while (year, month) <= (end.year, end.month):
+            month_occurrences = self._get_month_occurrences(year, month)
+            if (year, month) in ((start.year, start.month), (end.year, end.month)):
+                month_occurrences = [row for row in month_occurrences if start_text <= row[2] <= end_text]
+            occurrences += month_occurrences
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+        return occurrences
+
+    def _get_month_occurrences(self, year, month):
+        if (year, month) in self._month_cache:
+            self._month_cache.move_to_end((year, month))
+            return self._month_cache[(year, month)]
+
+        start = date(year, month, 1)
+        end = date(year, month, calendar.monthrange(year, month)[1])
+        occurrences = self.get_events(start=start.isoformat(), end=end.isoformat(), recurring=False)
+        for event_id, name, event_date, status, recurrence in self.get_events(end=end.isoformat(), recurring=True):
+            first = self._parse_date(event_date)
+            if first is None:
+                continue
+            occurrences += [(event_id, name, occurrence.isoformat(), status, recurrence)
+                            for occurrence in iter_occurrences(first, recurrence, start, end)]
+
+        occurrences.sort(key=lambda row: (row[2], row[3], row[0]))
+        self._month_cache[(year, month)] = occurrences
+        while len(self._month_cache) > self._month_cache_size:
+            self._month_cache.popitem(last=False)
+        return occurrences
+
+    def get_upcoming(self, active_since=None, offset=0, limit=-1):
+        """Like get_events, with recurring events moved to their next occurrence from today"""
+        end = offset + limit if limit != -1 else -1
+        events = self.get_events(active_since=active_since, recurring=False, limit=end)
+
+        today = date.fromtimestamp(time.time())
+        recurring = []
+        for event_id, name, event_date, status, recurrence in self.get_events(recurring=True):
+            first = self._parse_date(event_date)
+            if first is None:
+                continue
+            occurrence = next(iter_occurrences(first, recurrence, max(first, today),
+                                               today + timedelta(days=366 * 8)), None)
+            if occurrence is not None:
+                recurring.append((event_id, name, occurrence.isoformat(), status, recurrence))
+        recurring.sort(key=lambda row: (row[2], row[3], row[0]))
+
+        merged = list(heapq.merge(events, recurring, key=lambda row: (row[2], row[3], row[0])))
+        return merged[offset:end] if end != -1 else merged[offset:]
+
+    @staticmethod
+    def _parse_date(text):
+        try:
+            return date(int(text[:4]), int(text[5:7]), int(text[8:10]))
+        except ValueError:
+            return None
+
+    def add_event(self, name, event_date, status=1, recurrence=''):
+        self._month_cache.clear()
+        with self._connection:
+            cursor = self._connection.execute("INSERT INTO events (name, date, status, recurrence) VALUES (?, ?, ?, ?)",
+                                              (name, event_date, int(status), recurrence))
+        return cursor.lastrowid
+
+    def update_event(self, event_id, name, event_date, status, recurrence=''):
+        self._month_cache.clear()
+        with self._connection:
+            self._connection.execute("UPDATE events SET name = ?, date = ?, status = ?, recurrence = ? WHERE id = ?",
+                                     (name, event_date, int(status), recurrence, event_id))
+
+    def set_status(self, event_id, status):
+        self._month_cache.clear()
+        with self._connection:
+            self._connection.execute("UPDATE events SET status = ? WHERE id = ?", (int(status), event_id))
+
+    def delete_event(self, event_id):
+        self._month_cache.clear()
+        with self._connection:
+            self._connection.execute("DELETE FROM events WHERE id = ?", (event_id,))
+
+    def import_xml(self, xml_path):
+        rows = self._read_xml(xml_path)
+        with self._connection:
+            return self._insert_events(rows)
+
+    def _read_xml(self, xml_path):
+        # only needed once the xml changes, and slow to import
+        from bs4 import BeautifulSoup
+
+        with open(xml_path, 'r') as f:
+            soup = BeautifulSoup(f.read(), 'xml')
+
+        rows = []
+        for event in soup.find_all('event'):
+            status = event.find('status')
+            recurrence = event.find('recurrence')
+            rows.append((event.find('name').get_text(), event.find('date').get_text(),
+                         int(status.get_text()) if status else 1,
+                         recurrence.get_text() if recurrence else ''))
+        return rows
+
+    def _insert_events(self, rows):
+        self._month_cache.clear()
+        self._connection.executemany("INSERT INTO events (name, date, status, recurrence) VALUES (?, ?, ?, ?)",
+                                     rows)
+        return len(rows)
+
+    def export_xml(self, xml_path):
+        lines = ["<html>", "<body><table>", "<tbody>", "<tr><th>Event</th><th>Date</th></tr>"]
+        for _, name, event_date, status, recurrence in self.get_events():
+            recurrence_tag = "<recurrence>{}</recurrence>".format(recurrence) if recurrence else ""
+            lines.append("<event><name>{}</name><date>{}</date><status>{}</status>{}</event>".format(
+                escape(name), escape(event_date), status, recurrence_tag))
+        lines += ["</tbody>", "</table>", "</body></html>"]
+
+        with open(xml_path, 'w') as f:
+            f.write("\n".join(lines) + "\n")
+        return len(lines) - 7
+
+    def close(self):
+        self._connection.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-d', '--database', action='store', default="calendars/calendar.db",
+                        help="path of the event database")
+    parser.add_argument('-i', '--import-xml', action='store', default=None,
+                        help="add the events of an XML calendar to the database")
+    parser.add_argument('-e', '--export-xml', action='store', default=None,
+                        help="write the events in the database to an XML calendar")
+    args = parser.parse_args()
+
+    store = EventStore(args.database, xml_path=None)
+    if args.import_xml:
+        print("Imported {} events".format(store.import_xml(args.import_xml)))
+    if args.export_xml:
+        print("Exported {} events".format(store.export_xml(args.export_xml)))
+    store.close()
@@ -0,0 +1,242 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+import os
+import time
+import bisect
+from collections import OrderedDict
+from threading import Thread, Event, Lock
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from lib.util import log_to_file
+
+
+class Histogram:
+    """Cumulative observations per label set, exposed as a histogram, or as a summary without buckets"""
+
+    def __init__(self, name, help, buckets=None):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self.type = "histogram" if buckets else "summary"
+
+        self._values = OrderedDict()
+        self._lock = Lock()
+
+    def observe(self, value, labels=()):
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1) if self.buckets else None, 0.0, 0]
+            if self.buckets:
+                entry[0][bisect.bisect_left(self.buckets, value)] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def get_samples(self):
+        with self._lock:
+            values = [(labels, list(counts) if counts else None, total, count)
+                      for labels, (counts, total, count) in self._values.items()]
+
+        samples = []
+        for labels, counts, total, count in values:
+            if counts:
+                cumulative = 0
+                for bucket, bucket_count in zip(list(self.buckets) + ["+Inf"], counts):
+                    cumulative += bucket_count
+                    samples.append((self.name + "_bucket", labels + (("le", bucket),), cumulative))
+            samples.append((self.name + "_sum", labels, total))
+            samples.append((self.name + "_count", labels, count))
+        return samples
+
+
+class Gauge:
+    """Last value set per label set"""
+
+    type = "gauge"
+
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+
+        self._values = OrderedDict()
+
+    def set(self, value, labels=()):
+        self._values[labels] = value
+
+    def get_samples(self):
+        return [(self.name, labels, value) for labels, value in list(self._values.items())]
+
+
+class Registry:
+    """App-internal metrics, recorded only once an exporter enables the registry"""
+
+    def __init__(self, prefix="rpi_"):
+        self.prefix = prefix
+        self.enabled = False
+
+        self._metrics = OrderedDict()
+
+    def histogram(self, name, help, buckets=None):
+        self._metrics[name] = Histogram(self.prefix + name, help, buckets)
+
+    def gauge(self, name, help):
+        self._metrics[name] = Gauge(self.prefix + name, help)
+
+    def observe(self, name, value, **labels):
+        if self.enabled:
+            self._metrics[name].observe(value, tuple(sorted(labels.items())))
+
+    def set(self, name, value, **labels):
+        if self.enabled:
+            self._metrics[name].set(value, tuple(sorted(labels.items())))
+
+    def get_metrics(self):
+        return list(self._metrics.values())
+
+
+registry = Registry()
+registry.histogram("frame_seconds", "Time to handle events, update and draw one frame",
+                   (0.005, 0.01, 0.02, 0.035, 0.05, 0.1, 0.25, 0.5, 1))
+registry.gauge("fps", "Frames drawn per second")
+registry.histogram("widget_update_seconds", "Time spent updating widgets, by widget class")
+registry.histogram("fetch_seconds", "Latency of HTTP requests, by source",
+                   (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30))
+
+
+def format_value(value):
+    if isinstance(value, int):
+        return str(value)
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    pairs = []
+    for name, value in labels:
+        value = format_value(value) if isinstance(value, (int, float)) else str(value)
+        value = value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+        pairs.append("{}=\"{}\"".format(name, value))
+    return "{" + ",".join(pairs) + "}"
+
+
+class MetricsExporter(Thread):
+    """Publish system and app metrics in the Prometheus text format, over HTTP and/or in a
+    file for the node exporter textfile collector"""
+
+    content_type = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self, collector=None, registry=registry, port=None, address="127.0.0.1",
+                 textfile=None, interval=15):
+        super(MetricsExporter, self).__init__()
+
+        self.collector = collector
+        self.registry = registry
+        self.port = port
+        self.address = address
+        self.textfile = textfile
+        self.interval = interval
+        self.daemon = True
+
+        self.registry.enabled = True
+        self._server = None
+        self._last_write = 0
+        self._stop_event = Event()
+
+    def _get_system_metrics(self):
+        if self.collector is None:
+            return []
+
+        # read on this thread at scrape time, so the UI thread never pays for them
+        return [
+            ("cpu_percent", "CPU usage in percent", self.collector.cpu),
+            ("cpu_temperature_celsius", "CPU temperature", self.collector.cpu_temp),
+            ("memory_percent", "Memory usage in percent", self.collector.memory),
+            ("disk_percent", "Disk usage in percent", self.collector.disk),
+            ("network_sent_bytes_per_second", "Network upload rate", self.collector.net_sent),
+            ("network_received_bytes_per_second", "Network download rate", self.collector.net_recv)
+        ]
+
+    def render(self):
+        lines = []
+        for name, help, values in self._get_system_metrics():
+            if not len(values):
+                continue
+            name = self.registry.prefix + name
+            lines += ["# HELP {} {}".format(name, help), "# TYPE {} gauge".format(name),
+                      "{} {}".format(name, format_value(values.latest()))]
+
+        for metric in self.registry.get_metrics():
+            samples = metric.get_samples()
+            if not samples:
+                continue
+            lines += ["# HELP {} {}".format(metric.name, metric.help),
+                      "# TYPE {} {}".format(metric.name, metric.type)]
+            lines += ["{}{} {}".format(name, format_labels(labels), format_value(value))
+                      for name, labels, value in samples]
+        return "\n".join(lines) + "\n"
+
+    def _write_textfile(self):
+        # write next to the target and rename, so the collector never reads a partial file
+        temp_path = self.textfile + ".tmp"
+        try:
+            with open(temp_path, 'w') as f:
+                f.write(self.render())
+            os.replace(temp_path, self.textfile)
+        except OSError as e:
+            log_to_file("Unable to write metrics to {}: {}".format(self.textfile, e))
+
+    def _create_server(self):
+        exporter = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+
+                body = exporter.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", exporter.content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        try:
+            server = HTTPServer((self.address, self.port), MetricsHandler)
+        except OSError as e:
+            log_to_file("Unable to serve metrics on {}:{}: {}".format(self.address, self.port, e))
+            return None
+
+        server.timeout = 1
+        log_to_file("Serving metrics on http://{}:{}/metrics".format(*server.server_address[:2]))
+        return server
+
+    def run(self):
+        if self.port is not None:
+            self._server = self._create_server()
+
+        while not self._stop_event.is_set():
+            if self._server:
+                self._server.handle_request()
+            else:
+                self._stop_event.wait(min(self.interval, 1))
+
+            current_time = time.time()
+            if self.textfile and current_time - self._last_write >= self.interval:
+                self._write_textfile()
+                self._last_write = current_time
+
+        if self._server:
+            self._server.server_close()
+
+    def get_address(self):
+        """Return the (host, port) being served, which tells the port picked for port 0"""
+        return self._server.server_address[:2] if self._server else None
+
+    def stop(self):
+        self._stop_event.set()
@@ -109,7 +109,7 @@ class GameSnake(Game):
         self._snake = []
         self._snake_direction = "right"
         self._snake_speed = 5
-        self._snake_lastmove = time.time()
+        self._move_time = 0
         self._snake_extend = False
         self._apple = (0, 0)
         self._game_started = False
@@ -158,16 +158,26 @@ class GameSnake(Game):
             return
 
         if self._game_started:
-            current_time = time.time()
-            self._progress_time = current_time
-            if current_time - self._snake_lastmove >= 1 / self._snake_speed:
-                if self._auto_play:
-                    self._update_optimal_direction()
-                self._snake_move()
-                self._snake_lastmove = current_time
+            self._progress_time = time.time()
 
         self._update_scoreboard()
 
+    def _on_tick(self, dt):
+        if not self.is_active or not self._game_started:
+            return
+
+        # moves are paced by logic time, so a slow frame is made up by the following ticks
+        self._move_time += dt
+        while self._game_started and self._move_time >= 1 / self._snake_speed:
+            self.step()
+            self._move_time -= 1 / self._snake_speed
+
+    def step(self):
+        """Advance the game by one move, regardless of the elapsed time"""
+        if self._auto_play:
+            self._update_optimal_direction()
+        self._snake_move()
+
     def _handle_widget_events(self, event):
         if event.type == pygame.KEYDOWN:
             if event.key == pygame.K_SPACE:
@@ -208,6 +218,7 @@ class GameSnake(Game):
         self._game_started = True
         self._start_time = time.time()
         self._progress_time = self._start_time
+        self._move_time = 0
 
     def _end_game(self):
         self._game_started = False
@@ -224,7 +235,7 @@ class GameSnake(Game):
         self._snake_extend = False
         self._auto_play = False
         self._win = False
-        self._snake_lastmove = self._start_time
+        self._move_time = 0
         self._progress_time = self._start_time
         self._add_apple()
         self._update_scoreboard()
@@ -283,6 +294,8 @@ class GameSnake(Game):
             for col_ind in range(self.total_cols):
                 if (row_ind, col_ind) not in self._snake:
                     free_spots.append((row_ind, col_ind))
+        if not free_spots:
+            return
         row, col = random.choice(free_spots)
         self._apple = (row, col)
 
@@ -466,8 +479,7 @@ class GameTetris(Game):
         self._active_block = None
         self._start_time = time.time()
         self._progress_time = 0
-        self._last_update_time = self._start_time
-        self._block_lastmove = time.time()
+        self._fall_time = 0
 
     def _game_on_enter(self):
         self._init_game()
@@ -479,16 +491,23 @@ class GameTetris(Game):
         if not self.is_active:
             return
 
-        if self._game_started:
-            current_time = time.time()
-            self._progress_time += current_time - self._last_update_time
-            self._last_update_time = current_time
-            if current_time - self._block_lastmove >= 1 / self._block_speed:
-                self._move_down()
-                self._block_lastmove = current_time
-
         self._update_scoreboard()
 
+    def _on_tick(self, dt):
+        if not self.is_active or not self._game_started:
+            return
+
+        # gravity is paced by logic time, so a slow frame can't skip a tick
+        self._progress_time += dt
+        self._fall_time += dt
+        while self._game_started and self._fall_time >= 1 / self._block_speed:
+            self.step()
+            self._fall_time -= 1 / self._block_speed
+
+    def step(self):
+        """Advance the game by one gravity tick, regardless of the elapsed time"""
+        self._move_down()
+
     def _update_scoreboard(self):
         self._scoreboard_lines = []
 
@@ -559,7 +578,7 @@ class GameTetris(Game):
     def _start_game(self):
         self._game_started = True
         self._start_time = time.time()
-        self._last_update_time = self._start_time
+        self._fall_time = 0
 
     def _toggle_pause(self):
         self._game_paused = not self._game_paused
@@ -852,11 +871,20 @@ class GameFlip(Game):
         if self._game_started and not self._game_paused:
             self._progress_time += current_time - self._last_update_time
             self._last_update_time = current_time
-
-            if self._curr_mode == "auto":
-                self._click_cell(self._find_best_move())
         self._update_scoreboard()
 
+    def _on_tick(self, dt):
+        if not self.is_active:
+            return
+
+        if self._game_started and not self._game_paused and self._curr_mode == "auto":
+            self.step()
+
+    def step(self):
+        """Let the current player make the best move it can find"""
+        if self._possible_next_cells:
+            self._click_cell(self._find_best_move())
+
     def _update_scoreboard(self):
         self._scoreboard_lines = []
 
@@ -0,0 +1,270 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+import io
+import os
+import queue
+import hashlib
+import itertools
+import pygame
+import requests
+from collections import OrderedDict
+from threading import Thread, Lock
+from requests.adapters import HTTPAdapter
+from lib.assets import read_pixels, write_pixels
+from lib.exporter import registry
+from lib.util import log_to_file, fit_size
+
+
+class SurfaceCache:
+    """Least recently used surfaces, evicted once their pixels take more than max_bytes"""
+
+    def __init__(self, max_bytes=8 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+
+        self._surfaces = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key):
+        with self._lock:
+            surface = self._surfaces.get(key)
+            if surface is not None:
+                self._surfaces.move_to_end(key)
+            return surface
+
+    def put(self, key, surface):
+        with self._lock:
+            if key in self._surfaces:
+                self.size_bytes -= self._get_bytes(self._surfaces.pop(key))
+            self._surfaces[key] = surface
+            self.size_bytes += self._get_bytes(surface)
+
+            # the newest surface is always kept, even when it alone is over the budget
+            while self.size_bytes > self.max_bytes and len(self._surfaces) > 1:
+                _, evicted = self._surfaces.popitem(last=False)
+                self.size_bytes -= self._get_bytes(evicted)
+
+    def _get_bytes(self, surface):
+        return surface.get_pitch() * surface.get_height()
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._surfaces
+
+    def __len__(self):
+        return len(self._surfaces)
+
+
+class DiskCache:
+    """Surfaces saved in files named by the hash of their key, evicting the least recently used
+    files once they take more than max_bytes, so they outlive refreshes and restarts"""
+
+    def __init__(self, directory, max_bytes=32 * 1024 * 1024, format="opaque"):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.format = format
+        self.size_bytes = 0
+
+        # file name to size, least recently used first
+        self._files = OrderedDict()
+        self._lock = Lock()
+        self._load_index()
+
+    def _load_index(self):
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+        # file times carry the use order over restarts, as every read touches its file
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".raw") and entry.is_file():
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name, stat.st_size))
+            elif entry.name.endswith(".tmp"):
+                self._remove(entry.name)
+        for _, name, size in sorted(entries):
+            self._files[name] = size
+            self.size_bytes += size
+
+    def _get_name(self, key):
+        return hashlib.sha1(key.encode('utf-8')).hexdigest() + ".raw"
+
+    def _remove(self, name):
+        try:
+            os.remove(os.path.join(self.directory, name))
+        except OSError:
+            pass
+
+    def get(self, key):
+        name = self._get_name(key)
+        with self._lock:
+            if name not in self._files:
+                return None
+
+        path = os.path.join(self.directory, name)
+        surface = read_pixels(path, self.format)
+        with self._lock:
+            if surface is None:
+                self.size_bytes -= self._files.pop(name, 0)
+                self._remove(name)
+                return None
+            if name in self._files:
+                self._files.move_to_end(name)
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return surface
+
+    def put(self, key, surface):
+        name = self._get_name(key)
+        try:
+            size = write_pixels(os.path.join(self.directory, name), surface, self.format)
+        except OSError as e:
+            log_to_file("Unable to cache image {}: {}".format(key, e))
+            return
+
+        with self._lock:
+            self.size_bytes += size - self._files.pop(name, 0)
+            self._files[name] = size
+            while self.size_bytes > self.max_bytes and len(self._files) > 1:
+                evicted, evicted_size = self._files.popitem(last=False)
+                self.size_bytes -= evicted_size
+                self._remove(evicted)
+
+    def __len__(self):
+        return len(self._files)
+
+
+class ImageWorker(Thread):
+    def __init__(self, loader):
+        super(ImageWorker, self).__init__()
+
+        self.loader = loader
+        self.daemon = True
+
+    def run(self):
+        while True:
+            _, _, url = self.loader.jobs.get()
+            if self.loader.start(url):
+                self.loader.load(url)
+
+
+class ImageLoader:
+    """Download images on a few worker threads sharing one HTTP session, and decode and scale them
+    there to fit a box, so the UI thread only blits ready surfaces. With a cache directory, the
+    scaled images are also kept on disk and only downloaded again once evicted from there"""
+
+    def __init__(self, size, workers=3, max_bytes=8 * 1024 * 1024, timeout=(5, 15), source="image",
+                 cache_directory=None, cache_bytes=32 * 1024 * 1024):
+        self.size = size
+        self.timeout = timeout
+        self.source = source
+        self.cache_directory = cache_directory
+        self.cache_bytes = cache_bytes
+
+        self.cache = SurfaceCache(max_bytes=max_bytes)
+        # created by the first worker that needs it, so its directory is scanned off the UI thread
+        self.disk_cache = None
+        self._disk_cache_lock = Lock()
+        self.jobs = queue.PriorityQueue()
+        self.session = requests.Session()
+        # one pooled connection per worker, so requests to the same host reuse connections
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        # url to the priority it is queued with, until a worker starts loading it
+        self._queued = {}
+        self._loading = set()
+        self._failed = set()
+        self._lock = Lock()
+        self._order = itertools.count()
+        self._workers = [ImageWorker(self) for _ in range(workers)]
+        for worker in self._workers:
+            worker.start()
+
+    def request(self, url, priority=False):
+        """Queue an image unless it is loaded or queued already, images asked for with priority
+        are loaded before the others, even when they were queued without it"""
+        level = 0 if priority else 1
+        with self._lock:
+            if url in self._failed or url in self.cache or url in self._loading:
+                return
+            if url in self._queued and self._queued[url] <= level:
+                return
+            # the entry queued without priority stays in the queue, and is skipped once reached
+            self._queued[url] = level
+        self.jobs.put((level, next(self._order), url))
+
+    def start(self, url):
+        """Mark a queued image as loading, returning False when it was loaded from another entry"""
+        with self._lock:
+            if self._queued.pop(url, None) is None:
+                return False
+            self._loading.add(url)
+            return True
+
+    def get(self, url):
+        return self.cache.get(url)
+
+    def is_pending(self, url):
+        return url in self._queued or url in self._loading
+
+    def is_failed(self, url):
+        return url in self._failed
+
+    def load(self, url):
+        surface = None
+        try:
+            surface = self._load(url)
+        except Exception as e:
+            # anything going wrong fails this image only, and leaves the worker running
+            log_to_file("Unable to load image {}: {}".format(url, e))
+        finally:
+            with self._lock:
+                if surface is not None:
+                    self.cache.put(url, surface)
+                else:
+                    self._failed.add(url)
+                self._loading.discard(url)
+
+    def _load(self, url):
+        # the size is part of the key, so a box of another size gets its own scaled copy
+        disk_key = "{} {}x{}".format(url, *self.size)
+        disk_cache = self._get_disk_cache()
+        surface = disk_cache.get(disk_key) if disk_cache is not None else None
+        if surface is not None:
+            return surface.convert()
+
+        surface = self._scale(self._decode(self._download(url), url))
+        if disk_cache is not None:
+            disk_cache.put(disk_key, surface)
+        return surface
+
+    def _get_disk_cache(self):
+        with self._disk_cache_lock:
+            if self.disk_cache is None and self.cache_directory:
+                self.disk_cache = DiskCache(self.cache_directory, max_bytes=self.cache_bytes)
+            return self.disk_cache
+
+    def _download(self, url):
+        res = self.session.get(url, timeout=self.timeout)
+        registry.observe("fetch_seconds", res.elapsed.total_seconds(), source=self.source)
+        res.raise_for_status()
+        return res.content
+
+    def _decode(self, content, url):
+        # the extension tells pygame the format of data that has no file name
+        name_hint = os.path.basename(url.split('?')[0])
+        return pygame.image.load(io.BytesIO(content), name_hint)
+
+    def _scale(self, image):
+        image = pygame.transform.smoothscale(image.convert_alpha() if image.get_bitsize() < 24 else image,
+                                             fit_size(image.get_size(), self.size))
+        return image.convert()
+
+    def clear_failed(self):
+        """Let images that failed to load be requested again"""
+        with self._lock:
+            self._failed.clear()
@@ -0,0 +1,261 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+import os
+import time
+import psutil
+import numpy as np
+from threading import Thread, Event, Lock
+from lib.util import log_to_file
+
+
+class RingBuffer:
+    """Fixed-size float buffer that overwrites its oldest value, iterated oldest first like a queue.
+    Safe to append from a collector thread while another thread reads it"""
+
+    def __init__(self, size):
+        self.size = size
+
+        self._data = np.zeros(size, dtype=np.float64)
+        self._index = 0
+        self._count = 0
+        self._lock = Lock()
+
+    def append(self, value):
+        with self._lock:
+            self._data[self._index] = value
+            self._index = (self._index + 1) % self.size
+            self._count = min(self._count + 1, self.size)
+
+    def latest(self, default=0.0):
+        with self._lock:
+            if not self._count:
+                return default
+            return float(self._data[self._index - 1])
+
+    def get_values(self):
+        """Return a copy of the values, oldest first"""
+        with self._lock:
+            if self._count < self.size:
+                return self._data[:self._count].copy()
+            return np.concatenate((self._data[self._index:], self._data[:self._index]))
+
+    def clear(self):
+        with self._lock:
+            self._index = 0
+            self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        return iter(self.get_values().tolist())
+
+    def __reversed__(self):
+        return iter(self.get_values()[::-1].tolist())
+
+    def __array__(self, dtype=None, copy=None):
+        values = self.get_values()
+        return values.astype(dtype) if dtype is not None else values
+
+
+class MetricsHistory:
+    """Metric samples rolled up into tiers of decreasing resolution, each a fixed-size ring of
+    (timestamp, *metrics) rows, optionally kept in a memory-mapped file"""
+
+    metrics = ["cpu", "memory", "cpu_temp"]
+    version = 1
+
+    def __init__(self, tiers=((0.5, 1200), (10, 8640), (300, 4032)), path=None):
+        self.tiers = tiers
+        self.path = path
+
+        columns = 1 + len(self.metrics)
+        # version and tier count, then resolution, size, next index and row count of every tier
+        header_size = 2 + 4 * len(self.tiers)
+        total_size = header_size + sum(size * columns for _, size in self.tiers)
+        self._storage = self._open_storage(header_size, total_size)
+        self._header = self._storage[:header_size]
+        self._rows = []
+        offset = header_size
+        for _, size in self.tiers:
+            self._rows.append(self._storage[offset:offset + size * columns].reshape(size, columns))
+            offset += size * columns
+
+        # samples of the current bucket of every rolled up tier
+        self._buckets = [None] * len(self.tiers)
+        self._sums = np.zeros((len(self.tiers), len(self.metrics)))
+        self._counts = np.zeros((len(self.tiers), len(self.metrics)))
+
+    def _get_layout(self):
+        layout = [self.version, len(self.tiers)]
+        for resolution, size in self.tiers:
+            layout += [resolution, size, 0, 0]
+        return np.array(layout, dtype=np.float64)
+
+    def _open_storage(self, header_size, total_size):
+        layout = self._get_layout()
+        if not self.path:
+            storage = np.zeros(total_size, dtype=np.float64)
+            storage[:header_size] = layout
+            return storage
+
+        # reuse the history of a previous run, unless it was written with other tiers
+        if os.path.isfile(self.path) and os.path.getsize(self.path) == total_size * 8:
+            storage = np.memmap(self.path, dtype=np.float64, mode='r+', shape=(total_size,))
+            stored_tiers = storage[2:header_size].reshape(-1, 4)[:, :2]
+            if np.array_equal(storage[:2], layout[:2]) and \
+               np.array_equal(stored_tiers, layout[2:].reshape(-1, 4)[:, :2]):
+                return storage
+            del storage
+
+        log_to_file("Creating metrics history in {}".format(self.path))
+        storage = np.memmap(self.path, dtype=np.float64, mode='w+', shape=(total_size,))
+        storage[:header_size] = layout
+        return storage
+
+    def _append(self, tier, timestamp, values):
+        tier_header = 2 + 4 * tier
+        size = self.tiers[tier][1]
+        index = int(self._header[tier_header + 2])
+        self._rows[tier][index, 0] = timestamp
+        self._rows[tier][index, 1:] = values
+        self._header[tier_header + 2] = (index + 1) % size
+        self._header[tier_header + 3] = min(self._header[tier_header + 3] + 1, size)
+
+    def add(self, timestamp, values):
+        """Add one sample, with NaN for metrics that couldn't be read"""
+        values = np.asarray(values, dtype=np.float64)
+        self._append(0, timestamp, values)
+
+        valid = ~np.isnan(values)
+        for tier in range(1, len(self.tiers)):
+            resolution = self.tiers[tier][0]
+            bucket = int(timestamp // resolution)
+            if self._buckets[tier] is not None and bucket != self._buckets[tier]:
+                self._flush_bucket(tier)
+            self._buckets[tier] = bucket
+            self._sums[tier][valid] += values[valid]
+            self._counts[tier][valid] += 1
+
+    def _flush_bucket(self, tier):
+        counts = self._counts[tier]
+        means = np.full(len(self.metrics), np.nan)
+        np.divide(self._sums[tier], counts, out=means, where=counts > 0)
+        self._append(tier, self._buckets[tier] * self.tiers[tier][0], means)
+        self._sums[tier] = 0
+        self._counts[tier] = 0
+
+    def get_range(self, seconds, now=None):
+        """Return (resolution, timestamps, {metric: values}) of the last seconds, oldest first,
+        from the finest tier that covers them"""
+        now = time.time() if now is None else now
+        tier = len(self.tiers) - 1
+        for ind, (resolution, size) in enumerate(self.tiers):
+            if resolution * size >= seconds:
+                tier = ind
+                break
+
+        tier_header = 2 + 4 * tier
+        index = int(self._header[tier_header + 2])
+        count = int(self._header[tier_header + 3])
+        rows = self._rows[tier]
+        if count < len(rows):
+            rows = rows[:count]
+        else:
+            rows = np.concatenate((rows[index:], rows[:index]))
+        rows = rows[rows[:, 0] >= now - seconds]
+
+        return self.tiers[tier][0], rows[:, 0], {metric: rows[:, ind + 1] for ind, metric in enumerate(self.metrics)}
+
+    def flush(self):
+        if isinstance(self._storage, np.memmap):
+            self._storage.flush()
+
+
+class MetricsCollector(Thread):
+    """Sample system metrics on a background thread, so readers never wait on /proc or /sys"""
+
+    def __init__(self, interval=0.5, size=120, disk_interval=30, history_path=None):
+        super(MetricsCollector, self).__init__()
+
+        self.interval = interval
+        self.size = size
+        self.disk_interval = disk_interval
+        self.daemon = True
+
+        # raw samples for 10 minutes, 10 second means for a day and 5 minute means for two weeks
+        self.history = MetricsHistory(tiers=((interval, int(600 / interval)), (10, 8640), (300, 4032)),
+                                      path=history_path)
+
+        self.cpu = RingBuffer(size)
+        self.cpu_temp = RingBuffer(size)
+        self.memory = RingBuffer(size)
+        self.disk = RingBuffer(size)
+        self.net_sent = RingBuffer(size)
+        self.net_recv = RingBuffer(size)
+
+        self._disk_partitions = [partition.mountpoint for partition in psutil.disk_partitions()]
+        self._disk_total = 0
+        self._last_disk_sample = 0
+        self._last_cpu = 0
+        self._last_net = None
+        self._stop_event = Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            self.sample()
+            self._stop_event.wait(self.interval)
+
+    def sample(self):
+        # the first reading of cpu_percent is always 0, so keep the previous value instead
+        cpu = psutil.cpu_percent()
+        if cpu == 0:
+            cpu = self._last_cpu
+        self._last_cpu = cpu
+        self.cpu.append(cpu)
+        self.memory.append(psutil.virtual_memory().percent)
+
+        cpu_temp = self._get_cpu_temp()
+        if cpu_temp is not None:
+            self.cpu_temp.append(cpu_temp)
+        self.history.add(time.time(), [cpu, self.memory.latest(), np.nan if cpu_temp is None else cpu_temp])
+
+        # disk usage barely changes, so it is read less often than everything else
+        current_time = time.time()
+        if current_time - self._last_disk_sample >= self.disk_interval:
+            self.disk.append(self._get_disk_percent())
+            self._last_disk_sample = current_time
+
+        net = psutil.net_io_counters()
+        if self._last_net is not None:
+            elapsed = max(current_time - self._last_net[0], 1e-6)
+            self.net_sent.append((net.bytes_sent - self._last_net[1]) / elapsed)
+            self.net_recv.append((net.bytes_recv - self._last_net[2]) / elapsed)
+        self._last_net = (current_time, net.bytes_sent, net.bytes_recv)
+
+    def _get_cpu_temp(self):
+        try:
+            temperatures = psutil.sensors_temperatures()
+        except AttributeError:
+            return None
+
+        for sensor_name in temperatures:
+            if sensor_name.find('cpu') != -1 and len(temperatures[sensor_name]) > 0:
+                return temperatures[sensor_name][0].current
+        return None
+
+    def _get_disk_percent(self):
+        try:
+            usages = [psutil.disk_usage(path) for path in self._disk_partitions]
+        except OSError:
+            return 0.0
+
+        if not self._disk_total:
+            self._disk_total = float(sum(usage.total for usage in usages))
+        if not self._disk_total:
+            return 0.0
+        return sum(usage.used for usage in usages) / self._disk_total * 100
+
+    def stop(self):
+        self._stop_event.set()
+        self.history.flush()
@@ -3,17 +3,18 @@
 import os
 import time
 import glob
-import queue
-import psutil
 import pygame
+import numpy as np
 from abc import ABCMeta
 from datetime import datetime as dt
+from lib.assets import assets
 from lib.buttons import Button
 from lib.games import GameSnake, GameTetris, GameFlip
 from lib.widgets import News, NewsList, Weather, Calendar, Traffic, Stock, \
     SystemInfo, Time, NightTime, Content, Search, Chart, ChartCaption, Map, \
-    List, Calculator, Camera, QRCode, StatusBar
+    List, Calculator, Camera, QRCode, StatusBar, Watchlist
 from lib.popups import InfoPopup, ConfirmPopup, InputPopup
+from lib.exporter import registry
 
 
 class Panel:
@@ -60,6 +61,10 @@ class Panel:
     def is_always_update(self):
         return self.always_update
 
+    def is_animated(self):
+        """Whether the panel changes on its own between frames and needs the full frame rate"""
+        return self.popup is not None or self.active_widget is not None
+
     def enter(self):
         for button in self.buttons:
             button.set_active(True)
@@ -77,24 +82,45 @@ class Panel:
             widget.setup()
 
     def update(self):
-        self._on_update()
-        for widget in self.widgets:
-            widget.update()
+        profiler = self.app.profiler
+        with profiler.section(type(self).__name__ + " update"):
+            self._on_update()
+            for widget in self.widgets:
+                if profiler.enabled or registry.enabled:
+                    update_start = time.perf_counter()
+                    widget.update()
+                    update_time = time.perf_counter() - update_start
+                    registry.observe("widget_update_seconds", update_time, widget=type(widget).__name__)
+                    profiler.record("{}.{} update".format(type(self).__name__, type(widget).__name__), update_time)
+                else:
+                    widget.update()
 
-        if self.popup:
-            self.popup.update()
-            if not self.popup.is_active:
-                self.popup = None
+            if self.popup:
+                self.popup.update()
+                if not self.popup.is_active:
+                    self.popup = None
 
-    def draw(self, screen):
-        self._on_draw(screen)
+    def tick(self, dt):
         for widget in self.widgets:
-            widget.draw(screen)
-        for button in self.buttons:
-            button.draw(screen)
+            widget.tick(dt)
 
-        if self.popup:
-            self.popup.draw(screen)
+    def draw(self, screen):
+        profiler = self.app.profiler
+        with profiler.section(type(self).__name__ + " draw"):
+            self._on_draw(screen)
+            for widget in self.widgets:
+                if profiler.enabled:
+                    draw_start = time.perf_counter()
+                    widget.draw(screen)
+                    profiler.record("{}.{} draw".format(type(self).__name__, type(widget).__name__),
+                                    time.perf_counter() - draw_start)
+                else:
+                    widget.draw(screen)
+            for button in self.buttons:
+                button.draw(screen)
+
+            if self.popup:
+                self.popup.draw(screen)
 
     def handle_events(self, event):
         if self.popup:
@@ -136,6 +162,9 @@ class Panel:
     def set_setting(self, name, value):
         return self.app.set_setting(name, value)
 
+    def watch_setting(self, name, callback):
+        self.app.watch_setting(name, callback)
+
     def handle_panel_events(self, event):
         pass
 
@@ -171,21 +200,20 @@ class MainPanel(Panel):
         self.systeminfo_widget = SystemInfo(self, 10, 10, ip_info=False)
         self.traffic_widget = Traffic(self, 180, 10)
         self.statusbar_widget = StatusBar(self, 0, 10, centered=True)
+        self.watchlist_widget = Watchlist(self, 10, 150)
         self.widgets = [self.news_widget, self.weather_widget, self.time_widget,
                         self.calendar_widget, self.systeminfo_widget, self.traffic_widget,
-                        self.statusbar_widget]
+                        self.statusbar_widget, self.watchlist_widget]
 
         self._night_icon_path = os.path.join("images", "icon", "night.gif")
         self._night_icon_size = 25
-        self._night_icon = pygame.transform.scale(pygame.image.load(self._night_icon_path),
-                                                  (self._night_icon_size, ) * 2)
+        self._night_icon = assets.get(self._night_icon_path, self._night_icon_size)
         self.night_button = Button(self, -1, self.screen_height - self._night_icon_size + 1,
                                    image=self._night_icon, on_click=self.enter_night_mode)
 
         self._settings_icon_path = os.path.join("images", "icon", "settings.png")
         self._settings_icon_size = 24
-        self._settings_icon = pygame.transform.scale(pygame.image.load(self._settings_icon_path),
-                                                     (self._settings_icon_size, ) * 2)
+        self._settings_icon = assets.get(self._settings_icon_path, self._settings_icon_size)
         self._settings_button = Button(self, self.screen_width - self._settings_icon_size, 
                                        self.screen_height - self._settings_icon_size,
                                        image=self._settings_icon, on_click=self.settings_popup,
@@ -194,7 +222,7 @@ class MainPanel(Panel):
         self.buttons = [self.night_button, self._settings_button]
 
     def _on_update(self):
-        now = dt.now()
+        now = dt.fromtimestamp(time.time())
         if now.hour == 0 and now.minute == 0 and now.second == 0:
             self.enter_night_mode()
 
@@ -214,6 +242,8 @@ class MainPanel(Panel):
                 self.weather_widget.get_location_from_popup()
             elif event.key == pygame.K_u:
                 self.settings_popup()
+            elif event.key == pygame.K_w:
+                self.watchlist_widget.set_symbols()
 
     def enter_night_mode(self):
         self.app.set_active_panel(self.app.night_panel)
@@ -235,11 +265,12 @@ class NightPanel(Panel):
         self.time_widget = NightTime(self)
         self.widgets = [self.time_widget]
 
-        self._curr_hour = dt.now().hour
-        self._curr_minute = dt.now().minute
+        now = dt.fromtimestamp(time.time())
+        self._curr_hour = now.hour
+        self._curr_minute = now.minute
 
     def _on_update(self):
-        now = dt.now()
+        now = dt.fromtimestamp(time.time())
         self.curr_hour = now.hour
         self.curr_minute = now.minute
         self.curr_sec = now.second
@@ -314,14 +345,11 @@ class SystemInfoPanel(Panel):
         self._caption_font = pygame.font.Font("fonts/FreeSans.ttf", 13)
         self._info_font = pygame.font.Font("fonts/FreeSans.ttf", 13)
 
-        self._max_size = 120
-        self._update_interval = 0.5
-        self._cpu_info = queue.Queue(maxsize=self._max_size)
-        self._last_cpu_info = 0
-        self._memory_info = queue.Queue(maxsize=self._max_size)
-        self._cputemp_info = queue.Queue(maxsize=self._max_size)
-        self._system_info = {"CPU": self._cpu_info, "Memory": self._memory_info,
-                             "CPU Temp": self._cputemp_info}
+        metrics = self.app.metrics
+        self._max_size = metrics.size
+        self._update_interval = metrics.interval
+        self._system_info = {"CPU": metrics.cpu, "Memory": metrics.memory,
+                             "CPU Temp": metrics.cpu_temp}
         self._info_colors = {"CPU": "green", "Memory": "yellow", "CPU Temp": "orange"}
 
         self.title_widget = Content(self, 10, 10, "System Info", font=self._title_font)
@@ -340,41 +368,65 @@ class SystemInfoPanel(Panel):
         self.caption_widget = ChartCaption(self, 357, 10, self._info_colors,
                                            font=self._caption_font)
         self.statusbar_widget = StatusBar(self, 15, 40)
-        self.widgets = [self.title_widget, self.chart_widget, self._info_widget, self.caption_widget, self.statusbar_widget]
-
-        self._last_update = time.time()
+        self.range_widget = Content(self, 40, 74, "", font=self._info_font)
+        self.widgets = [self.title_widget, self.chart_widget, self._info_widget, self.caption_widget,
+                        self.statusbar_widget, self.range_widget]
+
+        # the live range reads the sample buffers, longer ones read the rolled up history
+        self._ranges = [("1 min", 60, "s"), ("10 min", 600, "s"), ("1 hour", 3600, "min"),
+                        ("1 day", 86400, "min"), ("1 week", 604800, "h")]
+        self._range_units = {"s": 1, "min": 60, "h": 3600}
+        self._range_metrics = {"CPU": "cpu", "Memory": "memory", "CPU Temp": "cpu_temp"}
+        self._range_ind = 0
+        self._range_resolution = self._update_interval
+        self._range_last_update = 0
+        self._set_range(0)
+
+    def _set_range(self, ind):
+        self._range_ind = ind
+        name, seconds, unit = self._ranges[ind]
+        self.range_widget.set_text("Last {} ({})".format(name, unit))
+        self._range_last_update = 0
+        if ind == 0:
+            self.chart_widget.set_info(self._system_info)
+            self._set_chart_x_axis(self._update_interval)
+
+    def _set_chart_x_axis(self, resolution):
+        _, seconds, unit = self._ranges[self._range_ind]
+        scale = self._range_units[unit]
+        self.chart_widget.set_x_range(0, seconds // scale)
+        self.chart_widget.set_x_unit(resolution / scale)
+        self.chart_widget.set_x_label_interval(seconds // scale // 6)
 
     def _on_update(self):
         current_time = time.time()
-        if self._max_size <= 0 or current_time - self._last_update < self._update_interval:
+        if self._range_ind == 0 or current_time - self._range_last_update < self._range_resolution:
             return
-        if self._cpu_info.full():
-            self._cpu_info.get_nowait()
-        if self._memory_info.full():
-            self._memory_info.get_nowait()
-        if self._cputemp_info.full():
-            self._cputemp_info.get_nowait()
-
-        cpu_info = psutil.cpu_percent()
-        if cpu_info == 0:
-            cpu_info = self._last_cpu_info
-        else:
-            self._last_cpu_info = cpu_info
-        self._cpu_info.put(cpu_info)
-        self._memory_info.put(psutil.virtual_memory().percent)
 
-        try:
-            temperatures = psutil.sensors_temperatures()
-        except AttributeError:
-            temperatures = []
-        for sensor_name in temperatures:
-            if sensor_name.find('cpu') != -1:
-                cpu_temps = temperatures[sensor_name]
-                if len(cpu_temps) > 0:
-                    cpu_temp = cpu_temps[0].current
-                    self._cputemp_info.put(cpu_temp)
+        seconds = self._ranges[self._range_ind][1]
+        resolution, timestamps, values = self.app.metrics.history.get_range(seconds)
+        # samples are placed by their time, newest last, so times without samples stay gaps
+        # in the curves instead of being left out or drawn as zero
+        slots = int(seconds // resolution)
+        slot_indices = slots - 1 - ((current_time - timestamps) // resolution).astype(int)
+        in_range = (slot_indices >= 0) & (slot_indices < slots)
+        info = {}
+        for name, metric in self._range_metrics.items():
+            if len(values[metric]) and not np.isnan(values[metric]).all():
+                info[name] = np.full(slots, np.nan)
+                info[name][slot_indices[in_range]] = values[metric][in_range]
+
+        self.chart_widget.set_info(info)
+        self._set_chart_x_axis(resolution)
+        self._range_resolution = resolution
+        self._range_last_update = current_time
 
-        self._last_update = current_time
+    def handle_panel_events(self, event):
+        if event.type == pygame.KEYDOWN:
+            if event.key == pygame.K_UP and self._range_ind > 0:
+                self._set_range(self._range_ind - 1)
+            elif event.key == pygame.K_DOWN and self._range_ind < len(self._ranges) - 1:
+                self._set_range(self._range_ind + 1)
 
 
 class StockPanel(Panel):
@@ -427,12 +479,15 @@ class CameraPanel(Panel):
     def __init__(self, app):
         super(CameraPanel, self).__init__(app)
 
-        self.camera_widget = Camera(self, 0, 0)
+        self.camera_widget = Camera(self, 0, 0, source=self.get_setting('camera_source', 0))
         self.widgets = [self.camera_widget]
 
     def _on_enter(self):
         self.set_active_widget(self.camera_widget)
 
+    def is_animated(self):
+        return True
+
     def handle_panel_events(self, event):
         if event.type == pygame.KEYDOWN:
             if event.key == pygame.K_RETURN:
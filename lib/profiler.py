@@ -0,0 +1,200 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+import time
+import psutil
+import pygame
+import numpy as np
+from collections import OrderedDict
+from datetime import datetime as dt
+from lib.metrics import RingBuffer
+from lib.util import log_to_file
+
+
+class ProfileSection:
+    """Time a with block into a profiler section, doing nothing while the profiler is disabled"""
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+        self._start = None
+
+    def __enter__(self):
+        self._start = time.perf_counter() if self.profiler.enabled else None
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._start is not None:
+            self.profiler.record(self.name, time.perf_counter() - self._start)
+
+
+class StartupTimer:
+    """Time of every startup step, reported with the time from process start to the first frame"""
+
+    enabled = True
+
+    def __init__(self):
+        self._timings = OrderedDict()
+        self._reported = False
+
+    def section(self, name):
+        return ProfileSection(self, name)
+
+    def record(self, name, seconds):
+        self._timings[name] = self._timings.get(name, 0) + seconds
+
+    def get_process_time(self):
+        """Seconds since the process started, interpreter startup and imports included"""
+        try:
+            return time.time() - psutil.Process().create_time()
+        except (psutil.Error, OSError):
+            return None
+
+    def report(self):
+        if self._reported:
+            return
+        self._reported = True
+
+        process_time = self.get_process_time()
+        steps = ", ".join("{} {:.0f} ms".format(name, seconds * 1000) for name, seconds in self._timings.items())
+        if process_time is None:
+            log_to_file("Startup: {}".format(steps))
+        else:
+            log_to_file("Startup: first frame {:.2f} s after process start ({})".format(process_time, steps))
+
+
+class FrameProfiler:
+    """Per-frame time of every section, kept for the last frames to report percentiles"""
+
+    def __init__(self, size=600, enabled=False):
+        self.size = size
+        self.enabled = enabled
+        self.overlay_visible = False
+
+        self._timings = OrderedDict()
+        self._sections = {}
+        self._frame = OrderedDict()
+        self._frame_start = None
+        self._last_frame_start = None
+
+        self._font = pygame.font.Font('fonts/FreeSans.ttf', 12)
+        self._overlay = None
+        self._overlay_last_update = 0
+        self._overlay_update_interval = 1
+        self._overlay_rows = 10
+
+    def section(self, name):
+        if name not in self._sections:
+            self._sections[name] = ProfileSection(self, name)
+        return self._sections[name]
+
+    def record(self, name, seconds):
+        """Add time to a section of the current frame, sections entered many times are summed"""
+        if self.enabled:
+            self._frame[name] = self._frame.get(name, 0) + seconds
+
+    def begin_frame(self):
+        if not self.enabled:
+            self._last_frame_start = None
+            return
+
+        self._frame_start = time.perf_counter()
+        if self._last_frame_start is not None:
+            self._add("interval", self._frame_start - self._last_frame_start)
+        self._last_frame_start = self._frame_start
+
+    def end_frame(self):
+        if not self.enabled or self._frame_start is None:
+            return
+
+        self._add("frame", time.perf_counter() - self._frame_start)
+        for name, seconds in self._frame.items():
+            self._add(name, seconds)
+        self._frame.clear()
+        self._frame_start = None
+
+    def _add(self, name, seconds):
+        if name not in self._timings:
+            self._timings[name] = RingBuffer(self.size)
+        self._timings[name].append(seconds)
+
+    def toggle_overlay(self):
+        self.overlay_visible = not self.overlay_visible
+        if self.overlay_visible:
+            self.enabled = True
+        self._overlay_last_update = 0
+
+    def clear(self):
+        self._timings.clear()
+        self._frame.clear()
+
+    def get_stats(self):
+        """Return (name, frames, mean, p50, p95, p99, max) in milliseconds, slowest p95 first"""
+        stats = []
+        for name, timings in list(self._timings.items()):
+            if not len(timings):
+                continue
+            values = timings.get_values() * 1000
+            p50, p95, p99 = np.percentile(values, [50, 95, 99])
+            stats.append((name, len(values), float(values.mean()), float(p50), float(p95),
+                          float(p99), float(values.max())))
+
+        # the whole frame and its interval come first, as the budget everything else adds up to
+        stats.sort(key=lambda row: (row[0] not in ("interval", "frame"), -row[4]))
+        return stats
+
+    def format_stats(self):
+        lines = ["{:<40} {:>6} {:>8} {:>8} {:>8} {:>8} {:>8}".format(
+            "section (ms)", "frames", "mean", "p50", "p95", "p99", "max")]
+        for row in self.get_stats():
+            lines.append("{:<40} {:>6} {:>8.2f} {:>8.2f} {:>8.2f} {:>8.2f} {:>8.2f}".format(*row))
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path=None):
+        if path is None:
+            path = "profile-{}.txt".format(dt.now().strftime("%Y%m%d-%H%M%S"))
+
+        try:
+            with open(path, 'w') as f:
+                f.write(self.format_stats())
+        except OSError as e:
+            log_to_file("Unable to save profile to {}: {}".format(path, e))
+            return None
+
+        log_to_file("Profile saved to {}".format(path))
+        return path
+
+    def draw(self, screen):
+        if not self.overlay_visible:
+            return
+
+        # the text is only rendered once a second, so the overlay barely shows up in its own numbers
+        current_time = time.time()
+        if self._overlay is None or current_time - self._overlay_last_update > self._overlay_update_interval:
+            self._overlay = self._render_overlay()
+            self._overlay_last_update = current_time
+
+        screen.blit(self._overlay, (screen.get_width() - self._overlay.get_width() - 5, 5))
+
+    def _render_overlay(self):
+        rows = [("section (ms)", "p50", "p95", "p99")]
+        for name, _, _, p50, p95, p99, _ in self.get_stats()[:self._overlay_rows]:
+            rows.append((name, "{:.1f}".format(p50), "{:.1f}".format(p95), "{:.1f}".format(p99)))
+
+        rendered = [[self._font.render(text, True, (0, 255, 0)) for text in row] for row in rows]
+        column_widths = [max(row[ind].get_width() for row in rendered) for ind in range(4)]
+        line_height = self._font.get_linesize()
+        padding = 4
+
+        width = sum(column_widths) + padding * 5
+        height = line_height * len(rendered) + padding * 2
+        overlay = pygame.Surface((width, height), pygame.SRCALPHA)
+        overlay.fill((0, 0, 0, 220))
+        for row_ind, row in enumerate(rendered):
+            x = padding
+            for ind, text in enumerate(row):
+                # names are left aligned and numbers right aligned
+                offset = 0 if ind == 0 else column_widths[ind] - text.get_width()
+                overlay.blit(text, (x + offset, padding + row_ind * line_height))
+                x += column_widths[ind] + padding
+        return overlay
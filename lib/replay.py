@@ -0,0 +1,135 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+import gzip
+import json
+import pygame
+from lib.clock import VirtualClock
+from lib.util import log_to_file
+
+
+class EventRecorder:
+    """Write the time and input events of every frame to a gzipped file with one JSON line per frame"""
+
+    version = 1
+    event_types = [pygame.QUIT, pygame.KEYDOWN, pygame.KEYUP, pygame.MOUSEMOTION,
+                   pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP]
+
+    def __init__(self, path, seed, start_time):
+        self.path = path
+        self.start_time = start_time
+
+        self._file = gzip.open(path, 'wt')
+        self._write({"version": self.version, "seed": seed, "start_time": start_time})
+        self._frames = 0
+
+    def _write(self, line):
+        self._file.write(json.dumps(line, separators=(',', ':')) + "\n")
+
+    def record(self, frame_time, events):
+        recorded_events = []
+        for event in events:
+            if event.type not in self.event_types:
+                continue
+            attributes = {name: list(value) if isinstance(value, tuple) else value
+                          for name, value in event.dict.items()
+                          if isinstance(value, (int, float, str, bool, tuple))}
+            recorded_events.append([event.type, attributes])
+
+        # milliseconds are enough to replay time based updates, and keep idle frames a few bytes long
+        line = [round(frame_time - self.start_time, 3)]
+        if recorded_events:
+            line.append(recorded_events)
+        self._write(line)
+        self._frames += 1
+
+    def close(self):
+        self._file.close()
+        log_to_file("Recorded {} frames to {}".format(self._frames, self.path))
+
+
+class ReplayedKeys:
+    """Stand-in for the sequence pygame.key.get_pressed returns"""
+
+    def __init__(self, pressed):
+        self._pressed = pressed
+
+    def __getitem__(self, key):
+        return key in self._pressed
+
+
+class EventReplayer:
+    """Return recorded events frame by frame at their recorded time, and answer input state
+    queries from them"""
+
+    def __init__(self, path):
+        self.path = path
+
+        with gzip.open(path, 'rt') as f:
+            header = json.loads(f.readline())
+            if header.get("version") != EventRecorder.version:
+                raise ValueError("Unsupported recording version {}".format(header.get("version")))
+            lines = [json.loads(line) for line in f if line.strip()]
+
+        self.seed = header["seed"]
+        self.start_time = header["start_time"]
+        self.total_frames = len(lines)
+
+        self._times = [line[0] for line in lines]
+        self._events = {}
+        for frame, line in enumerate(lines):
+            if len(line) < 2:
+                continue
+            self._events[frame] = [pygame.event.Event(event_type, {
+                name: tuple(value) if isinstance(value, list) else value for name, value in attributes.items()
+            }) for event_type, attributes in line[1]]
+
+        self.clock = VirtualClock(start=self.start_time)
+        self._pressed_keys = set()
+        self._mods = 0
+        self._mouse_pos = (0, 0)
+        self._mouse_buttons = [False, False, False]
+        self._real_functions = None
+
+    def is_done(self, frame):
+        return frame >= self.total_frames
+
+    def get_events(self, frame):
+        """Move the clock to the time of the frame and return its events"""
+        if frame < self.total_frames:
+            self.clock.now = self.start_time + self._times[frame]
+
+        events = self._events.get(frame, [])
+        for event in events:
+            self._apply(event)
+        return events
+
+    def _apply(self, event):
+        if event.type == pygame.KEYDOWN:
+            self._pressed_keys.add(event.key)
+            self._mods = event.mod
+        elif event.type == pygame.KEYUP:
+            self._pressed_keys.discard(event.key)
+            self._mods = event.mod
+        elif event.type == pygame.MOUSEMOTION:
+            self._mouse_pos = event.pos
+        elif event.type in (pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP):
+            self._mouse_pos = event.pos
+            if 1 <= event.button <= 3:
+                self._mouse_buttons[event.button - 1] = event.type == pygame.MOUSEBUTTONDOWN
+
+    def install(self):
+        """Make time, keyboard and mouse state queries follow the recording instead of the devices"""
+        self.clock.install()
+        self._real_functions = (pygame.key.get_pressed, pygame.key.get_mods,
+                                pygame.mouse.get_pos, pygame.mouse.get_pressed)
+        pygame.key.get_pressed = lambda: ReplayedKeys(self._pressed_keys)
+        pygame.key.get_mods = lambda: self._mods
+        pygame.mouse.get_pos = lambda: self._mouse_pos
+        pygame.mouse.get_pressed = lambda *args: tuple(self._mouse_buttons)
+
+    def uninstall(self):
+        self.clock.uninstall()
+        if self._real_functions is not None:
+            (pygame.key.get_pressed, pygame.key.get_mods,
+             pygame.mouse.get_pos, pygame.mouse.get_pressed) = self._real_functions
+            self._real_functions = None
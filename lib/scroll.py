@@ -0,0 +1,62 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+from bisect import bisect_left, bisect_right
+
+
+class VirtualList:
+    """Heights of list items kept as cumulative offsets, so finding the items in view or the start
+    that brings an item into view is a binary search instead of a sum over the items"""
+
+    def __init__(self, heights=()):
+        self.set_heights(heights)
+
+    def set_heights(self, heights):
+        self._offsets = [0]
+        for height in heights:
+            self._offsets.append(self._offsets[-1] + height)
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def get_total(self):
+        return self._offsets[-1]
+
+    def get_offset(self, index):
+        """Distance from the top of the list to the top of an item"""
+        return self._offsets[max(min(index, len(self)), 0)]
+
+    def get_height(self, index):
+        return self._offsets[index + 1] - self._offsets[index]
+
+    def index_at(self, offset):
+        """Index of the item covering an offset from the top of the list"""
+        if not len(self):
+            return 0
+        return max(min(bisect_right(self._offsets, offset) - 1, len(self) - 1), 0)
+
+    def get_end(self, start, height):
+        """Index after the last item that fits whole in height from start"""
+        return max(bisect_right(self._offsets, self.get_offset(start) + height) - 1, start)
+
+    def can_scroll(self, start, height):
+        """Whether items from start on take more than height"""
+        return self.get_total() - self.get_offset(start) > height
+
+    def scroll_to(self, start, index, height):
+        """Start closest to the current one that shows the whole item at index"""
+        if index < start:
+            return index
+        if index < self.get_end(start, height):
+            return start
+        return min(bisect_left(self._offsets, self._offsets[index + 1] - height), index)
+
+    def get_pages(self, height):
+        """(start, end) of pages of whole items that fit in height, an item taller than the page
+        gets a page of its own"""
+        pages = []
+        start = 0
+        while start < len(self):
+            end = max(self.get_end(start, height), start + 1)
+            pages.append((start, end))
+            start = end
+        return pages
@@ -0,0 +1,121 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+import os
+import copy
+import time
+import yaml
+from threading import Thread, Event, Lock
+from lib.util import log_to_file
+
+
+class SettingsStore(Thread):
+    """Settings parsed once and kept in memory, saved on a background thread once they stop
+    changing for a moment, so a burst of changes is one write and the UI never waits on the disk"""
+
+    def __init__(self, path, delay=1.0):
+        super(SettingsStore, self).__init__()
+
+        self.path = path
+        self.delay = delay
+        self.daemon = True
+
+        self._settings = self._load()
+        self._listeners = {}
+        self._lock = Lock()
+        self._save_lock = Lock()
+        self._dirty = False
+        self._last_change = 0
+        self._changed_event = Event()
+        self._stop_event = Event()
+
+    def _load(self):
+        if not os.path.isfile(self.path):
+            return {}
+
+        with open(self.path, 'r') as f:
+            try:
+                settings = yaml.safe_load(f)
+            except yaml.YAMLError as e:
+                log_to_file("Unable to load settings from {}: {}".format(self.path, e))
+                return {}
+        return settings if isinstance(settings, dict) else {}
+
+    def get(self, name, default=None):
+        """Return a setting, storing the default for missing ones so the file lists every setting"""
+        with self._lock:
+            if name in self._settings:
+                return self._settings[name]
+            self._settings[name] = default
+        self._schedule_save()
+        return default
+
+    def set(self, name, value):
+        with self._lock:
+            if name in self._settings and self._settings[name] == value:
+                return True
+            self._settings[name] = value
+        self._schedule_save()
+
+        for callback in list(self._listeners.get(name, [])):
+            callback(name, value)
+        return True
+
+    def add_listener(self, name, callback):
+        """Call callback(name, value) whenever a setting changes, on the thread that changed it"""
+        self._listeners.setdefault(name, []).append(callback)
+
+    def remove_listener(self, name, callback):
+        if callback in self._listeners.get(name, []):
+            self._listeners[name].remove(callback)
+
+    def _schedule_save(self):
+        with self._lock:
+            self._dirty = True
+            self._last_change = time.time()
+        self._changed_event.set()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            self._changed_event.wait()
+            self._changed_event.clear()
+
+            # wait until the settings have been left alone for the delay
+            while not self._stop_event.is_set():
+                remaining = self._last_change + self.delay - time.time()
+                if remaining <= 0:
+                    break
+                self._stop_event.wait(remaining)
+
+            self.save()
+
+    def save(self):
+        """Write pending changes now, returning whether anything was written"""
+        # held for the whole write, so stop() returns only once a save in progress is on disk
+        with self._save_lock:
+            with self._lock:
+                if not self._dirty:
+                    return False
+                settings = copy.deepcopy(self._settings)
+                self._dirty = False
+
+            # written next to the file and renamed, so a crash or power cut never leaves half a file
+            temp_path = self.path + ".tmp"
+            try:
+                with open(temp_path, 'w') as f:
+                    yaml.dump(settings, f)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(temp_path, self.path)
+            except OSError as e:
+                log_to_file("Unable to save settings to {}: {}".format(self.path, e))
+                with self._lock:
+                    self._dirty = True
+                return False
+
+        log_to_file("Settings saved to {}".format(self.path))
+        return True
+
+    def stop(self):
+        self._stop_event.set()
+        self._changed_event.set()
+        self.save()
@@ -0,0 +1,273 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+import os
+import json
+import time
+import random
+import argparse
+import statistics
+from multiprocessing import Pool
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import pygame  # noqa: E402
+from lib.util import percentile  # noqa: E402
+
+
+class HeadlessPanel:
+    """Stand-in for a Panel, so games can be created without a display or an App"""
+
+    def __init__(self, width=480, height=320):
+        self.app = None
+        self.args = None
+        self.screen_width = width
+        self.screen_height = height
+        self.invert_screen = False
+        self.buttons = []
+        self.popup = None
+
+    def set_active_widget(self, widget):
+        pass
+
+    def get_setting(self, name, default=None):
+        return default
+
+    def set_setting(self, name, value):
+        return False
+
+
+class GameSimulation:
+    """Step a game's logic without rendering it"""
+
+    def __init__(self, name, seed=0, max_steps=10000):
+        self.name = name
+        self.seed = seed
+        self.max_steps = max_steps
+
+        self.game = None
+        self.steps = 0
+        self._tetris_target = None
+        self.step_times = []
+
+    def _create_game(self):
+        from lib.games import GameSnake, GameTetris, GameFlip
+
+        panel = HeadlessPanel()
+        if self.name == "snake":
+            game = GameSnake(panel, lambda: None, total_rows=16, total_cols=16)
+        elif self.name == "tetris":
+            game = GameTetris(panel, lambda: None, total_rows=16, total_cols=10)
+        elif self.name == "flip":
+            game = GameFlip(panel, lambda: None, board_size=10, border_width=1)
+        else:
+            raise ValueError("Unknown game: {}".format(self.name))
+
+        game.setup()
+        return game
+
+    def _start(self):
+        if self.name == "snake":
+            self.game._init_game()
+            self.game._auto_play = True
+            self.game._start_game()
+        elif self.name == "tetris":
+            self.game._init_game()
+            self.game._start_game()
+        else:
+            self.game._player1_mode = "auto"
+            self.game._player2_mode = "auto"
+            self.game._init_game()
+
+    def _is_running(self):
+        if self.name == "snake":
+            return self.game._game_started
+        return not self.game._game_over
+
+    def _play_tetris_block(self):
+        # greedy placement policy, applied once for every new block: try every rotation and
+        # column on a copy of the board and steer the block to the best one
+        game = self.game
+        board = [[False] * game.total_cols for _ in range(game.total_rows)]
+        for block in game._fixed_blocks:
+            for point in block.points:
+                board[point.row][point.col] = True
+
+        shape = game._active_block.shape
+        best = None
+        for rotations in range(4):
+            cells = [(row, col) for row in range(len(shape)) for col in range(len(shape[0])) if shape[row][col] == 'x']
+            for col in range(game.total_cols - len(shape[0]) + 1):
+                rating = self._rate_tetris_placement(board, cells, col)
+                if rating is not None and (best is None or rating > best[0]):
+                    best = (rating, rotations, col)
+            # the same rotation as GameTetris._rotate_clockwise
+            shape = [[shape[len(shape) - 1 - y][x] for y in range(len(shape))] for x in range(len(shape[0]))]
+
+        if best is None:
+            return
+        _, rotations, self._tetris_target = best
+        for _ in range(rotations):
+            game._rotate_block()
+
+    def _steer_tetris_block(self):
+        # a rotated block can stick out above the board, where it can't move sideways until it falls
+        # into it, so the block is moved towards its column before every step
+        if self._tetris_target is None:
+            return
+        col = self.game._active_block.get_origin()[1]
+        while col != self._tetris_target:
+            if self._tetris_target < col:
+                self.game._move_left()
+            else:
+                self.game._move_right()
+            next_col = self.game._active_block.get_origin()[1]
+            if next_col == col:
+                break
+            col = next_col
+
+    @staticmethod
+    def _rate_tetris_placement(board, cells, col):
+        """Rate dropping cells at a column, higher is better, or None if they don't fit at the top"""
+        total_rows, total_cols = len(board), len(board[0])
+
+        def fits(row):
+            return all(row + r < total_rows and not board[row + r][col + c] for r, c in cells)
+
+        if not fits(0):
+            return None
+        row = 0
+        while fits(row + 1):
+            row += 1
+
+        placed = [line[:] for line in board]
+        for r, c in cells:
+            placed[row + r][col + c] = True
+        remaining = [line for line in placed if not all(line)]
+        cleared = total_rows - len(remaining)
+        placed = [[False] * total_cols for _ in range(cleared)] + remaining
+
+        heights = []
+        holes = 0
+        for c in range(total_cols):
+            column = [line[c] for line in placed]
+            top = column.index(True) if True in column else total_rows
+            heights.append(total_rows - top)
+            holes += column[top:].count(False)
+        bumpiness = sum(abs(a - b) for a, b in zip(heights, heights[1:]))
+        # weights of the common four feature tetris heuristic
+        return 0.76 * cleared - 0.51 * sum(heights) - 0.36 * holes - 0.18 * bumpiness
+
+    def get_score(self):
+        if self.name == "flip":
+            return len(self.game._player1_cells)
+        return self.game._score
+
+    def run(self):
+        random.seed(self.seed)
+        self.game = self._create_game()
+        self._start()
+
+        self.steps = 0
+        self.step_times = []
+        self._tetris_target = None
+        last_block = None
+        while self._is_running() and self.steps < self.max_steps:
+            if self.name == "tetris" and self.game._active_block is not last_block:
+                last_block = self.game._active_block
+                self._play_tetris_block()
+            if self.name == "tetris":
+                self._steer_tetris_block()
+
+            start_time = time.perf_counter()
+            self.game.step()
+            self.step_times.append(time.perf_counter() - start_time)
+            self.steps += 1
+
+        return {"seed": self.seed, "score": self.get_score(), "steps": self.steps,
+                "finished": not self._is_running(), "step_times": self.step_times}
+
+
+def _simulate(task):
+    name, seed, max_steps = task
+    if not pygame.font.get_init():
+        pygame.font.init()
+    return GameSimulation(name, seed=seed, max_steps=max_steps).run()
+
+
+def run_benchmark(name, total_games=100, processes=None, seed=0, max_steps=10000):
+    """Run total_games seeded simulations of a game in a process pool and summarize them"""
+    tasks = [(name, seed + ind, max_steps) for ind in range(total_games)]
+
+    start_time = time.perf_counter()
+    with Pool(processes) as pool:
+        results = pool.map(_simulate, tasks)
+    elapsed = time.perf_counter() - start_time
+
+    scores = sorted(result["score"] for result in results)
+    step_times = sorted(t for result in results for t in result["step_times"])
+    total_steps = sum(result["steps"] for result in results)
+
+    return {
+        "game": name,
+        "games": total_games,
+        "seed": seed,
+        "elapsed": elapsed,
+        "games_per_sec": total_games / elapsed if elapsed else 0.0,
+        "moves_per_sec": total_steps / elapsed if elapsed else 0.0,
+        "unfinished": sum(1 for result in results if not result["finished"]),
+        "score": {
+            "min": scores[0] if scores else 0,
+            "max": scores[-1] if scores else 0,
+            "mean": statistics.mean(scores) if scores else 0.0,
+            "stdev": statistics.pstdev(scores) if scores else 0.0,
+            "p25": percentile(scores, 25),
+            "p50": percentile(scores, 50),
+            "p75": percentile(scores, 75),
+        },
+        "step_latency_ms": {
+            "p50": percentile(step_times, 50) * 1000,
+            "p95": percentile(step_times, 95) * 1000,
+            "p99": percentile(step_times, 99) * 1000,
+            "max": step_times[-1] * 1000 if step_times else 0.0,
+        },
+    }
+
+
+def print_report(report):
+    print("{}: {} games in {:.2f}s ({:.1f} games/s, {:.0f} moves/s, {} unfinished)".format(
+        report["game"], report["games"], report["elapsed"], report["games_per_sec"],
+        report["moves_per_sec"], report["unfinished"]))
+    score = report["score"]
+    print("  score: min {} | p25 {:.1f} | p50 {:.1f} | p75 {:.1f} | max {} | mean {:.2f} ± {:.2f}".format(
+        score["min"], score["p25"], score["p50"], score["p75"], score["max"], score["mean"], score["stdev"]))
+    latency = report["step_latency_ms"]
+    print("  step latency (ms): p50 {:.3f} | p95 {:.3f} | p99 {:.3f} | max {:.3f}".format(
+        latency["p50"], latency["p95"], latency["p99"], latency["max"]))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-g', '--game', action='append', choices=["snake", "tetris", "flip"],
+                        help="game to simulate, can be repeated (default: all)")
+    parser.add_argument('-n', '--games', action='store', type=int,
+                        default=100, help="number of games to simulate")
+    parser.add_argument('-p', '--processes', action='store', type=int,
+                        default=None, help="size of the process pool")
+    parser.add_argument('-s', '--seed', action='store', type=int,
+                        default=0, help="seed of the first game")
+    parser.add_argument('-m', '--max-steps', action='store', type=int,
+                        default=10000, help="maximum steps per game")
+    parser.add_argument('-j', '--json', action='store_true',
+                        default=False, help="print the reports as JSON")
+    args = parser.parse_args()
+
+    reports = [run_benchmark(name, total_games=args.games, processes=args.processes,
+                             seed=args.seed, max_steps=args.max_steps)
+               for name in (args.game or ["snake", "tetris", "flip"])]
+    if args.json:
+        print(json.dumps(reports, indent=2))
+    else:
+        for report in reports:
+            print_report(report)
@@ -1,6 +1,24 @@
 #!/usr/bin/python3
 # -*- coding: utf-8 -*-
-from lib.util import in_sorted, bytes_to_string, choices
+import os
+import time
+import queue
+import pygame
+import numpy as np
+from datetime import date, datetime
+from lib.util import in_sorted, bytes_to_string, choices, percentile, scale_matrix, lttb, \
+    iter_occurrences, fit_size
+from lib.metrics import RingBuffer
+from lib.exporter import MetricsExporter, Registry
+from lib.replay import EventRecorder, EventReplayer
+from lib.assets import AssetCache
+from lib.settings import SettingsStore
+from lib.events import EventStore
+from lib.images import SurfaceCache, DiskCache, ImageLoader
+from lib.cache import ResponseCache
+from lib.scroll import VirtualList
+from lib.widgets import Content, Chart, Time
+from lib.threads import QRCodeThread
 
 
 class TestUtils:
@@ -39,3 +57,368 @@ class TestUtils:
         assert len(choices(list2, k=2)) == 2
         assert len(choices(list2, k=3)) == 3
         assert len(choices(long_list, k=1000)) == 1000
+
+    def test_percentile(self):
+        assert percentile([], 50) == 0.0
+        assert percentile([5], 99) == 5
+        assert percentile([1, 2, 3, 4, 5], 0) == 1
+        assert percentile([1, 2, 3, 4, 5], 50) == 3
+        assert percentile([1, 2, 3, 4, 5], 100) == 5
+        assert percentile([1, 2, 3, 4], 50) == 2.5
+        assert percentile([0, 10], 95) == 9.5
+
+    def test_scale_matrix(self):
+        matrix = [[1, 0], [0, 1]]
+        assert scale_matrix(matrix, 2).tolist() == matrix
+        assert scale_matrix(matrix, 4).tolist() == [[1, 1, 0, 0], [1, 1, 0, 0],
+                                                    [0, 0, 1, 1], [0, 0, 1, 1]]
+        assert scale_matrix(matrix, 3, 1).tolist() == [[1], [1], [0]]
+
+    def test_lttb(self):
+        assert lttb([1, 2, 3], 5).tolist() == [0, 1, 2]
+        values = [0] * 100
+        values[37] = 50
+        values[80] = -50
+        indices = lttb(values, 10).tolist()
+        assert len(indices) == 10
+        assert indices[0] == 0 and indices[-1] == 99
+        assert 37 in indices and 80 in indices
+        assert indices == sorted(indices)
+
+    def test_fit_size(self):
+        assert fit_size((800, 600), (400, 400)) == (400, 300)
+        assert fit_size((600, 800), (400, 400)) == (300, 400)
+        assert fit_size((100, 100), (460, 260)) == (260, 260)
+
+    def test_iter_occurrences(self):
+        start = date(2020, 2, 1)
+        end = date(2020, 3, 31)
+        assert list(iter_occurrences(date(2020, 2, 3), '', start, end)) == [date(2020, 2, 3)]
+        assert list(iter_occurrences(date(2019, 2, 3), '', start, end)) == []
+        assert len(list(iter_occurrences(date(2020, 1, 1), 'daily', start, end))) == 60
+        assert list(iter_occurrences(date(2020, 1, 1), 'weekly', start, date(2020, 2, 14))) == \
+            [date(2020, 2, 5), date(2020, 2, 12)]
+        assert list(iter_occurrences(date(2020, 1, 31), 'monthly', start, end)) == [date(2020, 3, 31)]
+        assert list(iter_occurrences(date(2016, 2, 29), 'yearly', date(2017, 1, 1), date(2024, 12, 31))) == \
+            [date(2020, 2, 29), date(2024, 2, 29)]
+        assert list(iter_occurrences(date(2020, 3, 15), 'monthly', start, end)) == [date(2020, 3, 15)]
+
+
+class TestMetrics:
+    def test_ring_buffer(self):
+        buffer = RingBuffer(3)
+        assert len(buffer) == 0
+        assert buffer.latest() == 0.0
+        for value in [1, 2, 3, 4]:
+            buffer.append(value)
+        assert len(buffer) == 3
+        assert buffer.latest() == 4
+        assert list(buffer) == [2, 3, 4]
+        assert list(reversed(buffer)) == [4, 3, 2]
+
+    def test_exporter_render(self):
+        registry = Registry()
+        registry.histogram("frame_seconds", "Frame time", (0.01, 0.1))
+        registry.histogram("widget_update_seconds", "Widget update time")
+        registry.gauge("fps", "Frame rate")
+        exporter = MetricsExporter(registry=registry)
+        for value in [0.005, 0.05, 0.5]:
+            registry.observe("frame_seconds", value)
+        registry.observe("widget_update_seconds", 0.25, widget="Chart")
+        lines = exporter.render().splitlines()
+        assert '# TYPE rpi_frame_seconds histogram' in lines
+        assert 'rpi_frame_seconds_bucket{le="0.1"} 2' in lines
+        assert 'rpi_frame_seconds_bucket{le="+Inf"} 3' in lines
+        assert 'rpi_frame_seconds_count 3' in lines
+        assert 'rpi_widget_update_seconds_sum{widget="Chart"} 0.25' in lines
+        assert not any(line.startswith("rpi_fps") for line in lines)
+
+
+class TestReplay:
+    def test_record_and_replay(self, tmp_path):
+        path = str(tmp_path / "events.gz")
+        recorder = EventRecorder(path, seed=7, start_time=100.0)
+        recorder.record(100.1, [])
+        recorder.record(100.2, [pygame.event.Event(pygame.KEYDOWN, key=pygame.K_LSHIFT, mod=1, unicode=""),
+                                pygame.event.Event(pygame.MOUSEMOTION, pos=(10, 20), rel=(1, 1), buttons=(0, 0, 0))])
+        recorder.record(100.3, [pygame.event.Event(pygame.KEYUP, key=pygame.K_LSHIFT, mod=0, unicode="")])
+        recorder.close()
+
+        replayer = EventReplayer(path)
+        assert replayer.seed == 7 and replayer.total_frames == 3
+        replayer.install()
+        try:
+            assert replayer.get_events(0) == [] and time.time() == 100.1
+            events = replayer.get_events(1)
+            assert [event.type for event in events] == [pygame.KEYDOWN, pygame.MOUSEMOTION]
+            assert events[1].pos == (10, 20)
+            assert pygame.key.get_pressed()[pygame.K_LSHIFT] and pygame.mouse.get_pos() == (10, 20)
+            replayer.get_events(2)
+            assert not pygame.key.get_pressed()[pygame.K_LSHIFT] and time.time() == 100.3
+            assert replayer.is_done(3)
+        finally:
+            replayer.uninstall()
+
+    def test_replayed_date(self, tmp_path):
+        pygame.font.init()
+        path = str(tmp_path / "events.gz")
+        start_time = datetime(2020, 2, 29, 23, 59).timestamp()
+        recorder = EventRecorder(path, seed=7, start_time=start_time)
+        recorder.record(start_time + 120, [])
+        recorder.close()
+
+        # widgets read the date through time.time, so a replay shows the recorded one
+        replayer = EventReplayer(path)
+        replayer.install()
+        try:
+            replayer.get_events(0)
+            parent = type("Parent", (), {"screen_width": 480, "screen_height": 320})()
+            widget = Time(parent)
+            widget._on_update()
+            assert (widget.date_str, widget.time_str) == ("Sunday, Mar 01", "00:01")
+        finally:
+            replayer.uninstall()
+
+
+class TestAssets:
+    def test_asset_cache(self, tmp_path, monkeypatch):
+        monkeypatch.setenv("SDL_VIDEODRIVER", "dummy")
+        pygame.display.init()
+        pygame.display.set_mode((1, 1))
+        try:
+            path = os.path.join("images", "weather", "01d.png")
+            cache = AssetCache(cache_directory=str(tmp_path))
+            icon = cache.get(path, 20)
+            assert icon.get_size() == (20, 20) and cache.get(path, (20, 20)) is icon
+            assert cache.get(path).get_size() == (50, 50) and cache.loaded == 2
+
+            # a new cache reads the scaled pixels back from disk instead of the png
+            disk_cache = AssetCache(cache_directory=str(tmp_path))
+            cached_icon = disk_cache.get(path, 20)
+            assert disk_cache.loaded == 0 and disk_cache.cached == 1
+            assert pygame.image.tostring(cached_icon, "RGBA") == pygame.image.tostring(icon, "RGBA")
+        finally:
+            pygame.display.quit()
+
+
+class TestSettings:
+    def test_settings_store(self, tmp_path):
+        path = str(tmp_path / "settings.yaml")
+        store = SettingsStore(path, delay=0.2)
+        changes = []
+        store.add_listener("brightness", lambda name, value: changes.append(value))
+        store.start()
+
+        assert store.get("brightness", default=9) == 9
+        store.set("brightness", 5)
+        store.set("brightness", 5)
+        store.set("background_type", 2)
+        assert changes == [5]
+        assert not os.path.exists(path)
+
+        # the changes are written together once they settle
+        time.sleep(0.5)
+        assert SettingsStore(path).get("brightness") == 5
+        store.set("background_type", 3)
+        store.stop()
+        assert SettingsStore(path).get("background_type") == 3
+        assert os.listdir(str(tmp_path)) == ["settings.yaml"]
+
+
+class TestImages:
+    def test_surface_cache(self):
+        # 100 x 100 x 4 bytes each, so three fit in the budget
+        cache = SurfaceCache(max_bytes=3 * 40000)
+        for key in "abc":
+            cache.put(key, pygame.Surface((100, 100), 0, 32))
+        assert cache.get("a") is not None
+        cache.put("d", pygame.Surface((100, 100), 0, 32))
+        assert "b" not in cache and "a" in cache and len(cache) == 3
+        assert cache.size_bytes == 3 * 40000
+
+        cache.put("large", pygame.Surface((400, 400), 0, 32))
+        assert len(cache) == 1 and cache.get("large") is not None
+
+    def test_disk_cache(self, tmp_path):
+        directory = str(tmp_path / "images")
+        surfaces = {}
+        for ind, key in enumerate(["a", "b", "c"]):
+            surfaces[key] = pygame.Surface((50, 50), 0, 32)
+            surfaces[key].fill((ind * 100, 0, 0))
+
+        cache = DiskCache(directory)
+        for key in "ab":
+            cache.put(key, surfaces[key])
+        assert pygame.image.tostring(cache.get("a"), "RGB") == pygame.image.tostring(surfaces["a"], "RGB")
+        assert cache.get("c") is None
+
+        # a new cache picks up the files, with "a" now the most recently used
+        os.utime(os.path.join(directory, cache._get_name("b")), (0, 0))
+        cache = DiskCache(directory, max_bytes=cache.size_bytes)
+        assert len(cache) == 2
+        cache.put("c", surfaces["c"])
+        assert cache.get("b") is None and cache.get("a") is not None and cache.get("c") is not None
+        assert len(os.listdir(directory)) == len(cache)
+
+    def test_loader_priority(self):
+        loader = ImageLoader((10, 10), workers=0)
+        for url in "abc":
+            loader.request(url)
+        loader.request("c", priority=True)
+        loader.request("c")
+
+        # the image asked for with priority comes first, and its older entry is skipped
+        started = []
+        while not loader.jobs.empty():
+            url = loader.jobs.get()[2]
+            if loader.start(url):
+                started.append(url)
+        assert started == ["c", "a", "b"] and loader.is_pending("c")
+
+        # an image that fails in any way stops being pending
+        def fail(url):
+            raise RuntimeError("broken")
+        loader._load = fail
+        loader.load("c")
+        assert not loader.is_pending("c") and loader.is_failed("c")
+
+
+class TestThreads:
+    def test_qr_code_failure(self, monkeypatch):
+        def fail(self):
+            raise RuntimeError("broken")
+
+        results = queue.Queue()
+        monkeypatch.setattr(QRCodeThread, "_make", fail)
+        monkeypatch.setattr("lib.threads.log_to_file", lambda content: None)
+        QRCodeThread(results, ("text", None, 0), 100).run()
+        assert results.get_nowait() == (("text", None, 0), False)
+
+
+class TestScroll:
+    def test_virtual_list(self):
+        items = VirtualList([20, 40, 20, 60, 20])
+        assert len(items) == 5 and items.get_total() == 160
+        assert items.get_offset(3) == 80 and items.get_height(3) == 60
+        assert [items.index_at(offset) for offset in [0, 19, 20, 159, 500]] == [0, 0, 1, 4, 4]
+
+        # 100 pixels from the top hold the first three items whole
+        assert items.get_end(0, 100) == 3
+        assert items.can_scroll(0, 100) and not items.can_scroll(3, 100)
+        assert items.scroll_to(0, 2, 100) == 0
+        assert items.scroll_to(0, 4, 100) == 2
+        assert items.scroll_to(3, 1, 100) == 1
+
+        assert items.get_pages(80) == [(0, 3), (3, 5)]
+        # the 60 pixel item is taller than the page, and is put on a page of its own
+        assert items.get_pages(50) == [(0, 1), (1, 2), (2, 3), (3, 4), (4, 5)]
+        assert VirtualList().get_pages(80) == [] and VirtualList().index_at(10) == 0
+
+
+class TestWidgets:
+    def test_content_keeps_height(self):
+        pygame.font.init()
+        parent = type("Parent", (), {"screen_width": 480, "screen_height": 320})()
+        font = pygame.font.Font("fonts/FreeSans.ttf", 17)
+        text = "a title long enough to wrap over a few lines of the list it is shown in"
+        content = Content(parent, 0, 0, text, font=font, max_width=200, prefix="- ")
+        content.setup()
+        height = content.get_height()
+        assert len(content.get_lines()) > 1
+
+        # every setup wraps the text in the same width, so moving it keeps its lines
+        for y in range(5):
+            content.set_pos(0, y * 10)
+            content.setup()
+        assert content.get_height() == height and content.max_width == 200
+
+    def test_chart_gaps(self):
+        parent = type("Parent", (), {"screen_width": 480, "screen_height": 320})()
+        chart = Chart(parent, 0, 0, width=10, max_x=100)
+        values = np.arange(100, dtype=np.float64)
+        values[40:60] = np.nan
+
+        # the reduced curve has no missing points, only a marker where the gap was
+        curve = chart._get_curve_values("cpu", values, values)
+        markers = [ind for ind, (_, value) in enumerate(curve) if np.isnan(value)]
+        assert len(markers) == 1 and len(curve) == 11
+        assert curve[markers[0] - 1][0] < 40 <= 60 <= curve[markers[0] + 1][0]
+
+        chart.set_info({"cpu": values})
+        chart._add_curves()
+        assert len(chart._shapes) == 2
+
+
+class TestEvents:
+    def test_import_xml(self, tmp_path):
+        db_path = str(tmp_path / "calendar.db")
+        xml_path = str(tmp_path / "calendar.xml")
+        with open(xml_path, 'w') as f:
+            f.write("<html><body><event><date>2020-01-01</date></event></body></html>\n")
+
+        # an event without a name fails the import, which leaves nothing behind and runs again
+        try:
+            EventStore(db_path, xml_path)
+            assert False, "import of a broken calendar succeeded"
+        except AttributeError:
+            pass
+
+        with open(xml_path, 'w') as f:
+            f.write("<html><body>"
+                    "<event><name>a</name><date>2020-01-01</date><status>0</status></event>"
+                    "<event><name>b</name><date>2020-01-02</date><recurrence>weekly</recurrence></event>"
+                    "</body></html>\n")
+        store = EventStore(db_path, xml_path)
+        assert store.get_events() == [(1, 'a', '2020-01-01', 0, ''), (2, 'b', '2020-01-02', 1, 'weekly')]
+        store.close()
+
+        # the xml is only imported into a new database
+        store = EventStore(db_path, xml_path)
+        assert len(store.get_events()) == 2
+        store.close()
+
+    def test_occurrences_and_update(self, tmp_path):
+        store = EventStore(str(tmp_path / "calendar.db"), xml_path=None)
+        monthly = store.add_event("rent", "2020-01-31", recurrence='monthly')
+        single = store.add_event("trip", "2020-02-10")
+
+        occurrences = store.get_occurrences(date(2020, 1, 1), date(2020, 3, 31))
+        assert [(row[0], row[2]) for row in occurrences] == \
+            [(monthly, '2020-01-31'), (single, '2020-02-10'), (monthly, '2020-03-31')]
+
+        # changes are seen by months already expanded
+        store.update_event(single, "trip", "2020-03-01", 0)
+        store.set_status(monthly, 0)
+        occurrences = store.get_occurrences(date(2020, 2, 1), date(2020, 3, 31))
+        assert [(row[2], row[3]) for row in occurrences] == [('2020-03-01', 0), ('2020-03-31', 0)]
+
+        # only the last few months viewed stay expanded
+        store.get_occurrences(date(2020, 1, 1), date(2021, 12, 31))
+        assert list(store._month_cache)[-1] == (2021, 12)
+        assert len(store._month_cache) == store._month_cache_size
+
+        # recurring events are listed at their next occurrence, their stored date is left as is
+        upcoming = dict((row[0], row[2]) for row in store.get_upcoming())
+        assert upcoming[monthly] >= date.today().isoformat() and upcoming[single] == '2020-03-01'
+        assert store.get_events(recurring=True)[0][2] == '2020-01-31'
+        store.close()
+
+
+class TestCache:
+    def test_response_cache_disk_limit(self, tmp_path):
+        directory = str(tmp_path / "responses")
+        cache = ResponseCache(max_entries=1, directory=directory)
+        for symbol in "abc":
+            cache.put((symbol, "GLOBAL_QUOTE"), {"symbol": symbol, "data": list(range(200))})
+
+        # only the newest entry is in memory, the others are read back from disk
+        assert cache.get(("a", "GLOBAL_QUOTE")) is None
+        assert cache.load(("a", "GLOBAL_QUOTE"))[1]["symbol"] == "a"
+
+        # a new cache picks up the files, and evicts the least recently used beyond its budget
+        os.utime(os.path.join(directory, cache._get_name(("b", "GLOBAL_QUOTE"))), (0, 0))
+        cache = ResponseCache(directory=directory, max_disk_bytes=cache.disk_bytes)
+        assert len(cache._files) == 3
+        cache.put(("d", "GLOBAL_QUOTE"), {"symbol": "d", "data": list(range(200))})
+        assert cache.load(("b", "GLOBAL_QUOTE")) is None and cache.load(("d", "GLOBAL_QUOTE")) is not None
+        assert len(os.listdir(directory)) == len(cache._files) == 3
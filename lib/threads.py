@@ -1,10 +1,11 @@
 #!/usr/bin/python3
 # -*- coding: utf-8 -*-
-import os
+import time
 import requests
-import random
 import pygame
-from threading import Thread
+import numpy as np
+from threading import Thread, Event
+from lib.util import scale_matrix, log_to_file
 
 
 class RequestThread(Thread):
@@ -21,28 +22,25 @@ class RequestThread(Thread):
         self.queue.put(res.json())
 
 
-class ImageFetchThread(Thread):
-    def __init__(self, url, news, directory):
-        super(ImageFetchThread, self).__init__()
+class FetchThread(Thread):
+    """Run a function that waits on the network and put its result, or None when it raised, in a queue
+    that a widget reads in a later update"""
 
-        self.url = url
-        self.news = news
-        self.directory = directory
+    def __init__(self, queue, fetch, *args):
+        super(FetchThread, self).__init__()
+
+        self.queue = queue
+        self.fetch = fetch
+        self.args = args
         self.daemon = True
 
     def run(self):
-        if not self.news['imageName']:
-            return
-
-        image_path = os.path.join(self.directory, self.news['imageName'])
-        if os.path.isfile(image_path):
-            prefix = str(random.randint(100000, 1000000)) + "-"
-            new_image_name = prefix + self.news['imageName']
-            image_path = os.path.join(self.directory, new_image_name)
-            self.news['imageName'] = new_image_name
-
-        with open(image_path, 'wb') as f:
-            f.write(requests.get(self.url).content)
+        result = None
+        try:
+            result = self.fetch(*self.args)
+        finally:
+            # a fetch that failed still ends, so the widget can start another one
+            self.queue.put(result)
 
 
 class ImageRotateThread(Thread):
@@ -59,3 +57,133 @@ class ImageRotateThread(Thread):
         rotate_image = pygame.transform.rotate(self.image, self.degree)
         rotate_rect = rotate_image.get_rect(center=self.center)
         self.queue.put((rotate_image, rotate_rect))
+
+
+class QRCodeThread(Thread):
+    def __init__(self, queue, key, size):
+        super(QRCodeThread, self).__init__()
+
+        self.queue = queue
+        self.key = key
+        self.size = size
+        self.daemon = True
+
+    def run(self):
+        # None means the text doesn't fit, False that making the code failed for another reason;
+        # the key is always answered, so the widget stops waiting for it either way
+        try:
+            pixels = self._make()
+        except Exception as e:
+            log_to_file("Failed to make QR code: {}".format(e))
+            pixels = False
+        self.queue.put((self.key, pixels))
+
+    def _make(self):
+        # qrcode and cv2 are imported by the threads that use them, so they don't slow down startup
+        import qrcode
+        from qrcode.exceptions import DataOverflowError
+
+        text, version, error_correction = self.key
+        qr = qrcode.QRCode(version=version, error_correction=error_correction, border=1)
+        qr.add_data(text)
+        try:
+            qr.make(fit=version is None)
+        except (DataOverflowError, ValueError):
+            return None
+
+        # dark modules are True, so invert them into white background pixels
+        modules = ~np.array(qr.get_matrix(), dtype=bool).T
+        pixels = scale_matrix(modules, self.size).astype(np.uint8) * 255
+        return np.repeat(pixels[:, :, None], 3, axis=2)
+
+
+class CaptureThread(Thread):
+    def __init__(self, source=0, fps=0):
+        super(CaptureThread, self).__init__()
+
+        self.source = source
+        self.fps = fps
+        self.daemon = True
+
+        self.capture_fps = 0
+        self.dropped_frames = 0
+
+        self._capture = None
+        self._frames = None
+        self._latest = (0, None)
+        self._stop_event = Event()
+
+    def _open(self):
+        if isinstance(self.source, (int, str)):
+            import cv2
+            self._capture = cv2.VideoCapture(self.source)
+        elif hasattr(self.source, 'read'):
+            self._capture = self.source
+        else:
+            self._frames = iter(self.source)
+
+    def _read(self):
+        if self._frames is not None:
+            return next(self._frames, None)
+
+        ret, frame = self._capture.read()
+        if not ret and isinstance(self.source, str):
+            # loop video files, so they can stand in for a live camera
+            import cv2
+            self._capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self._capture.read()
+        return frame if ret else None
+
+    def run(self):
+        self._open()
+
+        frame_count = 0
+        last_count_time = time.time()
+        while not self._stop_event.is_set():
+            read_time = time.time()
+            frame = self._read()
+            if frame is None:
+                break
+
+            # single slot handoff: the newest frame replaces the previous one whether
+            # or not it was consumed, so readers never wait and never see stale frames
+            sequence = self._latest[0] + 1
+            self._latest = (sequence, frame)
+            frame_count += 1
+
+            current_time = time.time()
+            if current_time - last_count_time >= 1:
+                self.capture_fps = int(frame_count / (current_time - last_count_time))
+                frame_count = 0
+                last_count_time = current_time
+
+            if self.fps > 0:
+                self._stop_event.wait(max(0, 1 / self.fps - (time.time() - read_time)))
+
+        if self._capture is not None:
+            self._capture.release()
+
+    def get_frame(self, last_sequence=0):
+        """Return the newest frame and its sequence number, counting the frames skipped since last_sequence"""
+        sequence, frame = self._latest
+        if last_sequence and sequence > last_sequence + 1:
+            self.dropped_frames += sequence - last_sequence - 1
+        return sequence, frame
+
+    def stop(self):
+        self._stop_event.set()
+
+
+def test_pattern(width=320, height=240):
+    """Generate moving color bars in BGR, as a stand-in for camera frames"""
+    bars = np.zeros((height, width, 3), dtype=np.uint8)
+    colors = [(255, 255, 255), (0, 255, 255), (255, 255, 0), (0, 255, 0),
+              (255, 0, 255), (0, 0, 255), (255, 0, 0), (0, 0, 0)]
+    bar_width = width // len(colors) + 1
+    for ind, color in enumerate(colors):
+        bars[:, ind * bar_width:(ind + 1) * bar_width] = color
+
+    offset = 0
+    while True:
+        yield np.roll(bars, offset, axis=1)
+        offset = (offset + 4) % width
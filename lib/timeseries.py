@@ -0,0 +1,53 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+import numpy as np
+
+
+class TimeSeries:
+    """Columns of an AlphaVantage time series, newest entry first"""
+
+    fields = {'open': '1. open', 'high': '2. high', 'low': '3. low',
+              'close': '4. close', 'volume': '5. volume'}
+
+    def __init__(self, timestamps, open, high, low, close, volume):
+        self.timestamps = timestamps
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+
+    @classmethod
+    def from_response(cls, response, time_series_key):
+        """Parse one time series of a response into int64 timestamps and float64 columns"""
+        if not response or not response.get(time_series_key):
+            return None
+
+        time_series = response[time_series_key]
+        keys = sorted(time_series, reverse=True)
+        entries = [time_series[key] for key in keys]
+        timestamps = np.array(keys, dtype='datetime64[s]').astype(np.int64)
+        columns = {name: np.array([entry.get(field, 'nan') for entry in entries], dtype=np.float64)
+                   for name, field in cls.fields.items()}
+        return cls(timestamps, **columns)
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def __getitem__(self, index):
+        # basic slices of numpy arrays are views, so ranges don't copy any data
+        if not isinstance(index, slice):
+            raise TypeError("TimeSeries only supports slicing")
+        return TimeSeries(self.timestamps[index], self.open[index], self.high[index],
+                          self.low[index], self.close[index], self.volume[index])
+
+    def get_day_length(self):
+        """Return the number of entries on the same day as the newest one"""
+        if not len(self):
+            return 0
+        days = self.timestamps // 86400
+        different = np.flatnonzero(days != days[0])
+        return int(different[0]) if len(different) else len(days)
+
+    def get_midpoints(self):
+        return (self.high + self.low) // 2
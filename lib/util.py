@@ -1,9 +1,11 @@
 import math
+import calendar
 import pygame
 import random
+import numpy as np
 import requests
 import netifaces as ni
-from datetime import datetime as dt
+from datetime import datetime as dt, timedelta
 
 
 __PYGAME_KEYS = {
@@ -242,3 +244,95 @@ def get_public_ip():
         return ""
     except requests.exceptions.ConnectionError:
         return ""
+
+
+def percentile(values, percent):
+    """Return the given percentile of a sorted list using linear interpolation"""
+    if not values:
+        return 0.0
+
+    rank = (len(values) - 1) * percent / 100.0
+    lower = int(math.floor(rank))
+    upper = int(math.ceil(rank))
+    if lower == upper:
+        return float(values[lower])
+    return values[lower] + (values[upper] - values[lower]) * (rank - lower)
+
+
+def scale_matrix(matrix, width, height=None):
+    """Scale a 2D array to width x height (indexed [x, y]) with nearest-neighbour sampling"""
+    matrix = np.asarray(matrix)
+    height = width if height is None else height
+    x_index = np.arange(width) * matrix.shape[0] // width
+    y_index = np.arange(height) * matrix.shape[1] // height
+    return matrix[x_index[:, None], y_index[None, :]]
+
+
+def fit_size(size, box):
+    """Return the largest size with the aspect ratio of size that fits in box"""
+    width, height = size
+    box_width, box_height = box
+    if box_width / box_height > width / height:
+        return max(int(box_height * width / height), 1), box_height
+    return box_width, max(int(box_width * height / width), 1)
+
+
+def lttb(values, threshold):
+    """Return the indices of the points kept when reducing values to threshold points with
+    the Largest-Triangle-Three-Buckets algorithm"""
+    values = np.asarray(values, dtype=np.float64)
+    total = len(values)
+    if threshold >= total or threshold < 3:
+        return np.arange(total)
+
+    indices = np.zeros(threshold, dtype=np.int64)
+    indices[-1] = total - 1
+    bucket_size = (total - 2) / (threshold - 2)
+    selected = 0
+    for bucket in range(threshold - 2):
+        start = int(bucket * bucket_size) + 1
+        end = int((bucket + 1) * bucket_size) + 1
+        next_end = min(int((bucket + 2) * bucket_size) + 1, total)
+        average_x = (end + next_end - 1) / 2.0
+        average_y = values[end:next_end].mean()
+
+        # keep the point forming the largest triangle with the previously kept point
+        # and the average of the next bucket
+        bucket_x = np.arange(start, end)
+        areas = np.abs((selected - average_x) * (values[start:end] - values[selected]) -
+                       (selected - bucket_x) * (average_y - values[selected]))
+        selected = start + int(np.argmax(areas))
+        indices[bucket + 1] = selected
+    return indices
+
+
+def iter_occurrences(first, recurrence, start, end):
+    """Lazily yield the dates in [start, end] of an event on date first, repeating
+    daily, weekly, monthly or yearly. Months without the day of first are skipped."""
+    if not recurrence:
+        if start <= first <= end:
+            yield first
+        return
+
+    start = max(start, first)
+    if recurrence in ('daily', 'weekly'):
+        step = 1 if recurrence == 'daily' else 7
+        current = first + timedelta(days=-(-(start - first).days // step) * step)
+        while current <= end:
+            yield current
+            current += timedelta(days=step)
+        return
+
+    step = 1 if recurrence == 'monthly' else 12
+    months = (start.year - first.year) * 12 + start.month - first.month
+    months -= months % step
+    while True:
+        year, month = divmod(first.year * 12 + first.month - 1 + months, 12)
+        month += 1
+        if (year, month) > (end.year, end.month):
+            return
+        if first.day <= calendar.monthrange(year, month)[1]:
+            current = first.replace(year=year, month=month)
+            if start <= current <= end:
+                yield current
+        months += step
@@ -0,0 +1,147 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+import time
+import requests
+from collections import OrderedDict
+from threading import Thread, Condition
+from lib.cache import ResponseCache
+from lib.exporter import registry
+from lib.util import log_to_file
+
+
+class StockScheduler(Thread):
+    """Send AlphaVantage requests one at a time, spread over the rate limit of every API key"""
+
+    url = "https://www.alphavantage.co/query"
+    default_keys = ["T9O3IK0TF72YCBP8", "JEIP3D1ZI2UTJZUL", "TI8F72SY4LKSD23L"]
+
+    def __init__(self, keys=None, requests_per_minute=5, cache_directory=None, cache_size=32, max_retries=2):
+        super(StockScheduler, self).__init__()
+
+        self.keys = keys if keys else self.default_keys
+        self.requests_per_minute = requests_per_minute
+        self.cache = ResponseCache(max_entries=cache_size, directory=cache_directory, timeouts={
+            "GLOBAL_QUOTE": 60,
+            "TIME_SERIES_INTRADAY": 300,
+            "TIME_SERIES_DAILY": 3600
+        })
+        self.max_retries = max_retries
+        self.daemon = True
+
+        # requests are spaced evenly so the combined limit of all keys is never exceeded
+        self._request_interval = 60.0 / (self.requests_per_minute * len(self.keys))
+        self._next_request_time = 0
+        self._key_index = 0
+        self._pending = OrderedDict()
+        self._retries = {}
+        self._disk_checks = []
+        self._condition = Condition()
+        self._done = False
+
+    @staticmethod
+    def get_key(params):
+        return (params.get("symbol"), params.get("function"), params.get("interval"))
+
+    def request(self, params, queue):
+        """Put (key, response) on the queue once the request is sent. A cached response is put
+        right away, and is followed by a fresh one if it has expired."""
+        key = self.get_key(params)
+        entry = self.cache.get(key)
+        if entry is not None:
+            queue.put((key, entry[1]))
+            if self.cache.is_fresh(key, entry[0]):
+                return
+
+        with self._condition:
+            # requests for the same data share one slot and get the same response
+            if key in self._pending:
+                if queue not in self._pending[key][1]:
+                    self._pending[key][1].append(queue)
+            else:
+                self._pending[key] = (dict(params), [queue])
+                if entry is None and self.cache.directory:
+                    self._disk_checks.append(key)
+            self._condition.notify()
+
+    def is_pending(self, params):
+        with self._condition:
+            return self.get_key(params) in self._pending
+
+    def stop(self):
+        with self._condition:
+            self._done = True
+            self._condition.notify()
+
+    def run(self):
+        while True:
+            with self._condition:
+                while not self._pending and not self._done:
+                    self._condition.wait()
+                if self._done:
+                    return
+
+                if self._disk_checks:
+                    key = self._disk_checks.pop(0)
+                else:
+                    key = None
+
+            if key is not None:
+                self._load_from_disk(key)
+                continue
+
+            with self._condition:
+                wait_time = self._next_request_time - time.time()
+                if wait_time > 0:
+                    self._condition.wait(wait_time)
+                    continue
+
+                key, (params, _) = next(iter(self._pending.items()))
+                api_key = self.keys[self._key_index]
+                self._key_index = (self._key_index + 1) % len(self.keys)
+                self._next_request_time = time.time() + self._request_interval
+
+            response = self._send(params, api_key)
+
+            with self._condition:
+                if response.get("Note") and self._retries.get(key, 0) < self.max_retries:
+                    # the limit was hit anyway, so back off for a whole window and try again
+                    self._retries[key] = self._retries.get(key, 0) + 1
+                    self._pending.move_to_end(key)
+                    self._next_request_time = time.time() + 60
+                    log_to_file("Stock request {} rate limited, retrying".format(key))
+                    continue
+
+                _, queues = self._pending.pop(key)
+                self._retries.pop(key, None)
+
+            if not response.get("Note") and not response.get("Error Message") and not response.get("Fetch Error"):
+                self.cache.put(key, response)
+            for queue in queues:
+                queue.put((key, response))
+
+    def _load_from_disk(self, key):
+        entry = self.cache.load(key)
+        if entry is None:
+            return
+
+        with self._condition:
+            if key not in self._pending:
+                return
+            queues = list(self._pending[key][1])
+            if self.cache.is_fresh(key, entry[0]):
+                self._pending.pop(key)
+
+        for queue in queues:
+            queue.put((key, entry[1]))
+
+    def _send(self, params, api_key):
+        payload = dict(params)
+        payload["apikey"] = api_key
+        try:
+            res = requests.get(self.url, params=payload, timeout=30)
+            registry.observe("fetch_seconds", res.elapsed.total_seconds(), source="stock")
+            return res.json()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            log_to_file("Failed to fetch stock info: {}".format(e))
+            # kept apart from the API's own "Error Message", which means the symbol is unknown
+            return {"Fetch Error": str(e)}
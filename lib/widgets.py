@@ -2,34 +2,35 @@
 # -*- coding: utf-8 -*-
 import re
 import os
-import cv2
 import math
 import glob
-import copy
 import time
 import json
 import queue
 import pygame
-import psutil
-import qrcode
 import threading
 import requests
-import polyline
 import calendar
+import numpy as np
 import netifaces as ni
-from PIL import Image
-from bs4 import BeautifulSoup
-from datetime import datetime as dt
+from datetime import datetime as dt, date, timedelta
+from collections import OrderedDict
 from abc import ABCMeta, abstractmethod
 from string import printable, digits, ascii_letters
 from lib.table import Table
+from lib.assets import assets
+from lib.timeseries import TimeSeries
+from lib.events import EventStore
+from lib.exporter import registry
 from lib.buttons import Button
-from lib.threads import RequestThread, ImageFetchThread
+from lib.images import ImageLoader
+from lib.scroll import VirtualList
+from lib.threads import FetchThread, CaptureThread, QRCodeThread, test_pattern
 from lib.shapes import Rectangle, Text, Line, Lines, DashLine, Polygon, \
     Circle, ScreenSurface
 from lib.util import log_to_file, shift_pressed, ctrl_pressed, \
     bytes_to_string, pygame_key_to_char, char_to_pygame_key, \
-    get_font_height, get_private_ip, get_public_ip
+    get_font_height, get_private_ip, get_public_ip, lttb
 
 
 class Widget:
@@ -87,6 +88,12 @@ class Widget:
             widget.update()
         self._on_update()
 
+    def tick(self, dt):
+        """Advance time based logic by a fixed step, which may happen several times per frame"""
+        for widget in self._subwidgets:
+            widget.tick(dt)
+        self._on_tick(dt)
+
     def draw(self, screen):
         self._draw_background(screen)
         if self.draw_subwidgets:
@@ -142,6 +149,9 @@ class Widget:
     def _on_setup(self):
         pass
 
+    def _on_tick(self, dt):
+        pass
+
     @abstractmethod
     def _on_update(self):
         pass
@@ -296,6 +306,9 @@ class Widget:
     def set_setting(self, name, value):
         return self.parent.set_setting(name, value)
 
+    def watch_setting(self, name, callback):
+        self.parent.watch_setting(name, callback)
+
 
 class News(Widget):
     def __init__(self, parent, x, y):
@@ -312,17 +325,32 @@ class News(Widget):
         self._news_info_update_interval = 1800
         self._news_line_update_interval = 15
         self._news_info = None
+        self._news_queue = queue.Queue()
+        self._news_fetching = False
         self._title_max_width = self._screen_width - self.x - 45
 
     def _get_news(self):
+        # fetched on a worker, so neither the first frame nor a refresh waits on the network
+        if not self._news_fetching:
+            self._news_fetching = True
+            FetchThread(self._news_queue, self._fetch_news).start()
+
+    def _fetch_news(self):
         try:
             res = requests.get(self._news_url, params=self._news_payload)
-            response = res.json()
+            registry.observe("fetch_seconds", res.elapsed.total_seconds(), source="news")
+            return res.json()
         except ConnectionError:
-            response = {}
+            return {}
         except requests.exceptions.ConnectionError:
-            response = {}
+            return {}
+
+    def _check_news(self):
+        while not self._news_queue.empty():
+            self._news_fetching = False
+            self._set_news(self._news_queue.get() or {})
 
+    def _set_news(self, response):
         if response.get("status") == "ok":
             self._news_info = response.get("articles")
             self._news_index = 0
@@ -336,6 +364,8 @@ class News(Widget):
         self._get_news()
 
     def _on_update(self):
+        self._check_news()
+
         curr_time = time.time()
         if curr_time - self._news_last_update > self._news_info_update_interval:
             self._get_news()
@@ -385,78 +415,69 @@ class NewsList(News):
         self._background_alpha = 120
         self._news_title_font = pygame.font.Font("fonts/FreeSans.ttf", 17)
         self._prefix = " - "
-        self._news_image_directory = "news_images"
-        self._title_contents = []
+        # rendered lines of every title, and their heights summed so scrolling never re-measures them
+        self._title_lines = []
+        self._title_offsets = VirtualList()
         self._display_lines = []
-        self._display_count = 0
         self._start_index = 0
         self._active_index = 0
         self._sidebar_width = 6
         self._sidebar_length = int(self.max_height * 0.618)
         self._active_news = False
         self._display_image = False
-        self._images = {}
+        # images are downloaded, decoded and scaled to the list box by the loader's workers
+        self._image_loader = ImageLoader((self.max_width, self.max_height), source="news_image",
+                                         cache_directory=self.get_setting('news_image_directory',
+                                                                          default="news_images"))
 
     def _on_exit(self):
         self._active_news = False
         self._display_image = False
         self._parse_news()
 
-    def _get_news(self):
-        super(NewsList, self)._get_news()
-
-        if not os.path.isdir(self._news_image_directory):
-            os.mkdir(self._news_image_directory)
-        old_images = glob.glob(os.path.join(self._news_image_directory, '*'))
-        for old_image in old_images:
-            os.remove(old_image)
+    def _set_news(self, response):
+        super(NewsList, self)._set_news(response)
 
         if not self._news_info:
             return
+        self._image_loader.clear_failed()
 
-        self._title_contents = []
-        start_x, start_y = self.x, self.y
+        self._title_lines = []
         for news in self._news_info:
             title = news.get("title")
-            title_content = Content(self.parent, start_x, start_y, title,
+            title_content = Content(self.parent, self.x, self.y, title,
                                     font=self._news_title_font, max_width=self.max_width,
                                     max_height=self.max_height, prefix=self._prefix)
             title_content.setup()
-            start_y += title_content.get_height()
-            self._title_contents.append(title_content)
-
-            image_url = news.get("urlToImage")
-            news['imageName'] = self._parse_image_name(image_url) if image_url else ""
-            if not image_url:
-                continue
-
-            image_thread = ImageFetchThread(image_url, news, self._news_image_directory)
-            image_thread.daemon = True
-            image_thread.start()
+            self._title_lines.append(title_content.get_lines())
+
+            if news.get("urlToImage"):
+                self._image_loader.request(news["urlToImage"])
+        self._title_offsets.set_heights(sum(line.get_height() for line in lines) for lines in self._title_lines)
+        # a refresh can bring fewer articles than the list was scrolled through
+        last_index = max(len(self._title_lines) - 1, 0)
+        self._start_index = min(self._start_index, last_index)
+        self._active_index = min(self._active_index, last_index)
+        self._parse_news()
 
     def _parse_news(self):
         self.clear_shapes()
         self._display_lines = []
-        self._display_count = 0
+        # only the titles in view are visited, the last of them may be cut off at the bottom
+        end_offset = self._title_offsets.get_offset(self._start_index) + self.max_height
+        end_index = min(self._title_offsets.index_at(end_offset) + 1, len(self._title_lines))
+        prefix_length = self._news_title_font.size(self._prefix)[0]
         total_height = 0
-        is_full = False
-        for title_ind, content in enumerate(self._title_contents[self._start_index:]):
-            for line_ind, content_line in enumerate(content.get_lines()):
+        for title_ind in range(self._start_index, end_index):
+            for content_line in self._title_lines[title_ind]:
                 total_height += content_line.get_height()
                 if total_height > self.max_height:
-                    is_full = True
                     break
                 self._display_lines.append(content_line)
-                if self._active_news and title_ind + self._start_index == self._active_index:
-                    prefix_length = self._news_title_font.render(self._prefix, True, self._get_color('white')).get_width()
-                    text_length = content_line.get_width()
+                if self._active_news and title_ind == self._active_index:
                     start_pos = (self.x + prefix_length, self.y + total_height)
-                    end_pos = (self.x + text_length, self.y + total_height)
+                    end_pos = (self.x + content_line.get_width(), self.y + total_height)
                     self.add_shape(Line(self._get_color('green'), start_pos, end_pos))
-                if line_ind == len(content.get_lines()) - 1:
-                    self._display_count += 1
-            if is_full:
-                break
 
     def _page_up(self):
         if self._start_index > 0:
@@ -464,7 +485,7 @@ class NewsList(News):
             self._parse_news()
 
     def _page_down(self):
-        if len(self._display_lines) < sum([len(content.get_lines()) for content in self._title_contents[self._start_index:]]):
+        if self._title_offsets.can_scroll(self._start_index, self.max_height):
             self._start_index += 1
             self._parse_news()
 
@@ -473,13 +494,14 @@ class NewsList(News):
             self._active_index -= 1
             if self._start_index > self._active_index:
                 self._page_up()
-            self._parse_news()
+            else:
+                self._parse_news()
 
     def _row_down(self):
-        if self._active_index < len(self._title_contents) - 1:
+        if self._active_index < len(self._title_lines) - 1:
             self._active_index += 1
-            while self._start_index + self._display_count - 1 < self._active_index:
-                self._page_down()
+            self._start_index = self._title_offsets.scroll_to(self._start_index, self._active_index,
+                                                              self.max_height)
             self._parse_news()
 
     def _on_setup(self):
@@ -487,10 +509,11 @@ class NewsList(News):
         self._parse_news()
 
     def _on_update(self):
+        self._check_news()
+
         curr_time = time.time()
         if curr_time - self._news_last_update > self._news_info_update_interval:
             self._get_news()
-            self._parse_news()
             self._news_last_update = curr_time
 
     def _on_draw(self, screen):
@@ -500,7 +523,7 @@ class NewsList(News):
             total_height += line.get_height()
 
         # draw sidebar
-        if len(self._display_lines) < sum([len(content.get_lines()) for content in self._title_contents]):
+        if self._title_offsets.get_total() > self.max_height:
             pre_length = self._start_index * self.max_height // len(self._news_info)
             sidebar_start = (self.x + self.max_width, self.y + pre_length)
             sidebar_end = (self.x + self.max_width, self.y + pre_length + self._sidebar_length)
@@ -527,37 +550,19 @@ class NewsList(News):
             if self._news_info is not None:
                 image_url = self._news_info[self._active_index]['urlToImage']
             if image_url:
-                image_name = self._news_info[self._active_index]['imageName']
-                image_path = os.path.join("news_images", image_name)
-                if self._images.get(image_name) is not None:
-                    image = self._images.get(image_name)
-                elif os.path.isfile(image_path):
-                    try:
-                        image = pygame.image.load(image_path)
-                    except pygame.error:
-                        image = None
-                    if image:
-                        image_width, image_height = image.get_size()
-                        ratio = self.max_width / self.max_height
-                        image_ratio = image_width / image_height
-                        if ratio > image_ratio:
-                            scaled_width = int(self.max_height * image_ratio)
-                            scaled_height = self.max_height
-                        else:
-                            scaled_width = self.max_width
-                            scaled_height = int(self.max_width / image_ratio)
-                        image = pygame.transform.scale(image, (scaled_width, scaled_height))
-                        image = image.convert()
-                        self._images[image_name] = image
-
-                if image:
-                    image_width, image_height = image.get_size()
-                    image_x = self.x + (self.max_width - image_width) // 2
-                    image_y = self.y + (self.max_height - image_height) // 2
-                    pygame.draw.rect(screen, self._get_color('black'), (self.x, self.y, self.max_width, self.max_height))
-                    screen.blit(image, (image_x, image_y))
-                else:
-                    self._draw_no_image_message(screen)
+                image = self._image_loader.get(image_url)
+                if image is None:
+                    # evicted or not fetched yet, so it goes ahead of the prefetched ones
+                    self._image_loader.request(image_url, priority=True)
+
+            if image:
+                image_width, image_height = image.get_size()
+                image_x = self.x + (self.max_width - image_width) // 2
+                image_y = self.y + (self.max_height - image_height) // 2
+                pygame.draw.rect(screen, self._get_color('black'), (self.x, self.y, self.max_width, self.max_height))
+                screen.blit(image, (image_x, image_y))
+            elif image_url and self._image_loader.is_pending(image_url):
+                self._draw_no_image_message(screen, "Loading image...")
             else:
                 self._draw_no_image_message(screen)
         elif self.title_widget:
@@ -567,21 +572,12 @@ class NewsList(News):
         self._draw_transparent_rect(screen, self.x, self.y, self.get_width(), self.get_height(), self._background_alpha,
                                     color=self._get_color('lightgray'))
 
-    def _draw_no_image_message(self, screen):
+    def _draw_no_image_message(self, screen, message="No image to show here..."):
         pygame.draw.rect(screen, self._get_color('black'), (self.x, self.y, self.max_width, self.max_height), 0)
-        message_text = self._message_font.render("No image to show here...", True, self._get_color('white'))
+        message_text = self._message_font.render(message, True, self._get_color('white'))
         screen.blit(message_text, (self.x + (self.max_width - message_text.get_width()) // 2,
                                    self.y + (self.max_height - message_text.get_height()) // 2))
 
-    def _parse_image_name(self, image_url):
-        image_name = image_url.split('/')[-1]
-        image_name = '.'.join(image_name.split('.')[-2:])
-        image_name = image_name.lower()
-        q_ind = image_name.find('?')
-        if q_ind != -1:
-            image_name = image_name[:q_ind]
-        return image_name
-
     def _handle_widget_events(self, event):
         if event.type == pygame.KEYDOWN:
             if event.key == pygame.K_DOWN:
@@ -627,6 +623,9 @@ class Weather(Widget):
         self._weather_last_update = time.time()
         self._current_weather = None
         self._forecast_weather = None
+        self._weather_queue = queue.Queue()
+        self._weather_fetching = False
+        self._weather_refetch = False
         self._weather_update_interval = 1800
         self._weather_retry_interval = 60
         self._weather_x = self.x
@@ -687,21 +686,46 @@ class Weather(Widget):
             return default_city, default_country
 
     def _get_weather(self):
-        self._location_city, self._location_country = self._get_location()
+        # the location and weather are fetched on a worker, and shown by a later update
+        if self._weather_fetching:
+            # the location may have changed since the fetch in progress started
+            self._weather_refetch = True
+            return
+        self._weather_fetching = True
+        FetchThread(self._weather_queue, self._fetch_weather).start()
 
-        try:
-            self._weather_payload['q'] = "{},{}".format(self._location_city, self._location_country)
-            current_res = requests.get(self._current_url, params=self._weather_payload)
-            self._current_weather = current_res.json()
+    def _fetch_weather(self):
+        city, country = self._get_location()
 
-            forecast_res = requests.get(self._forecase_url, params=self._weather_payload)
-            self._forecast_weather = forecast_res.json()
+        try:
+            payload = dict(self._weather_payload, q="{},{}".format(city, country))
+            current_res = requests.get(self._current_url, params=payload)
+            registry.observe("fetch_seconds", current_res.elapsed.total_seconds(), source="weather")
+            current_weather = current_res.json()
+
+            forecast_res = requests.get(self._forecase_url, params=payload)
+            registry.observe("fetch_seconds", forecast_res.elapsed.total_seconds(), source="forecast")
+            forecast_weather = forecast_res.json()
         except ConnectionError:
-            self._current_weather = {}
-            self._forecast_weather = {}
+            current_weather, forecast_weather = {}, {}
         except requests.exceptions.ConnectionError:
-            self._current_weather = {}
-            self._forecast_weather = {}
+            current_weather, forecast_weather = {}, {}
+        return city, country, current_weather, forecast_weather
+
+    def _check_weather(self):
+        while not self._weather_queue.empty():
+            result = self._weather_queue.get()
+            self._weather_fetching = False
+            self._set_weather(result)
+            if self._weather_refetch:
+                self._weather_refetch = False
+                self._get_weather()
+
+    def _set_weather(self, result):
+        if result is None:
+            self._current_weather, self._forecast_weather = {}, {}
+        else:
+            self._location_city, self._location_country, self._current_weather, self._forecast_weather = result
 
         self._weather_last_update = time.time()
         self._parse_info()
@@ -850,34 +874,28 @@ class Weather(Widget):
     def _load_icons(self):
         for icon_path in glob.glob(os.path.join(self._icon_directory, "*.png")):
             icon_name = os.path.basename(icon_path).split('.')[0]
-            icon = pygame.image.load(icon_path)
             if re.match(r'\d+[dn]', icon_name):
-                current_icon = pygame.transform.scale(icon, (self._current_icon_size, self._current_icon_size))
-                change_icon = pygame.transform.scale(icon, (self._change_icon_size, self._change_icon_size))
-                self._current_icons[icon_name] = current_icon.convert_alpha()
-                self._change_icons[icon_name] = change_icon.convert_alpha()
+                self._current_icons[icon_name] = assets.get(icon_path, self._current_icon_size)
+                self._change_icons[icon_name] = assets.get(icon_path, self._change_icon_size)
             else:
-                self._perc_icons[icon_name] = icon.convert_alpha()
+                self._perc_icons[icon_name] = assets.get(icon_path)
 
-        location_img = pygame.image.load(self._location_icon_path)
-        location_icon = pygame.transform.scale(location_img, (self._location_icon_size, ) * 2)
-        self._location_icon = location_icon.convert_alpha()
-
-        auto_location_img = pygame.image.load(self._auto_location_icon_path)
-        auto_location_icon = pygame.transform.scale(auto_location_img, (self._auto_location_icon_size, ) * 2)
-        self._auto_location_icon = auto_location_icon.convert_alpha()
+        self._location_icon = assets.get(self._location_icon_path, self._location_icon_size)
+        self._auto_location_icon = assets.get(self._auto_location_icon_path, self._auto_location_icon_size)
 
     def _on_setup(self):
         self._load_icons()
         self._get_weather()
 
     def _on_update(self):
+        self._check_weather()
+
         curr_time = time.time()
         need_update = (curr_time - self._weather_last_update > self._weather_update_interval)
         need_retry = ((self._forecast_weather is None or self._current_weather is None) and
                       curr_time - self._weather_last_update > self._weather_retry_interval)
 
-        if need_update or need_retry:
+        if (need_update or need_retry) and not self._weather_fetching:
             self._get_weather()
 
     def _on_draw(self, screen):
@@ -887,7 +905,8 @@ class Weather(Widget):
         # draw error text if there is no weather information
         if self._current_weather is None or self._forecast_weather is None:
             text_y += 20
-            error_text = self.error_font.render("No weather info", True, self._get_color('white'))
+            message = "Loading weather info..." if self._weather_fetching else "No weather info"
+            error_text = self.error_font.render(message, True, self._get_color('white'))
             screen.blit(error_text, (text_x, text_y))
             text_y += error_text.get_height()
 
@@ -937,22 +956,26 @@ class Calendar(Widget):
         self._background_alpha = 120
         self._background_alpha_active = 180
 
-        self._calendar_file = "calendars/calendar.xml"
-        self._calendar_titles = []
-        self._parsed_calendar = []
+        self._event_store = EventStore(self.get_setting('calendar_database', default="calendars/calendar.db"))
+        self._calendar_titles = ["Event", "Date", "Days"]
+        self._calendar_event_ids = []
+        self._calendar_event_recurrences = []
+        self._calendar_event_dates = []
         self._parsed_calendar_display = []
         self._calendar_table = None
-        self._calendar_last_update = dt.now().day
+        self._calendar_last_update = dt.fromtimestamp(time.time()).day
         self._calendar_selected_row = 0
         self._calendar_row_offset = 0
         self._calendar_overflow = False
 
         self._text_cal = TextCalendar(parent, self.x, self.y)
+        self._text_cal.set_event_store(self._event_store)
         self._text_cal.setup()
         self._text_cal_mode = False
 
         self._delete_mode = False
         self._selected_color = self._get_color('green')
+        self._recurrence_pattern = r'^(?i:{})$'.format('|'.join(EventStore.recurrences))
 
         self._load_calendar()
         self._load_table()
@@ -961,154 +984,61 @@ class Calendar(Widget):
         self.set_align(self.align)
 
     def _load_calendar(self):
-        current_day = dt.now().day
-        with open(self._calendar_file, 'r') as file:
-            calendar_text = file.read()
-            file.close()
-
-        # parse html file into a BeautifulSoup object
-        soup = BeautifulSoup(calendar_text, 'xml')
-        calendar_table = soup.find('table')
-
-        # get table rows
-        status_tags = calendar_table.find_all('status')
-        events = calendar_table.find_all('event')
-        titles = calendar_table.find('tr').find_all('th')
-        title_texts = [tag.get_text() for tag in titles]
-        content_rows = [[event.find('name'), event.find('date')] for event in events]
-
-        # add contents to list
-        self._parsed_calendar = []
-        calendar_status = []
-
-        self._calendar_titles = [text for text in title_texts] + ["Days"]
-        for status_tag in status_tags:
-            calendar_status.append(status_tag.get_text())
-
-        for content_row in content_rows:
-            self._parsed_calendar.append([content.get_text() for content in content_row])
-
-        self._add_days_col(self._parsed_calendar, calendar_status)
-
-        self._parsed_calendar.sort(key=lambda x: (int(x[-2]), int(x[-1])))
-        self._parsed_calendar_display = copy.deepcopy(self._parsed_calendar)
+        current_day = dt.fromtimestamp(time.time()).day
 
+        active_since = None
         if self.max_past_days != -1:
-            self._parsed_calendar_display = [row for row in self._parsed_calendar_display
-                                             if row[-1] == '1' or int(row[-2]) >= -self.max_past_days]
-
-        if self.max_rows != -1:
-            start_ind = self._calendar_row_offset
-            end_ind = self._calendar_row_offset + self.max_rows
-            self._calendar_overflow = end_ind < len(self._parsed_calendar_display)
-            self._parsed_calendar_display = self._parsed_calendar_display[start_ind:end_ind]
+            active_since = (date.fromtimestamp(time.time()) - timedelta(days=self.max_past_days)).isoformat()
+
+        # fetch one extra row to know whether the table overflows
+        limit = self.max_rows + 1 if self.max_rows != -1 else -1
+        events = self._event_store.get_upcoming(active_since=active_since, offset=self._calendar_row_offset,
+                                                limit=limit)
+        self._calendar_overflow = self.max_rows != -1 and len(events) > self.max_rows
+        if self._calendar_overflow:
+            events = events[:self.max_rows]
+
+        self._calendar_event_ids = [event[0] for event in events]
+        self._calendar_event_recurrences = [event[4] for event in events]
+        # recurring events show their next occurrence, but are edited from the date their series starts
+        anchor_dates = {event[0]: event[2] for event in self._event_store.get_events(recurring=True)}
+        self._calendar_event_dates = [anchor_dates.get(event[0], event[2]) for event in events]
+        self._parsed_calendar_display = [[name, event_date, self._get_days(event_date), str(status)]
+                                         for _, name, event_date, status, _ in events]
 
         self._calendar_last_update = current_day
         log_to_file("Calendar updated")
 
-    def _add_days_col(self, calendar, status):
+    def _get_days(self, event_date):
         try:
-            time_ind = self._calendar_titles.index("Date")
-        except NameError:
-            return
-
-        curr_date = dt.today().replace(hour=0, minute=0, second=0, microsecond=0)
-        for ind, row in enumerate(calendar):
-            # convert string to datetime object
-            try:
-                date = dt.strptime(row[time_ind], "%Y-%m-%d")
-                date = date.replace(hour=0, minute=0)
-                diff_date = date - curr_date
-
-                row.append(str(diff_date.days))
-            except ValueError:
-                row.append("")
-                row.append(status[ind])
-                continue
-
-            row.append(status[ind])
-
-    def _open_calendar_file(self):
-        with open(self._calendar_file, 'r') as f:
-            soup = BeautifulSoup(f.read(), features='lxml')
-        return soup
-
-    def _save_calendar_file(self, soup):
-        with open(self._calendar_file, 'w') as file:
-            file.write(str(soup))
-            file.close()
+            return str((dt.strptime(event_date, "%Y-%m-%d").date() - date.fromtimestamp(time.time())).days)
+        except ValueError:
+            return ""
 
     def _toggle_calendar_row_status(self, row_index):
-        self._parsed_calendar_display[row_index][-1] = '0' if self._parsed_calendar_display[row_index][-1] == '1' else '1'
-
-        target_name = self._parsed_calendar_display[row_index][0]
-        target_date = self._parsed_calendar_display[row_index][1]
-        if target_name.endswith('...'):
-            target_name = target_name[:-3]
-        soup = self._open_calendar_file()
-        events = soup.find_all('event')
-        for row_tag in events:
-            row_name = row_tag.find('name').get_text()
-            row_date = row_tag.find('date').get_text()
-            if row_name.startswith(target_name) and row_date == target_date:
-                row_tag.find('status').string = self._parsed_calendar_display[row_index][-1]
-                break
-
-        self._save_calendar_file(soup)
+        status = self._parsed_calendar_display[row_index][-1] != '1'
+        self._event_store.set_status(self._calendar_event_ids[row_index], status)
         self.reload_calendar()
 
     def _add_event_from_popup(self):
         e = self.parent.popup.get_input()
-        status = '0' if e.get('Active') is False else '1'
-
-        new_soup = BeautifulSoup('<event></event>', features='lxml')
-        row_tag = new_soup.event
-        name_tag = new_soup.new_tag('name')
-        name_tag.string = e['Event']
-        row_tag.append(name_tag)
-        date_tag = new_soup.new_tag('date')
-        date_tag.string = e['Date']
-        row_tag.append(date_tag)
-        status_tag = new_soup.new_tag('status')
-        status_tag.string = status
-        row_tag.append(status_tag)
-
-        soup = self._open_calendar_file()
-        table = soup.find('tbody')
-        table.append(row_tag)
-
-        self._save_calendar_file(soup)
+        status = e.get('Active') is not False
+        self._event_store.add_event(e['Event'], e['Date'], status, e['Repeat'].lower())
         self.reload_calendar()
 
     def _edit_event_from_popup(self, row_ind):
-        self._delete_event(row_ind, reload=False)
-        self._add_event_from_popup()
+        e = self.parent.popup.get_input()
+        status = e.get('Active') is not False
+        self._event_store.update_event(self._calendar_event_ids[row_ind], e['Event'], e['Date'], status,
+                                       e['Repeat'].lower())
+        self.reload_calendar()
 
-    def _delete_event(self, row_ind, reload=True):
+    def _delete_event(self, row_ind):
         self._calendar_selected_row = row_ind
-        target = self._get_selected_event()
-        target_name = target[0]
-        target_date = target[1]
-        target_status = target[-1]
-
-        soup = self._open_calendar_file()
-        events = soup.find_all('event')
-        for row_tag in events:
-            row_name = row_tag.find('name').get_text()
-            row_date = row_tag.find('date').get_text()
-            row_status = row_tag.find('status').get_text()
-            is_alter = (target_name.endswith('...') and row_name.startswith(target_name[:-3]))
-            if (row_name == target_name or is_alter) and \
-               row_date == target_date and \
-               row_status == target_status:
-                row_tag.extract()
-                break
-
-        self._save_calendar_file(soup)
-        if reload:
-            if self._calendar_selected_row > 0:
-                self._calendar_selected_row -= 1
-            self.reload_calendar()
+        self._event_store.delete_event(self._calendar_event_ids[row_ind])
+        if self._calendar_selected_row > 0:
+            self._calendar_selected_row -= 1
+        self.reload_calendar()
 
     def _get_selected_event(self):
         return self._parsed_calendar_display[self._calendar_selected_row]
@@ -1150,7 +1080,7 @@ class Calendar(Widget):
         self._load_table()
 
     def _on_update(self):
-        current_day = dt.now().day
+        current_day = dt.fromtimestamp(time.time()).day
         if current_day != self._calendar_last_update:
             self.reload_calendar()
 
@@ -1225,20 +1155,23 @@ class Calendar(Widget):
             if event.key == pygame.K_t:
                 self._toggle_text_calendar()
             elif event.key == pygame.K_a:
-                self.parent.create_popup('input', self.parent, 300, 200, input_width=150,
-                                         text="Please enter event:", entries=["Event", "Date"],
-                                         required=[True, r'^\d{4}-\d{2}-\d{2}$'],
+                self.parent.create_popup('input', self.parent, 300, 230, input_width=150,
+                                         text="Please enter event:", entries=["Event", "Date", "Repeat"],
+                                         values=["", "", ""],
+                                         required=[True, r'^\d{4}-\d{2}-\d{2}$', self._recurrence_pattern],
                                          close_action=self._add_event_from_popup)
                 self.parent.popup.set_title('Add New Event')
             elif event.key == pygame.K_e:
                 if self._calendar_selected_row < len(self._parsed_calendar_display):
                     target = self._get_selected_event()
                     active_status = target[-1] == '1'
-                    self.parent.create_popup('input', self.parent, 300, 230, input_width=150,
-                                             text="Please enter event:", entries=["Event", "Date", "Active"],
-                                             styles=['input', 'input', 'selector'],
-                                             values=target[:2] + [active_status],
-                                             required=[True, r'^\d{4}-\d{2}-\d{2}$'],
+                    recurrence = self._calendar_event_recurrences[self._calendar_selected_row]
+                    event_date = self._calendar_event_dates[self._calendar_selected_row]
+                    self.parent.create_popup('input', self.parent, 300, 260, input_width=150,
+                                             text="Please enter event:", entries=["Event", "Date", "Repeat", "Active"],
+                                             styles=['input', 'input', 'input', 'selector'],
+                                             values=[target[0], event_date, recurrence, active_status],
+                                             required=[True, r'^\d{4}-\d{2}-\d{2}$', self._recurrence_pattern],
                                              close_action=lambda: self._edit_event_from_popup(self._calendar_selected_row))
                     self.parent.popup.set_title('Edit Event')
 
@@ -1249,7 +1182,7 @@ class Calendar(Widget):
 
     def reload_calendar(self):
         if self._text_cal_mode:
-            self._text_cal.set_events(self._parsed_calendar)
+            self._text_cal.reload()
         else:
             self._load_calendar()
             self._load_table()
@@ -1291,7 +1224,7 @@ class TextCalendar(Widget):
         self._cal_date_width = date_text.get_width()
         self._cal_date_height = date_text.get_height()
 
-        self._cal_last_update = dt.now().day
+        self._cal_last_update = dt.fromtimestamp(time.time()).day
         self._cal = calendar.TextCalendar()
         self._cal_date_padding = 1
         self._cal_selector_line_width = 2
@@ -1301,9 +1234,10 @@ class TextCalendar(Widget):
         self._cal_completed_event_color = self._get_color('lightblue')
         self._cal_arrow_color = self._get_color('gray')
         self._cal_arrow_pressed_color = self._get_color('white')
-        self._cal_text_lines = []
+        self._month_cache = OrderedDict()
+        self._month_cache_size = 12
 
-        self._events = []
+        self._event_store = None
 
         self._total_width = 0
         self._total_height = 0
@@ -1317,14 +1251,14 @@ class TextCalendar(Widget):
         self._load_cal()
 
     def _on_update(self):
-        curr_day = dt.now().day
+        curr_day = dt.fromtimestamp(time.time()).day
         if curr_day != self._cal_last_update:
             self._reset_date()
             self._load_cal()
             self._cal_last_update = curr_day
 
     def _on_draw(self, screen):
-        if self.is_active and self._cal_text_lines:
+        if self.is_active and self._total_width:
             left_arrow_pos = [(self.x + 1, self.y + self._cal_font_height // 2),
                               (self.x + self._cal_font_width - 1, self.y + 3),
                               (self.x + self._cal_font_width - 1, self.y + self._cal_font_height - 3)]
@@ -1349,59 +1283,79 @@ class TextCalendar(Widget):
                 self._reset_month()
 
     def _reset_date(self):
-        now = dt.now()
+        now = dt.fromtimestamp(time.time())
         self._curr_year = now.year
         self._curr_month = now.month
         self._curr_day = now.day
 
     def _load_cal(self):
         self.clear_shapes()
-        self._total_width = 0
-        self._total_height = 0
 
-        self._cal_text_lines = self._cal.formatmonth(self._curr_year, self._curr_month).splitlines()
-
-        offset_x = 0
-        offset_y = 0
-        now = dt.now()
-        is_present_month = (self._curr_year == now.year and self._curr_month == now.month)
-        days_with_events = [(str(int(event[1][8:10])), event[-1]) for event in self._events
-                            if int(event[1][:4]) == self._curr_year
-                            and int(event[1][5:7]) == self._curr_month]
-        event_ind = 0
-        for line in self._cal_text_lines:
-            rendered_line = self.calendar_font.render(line, True, self._cal_text_color)
-            self.add_shape(Text(rendered_line, (self.x, self.y + offset_y)))
-            self._total_width = max(self._total_width, rendered_line.get_width())
-            if is_present_month and str(self._curr_day) in line.split():
-                curr_day_ind = line.split().index(str(self._curr_day))
-                leading_space_ind = (len(line) - len(line.lstrip(' '))) // 3
-                offset_x = self._cal_font_width * (curr_day_ind + leading_space_ind) * 3
-
-                self.add_shape(Rectangle(
-                    self._cal_selector_color,
-                    self.x + offset_x - self._cal_date_padding,
-                    self.y + offset_y - self._cal_date_padding,
-                    self._cal_date_width + 2 * self._cal_date_padding,
-                    self._cal_date_height + 2 * self._cal_date_padding,
-                    line_width=self._cal_selector_line_width))
-
-            while event_ind < len(days_with_events) and days_with_events[event_ind][0] in line.split():
-                event_day_ind = line.split().index(days_with_events[event_ind][0])
-                offset_x = self._cal_font_width * event_day_ind * 3
-                leading_spaces = (len(line) - len(line.lstrip(' ')))
-                if leading_spaces > 0:
-                    offset_x += (leading_spaces - 1) * self._cal_font_width
-
-                start_pos = (self.x + offset_x, self.y + offset_y + self._cal_date_height - 3)
-                end_pos = (self.x + offset_x + self._cal_date_width, self.y + offset_y + self._cal_date_height - 3)
-                color = self._cal_event_color if days_with_events[event_ind][1] == '1' else self._cal_completed_event_color
-                self.add_shape(Line(color, start_pos, end_pos, width=self._cal_selector_line_width))
-                event_ind += 1
-
-            offset_y += rendered_line.get_height()
-
-        self._total_height = offset_y
+        month_surface, day_rects = self._get_month_surface(self._curr_year, self._curr_month)
+        self._total_width, self._total_height = month_surface.get_size()
+        self.add_shape(ScreenSurface(month_surface, (self.x, self.y)))
+
+        # the selector and event marks are drawn over the cached month surface
+        now = dt.fromtimestamp(time.time())
+        if self._curr_year == now.year and self._curr_month == now.month:
+            rect = day_rects[self._curr_day]
+            self.add_shape(Rectangle(
+                self._cal_selector_color,
+                self.x + rect.x - self._cal_date_padding,
+                self.y + rect.y - self._cal_date_padding,
+                rect.width + 2 * self._cal_date_padding,
+                rect.height + 2 * self._cal_date_padding,
+                line_width=self._cal_selector_line_width))
+
+        if not self._event_store:
+            return
+
+        # one mark per day, which shows as active if any of its events is
+        month_start = date(self._curr_year, self._curr_month, 1)
+        month_end = date(self._curr_year, self._curr_month, calendar.monthrange(self._curr_year, self._curr_month)[1])
+        day_status = {}
+        for event in self._event_store.get_occurrences(month_start, month_end):
+            day = int(event[2][8:10])
+            day_status[day] = day_status.get(day) or bool(event[3])
+
+        for day, active in day_status.items():
+            rect = day_rects[day]
+            start_pos = (self.x + rect.left, self.y + rect.bottom - 3)
+            end_pos = (self.x + rect.right, self.y + rect.bottom - 3)
+            color = self._cal_event_color if active else self._cal_completed_event_color
+            self.add_shape(Line(color, start_pos, end_pos, width=self._cal_selector_line_width))
+
+    def _get_month_surface(self, year, month):
+        """Return the rendered month and the rect of each day in it, relative to the surface"""
+        key = (year, month)
+        if key in self._month_cache:
+            self._month_cache.move_to_end(key)
+            return self._month_cache[key]
+
+        rendered_lines = [self.calendar_font.render(line, True, self._cal_text_color)
+                          for line in self._cal.formatmonth(year, month).splitlines()]
+        line_offsets = [0]
+        for rendered_line in rendered_lines:
+            line_offsets.append(line_offsets[-1] + rendered_line.get_height())
+
+        month_surface = pygame.Surface((max(line.get_width() for line in rendered_lines), line_offsets[-1]),
+                                       pygame.SRCALPHA)
+        for rendered_line, offset_y in zip(rendered_lines, line_offsets):
+            month_surface.blit(rendered_line, (0, offset_y))
+
+        # weeks start on the third line, after the title and the weekday names, and every
+        # day takes three characters of the monospaced font
+        day_rects = {}
+        for week_ind, week in enumerate(self._cal.monthdayscalendar(year, month)):
+            for day_ind, day in enumerate(week):
+                if day:
+                    day_rects[day] = pygame.Rect(self._cal_font_width * day_ind * 3, line_offsets[week_ind + 2],
+                                                 self._cal_date_width, self._cal_date_height)
+
+        self._month_cache[key] = (month_surface, day_rects)
+        while len(self._month_cache) > self._month_cache_size:
+            self._month_cache.popitem(last=False)
+        return self._month_cache[key]
 
     def _next_month(self):
         self._curr_month += 1
@@ -1424,8 +1378,11 @@ class TextCalendar(Widget):
     def reset(self):
         self._reset_month()
 
-    def set_events(self, events):
-        self._events = events
+    def reload(self):
+        self._load_cal()
+
+    def set_event_store(self, event_store):
+        self._event_store = event_store
 
     def get_width(self):
         return self._total_width
@@ -1447,8 +1404,7 @@ class Traffic(Widget):
 
         self._traffic_icon_path = os.path.join("images", "traffic", "traffic.png")
         self._traffic_icon_size = self.traffic_font_height
-        icon = pygame.image.load(self._traffic_icon_path)
-        self._traffic_icon = pygame.transform.scale(icon, (self._traffic_icon_size, self._traffic_icon_size))
+        self._traffic_icon = assets.get(self._traffic_icon_path, self._traffic_icon_size)
 
         self._origin_address = "University of Waterloo"
         self._dest_address = "University of Toronto"
@@ -1456,6 +1412,9 @@ class Traffic(Widget):
         self._traffic_last_update = time.time()
         self._traffic_update_interval = 1800
         self._traffic_info = None
+        self._traffic_queue = queue.Queue()
+        self._traffic_fetching = False
+        self._traffic_refetch = False
 
         self._background_alpha = 120
 
@@ -1473,18 +1432,38 @@ class Traffic(Widget):
         self._load_traffic()
 
     def _load_traffic(self):
-        self.clear_shapes()
+        # fetched on a worker, and shown once a later update finds the response
+        if self._traffic_fetching:
+            # the locations may have changed since the fetch in progress started
+            self._traffic_refetch = True
+            return
+        self._traffic_fetching = True
 
         self._traffic_payload['origins'] = '+'.join(self._origin_address.split())
         self._traffic_payload['destinations'] = '+'.join(self._dest_address.split())
+        FetchThread(self._traffic_queue, self._fetch_traffic, dict(self._traffic_payload)).start()
 
+    def _fetch_traffic(self, payload):
         try:
-            traffic_info_res = requests.get(self._traffic_url, params=self._traffic_payload)
-            self._traffic_info = traffic_info_res.json()
+            traffic_info_res = requests.get(self._traffic_url, params=payload)
+            registry.observe("fetch_seconds", traffic_info_res.elapsed.total_seconds(), source="traffic")
+            return traffic_info_res.json()
         except ConnectionError:
-            self._traffic_info = {}
+            return {}
         except requests.exceptions.ConnectionError:
-            self._traffic_info = {}
+            return {}
+
+    def _check_traffic(self):
+        while not self._traffic_queue.empty():
+            self._traffic_fetching = False
+            self._set_traffic(self._traffic_queue.get() or {})
+            if self._traffic_refetch:
+                self._traffic_refetch = False
+                self._load_traffic()
+
+    def _set_traffic(self, traffic_info):
+        self.clear_shapes()
+        self._traffic_info = traffic_info
 
         try:
             traffic_distance = self._traffic_info['rows'][0]['elements'][0]['distance']['text']
@@ -1518,8 +1497,10 @@ class Traffic(Widget):
         self._load_traffic()
 
     def _on_update(self):
-        if (time.time() - self._traffic_last_update > self._traffic_update_interval
-                or self._traffic_info is None):
+        self._check_traffic()
+
+        if not self._traffic_fetching and (time.time() - self._traffic_last_update > self._traffic_update_interval
+                                           or self._traffic_info is None):
             self._load_traffic()
             self._traffic_last_update = time.time()
 
@@ -1547,33 +1528,34 @@ class Stock(Widget):
         self.stock_label_font = pygame.font.Font("fonts/FreeSans.ttf", 12)
         self.stock_range_font = pygame.font.Font("fonts/FreeSans.ttf", 13)
 
-        self._stock_url = "https://www.alphavantage.co/query"
-        self._stock_keys = ['T9O3IK0TF72YCBP8", "JEIP3D1ZI2UTJZUL", "TI8F72SY4LKSD23L']
         self._stock_symbol = ""
         self._stock_payload = {"1D": {"function": "TIME_SERIES_INTRADAY", "symbol": self._stock_symbol,
-                                      "interval": "5min", "outputsize": "full", "apikey": self._stock_keys[0]},
+                                      "interval": "5min", "outputsize": "full"},
                                "5D": {"function": "TIME_SERIES_INTRADAY", "symbol": self._stock_symbol,
-                                      "interval": "5min", "outputsize": "full", "apikey": self._stock_keys[0]},
+                                      "interval": "5min", "outputsize": "full"},
                                "1M": {"function": "TIME_SERIES_INTRADAY", "symbol": self._stock_symbol,
-                                      "interval": "60min", "outputsize": "full", "apikey": self._stock_keys[0]},
+                                      "interval": "60min", "outputsize": "full"},
                                "3M": {"function": "TIME_SERIES_DAILY", "symbol": self._stock_symbol,
-                                      "outputsize": "full", "apikey": self._stock_keys[0]},
+                                      "outputsize": "full"},
                                "6M": {"function": "TIME_SERIES_DAILY", "symbol": self._stock_symbol,
-                                      "outputsize": "full", "apikey": self._stock_keys[0]},
+                                      "outputsize": "full"},
                                "1Y": {"function": "TIME_SERIES_DAILY", "symbol": self._stock_symbol,
-                                      "outputsize": "full", "apikey": self._stock_keys[0]},
+                                      "outputsize": "full"},
                                "5Y": {"function": "TIME_SERIES_DAILY", "symbol": self._stock_symbol,
-                                      "outputsize": "full", "apikey": self._stock_keys[0]},
+                                      "outputsize": "full"},
                                "MAX": {"function": "TIME_SERIES_DAILY", "symbol": self._stock_symbol,
-                                       "outputsize": "full", "apikey": self._stock_keys[0]}}
+                                       "outputsize": "full"}}
         self._stock_range_ind = 0
         self._stock_range = ["1D", "5D", "1M", "3M", "6M", "1Y", "5Y", "MAX"]
-        self._stock_info_queue = queue.Queue(maxsize=1)
+        self._stock_info_queue = queue.Queue()
         self._stock_info = {"intraday": None, "hourly": None, "daily": None}
+        self._stock_series = {"intraday": None, "hourly": None, "daily": None}
+        self._stock_interval_keys = {"5min": "intraday", "60min": "hourly", None: "daily"}
+        self._stock_series_keys = {"intraday": "Time Series (5min)", "hourly": "Time Series (60min)",
+                                   "daily": "Time Series (Daily)"}
         self._current_price = 0
         self._last_close_price = 0
-        self._time_series = []
-        self._loading_thread = None
+        self._time_series = None
 
         self._input_font = pygame.font.Font("fonts/FreeSans.ttf", 15)
         self._input_widget = Input(self.parent, self.x, self.y, font=self._input_font, width=150,
@@ -1602,12 +1584,12 @@ class Stock(Widget):
             self._parse_stock_info()
             return
 
-        if not self._loading_thread:
-            current_range = self._stock_range[self._stock_range_ind]
-            payload = self._stock_payload[current_range]
-            payload['symbol'] = self._stock_symbol
-            self._loading_thread = RequestThread(self._stock_info_queue, self._stock_url, payload)
-            self._loading_thread.start()
+        self.parent.app.stock_scheduler.request(self._get_payload(), self._stock_info_queue)
+
+    def _get_payload(self):
+        payload = self._stock_payload[self._stock_range[self._stock_range_ind]]
+        payload['symbol'] = self._stock_symbol
+        return payload
 
     def _handle_widget_events(self, event):
         if event.type == pygame.KEYDOWN:
@@ -1643,10 +1625,16 @@ class Stock(Widget):
         self.clear_shapes()
         self._add_range()
 
-        if not self._stock_info_queue.empty():
-            self._stock_info[self._get_range_key()] = self._stock_info_queue.get()
-            self._loading_thread = None
-            self._parse_stock_info()
+        while not self._stock_info_queue.empty():
+            (symbol, _, interval), stock_info = self._stock_info_queue.get()
+            if symbol != self._stock_symbol:
+                continue
+
+            range_key = self._stock_interval_keys[interval]
+            self._stock_info[range_key] = stock_info
+            self._stock_series[range_key] = None
+            if range_key == self._get_range_key():
+                self._parse_stock_info()
 
     def _get_range_key(self):
         current_range = self._stock_range[self._stock_range_ind]
@@ -1657,97 +1645,59 @@ class Stock(Widget):
         else:
             return "daily"
 
-    def _get_time_series(self, time_series_key):
+    def _get_time_series(self):
         range_key = self._get_range_key()
-        if not self._stock_info[range_key].get(time_series_key):
-            return None
-        time_series = self._stock_info[range_key].get(time_series_key)
-        time_series_list = []
-        for key in sorted(time_series, reverse=True):
-            time_series[key]['timestamp'] = key
-            time_series_list.append(time_series[key])
-        return time_series_list
+        if self._stock_series[range_key] is None and self._stock_info[range_key]:
+            self._stock_series[range_key] = TimeSeries.from_response(self._stock_info[range_key],
+                                                                     self._stock_series_keys[range_key])
+        return self._stock_series[range_key]
 
     def _parse_stock_info(self):
-        self._time_series = []
+        self._time_series = None
         current_range = self._stock_range[self._stock_range_ind]
-        range_key = self._get_range_key()
 
-        if self._stock_info[range_key] is None:
+        time_series = self._get_time_series()
+        if not time_series:
             return
 
         if current_range == "1D":
-            time_series_key = "Time Series (5min)"
-            time_series_list = self._get_time_series(time_series_key)
-            if not time_series_list:
-                return
-            today_str = time_series_list[0]['timestamp'][:10]
-            self._time_series = [element for element in time_series_list if element['timestamp'].startswith(today_str)]
-            self._current_price = float(self._time_series[0].get('4. close'))
-            self._last_close_price = float(time_series_list[len(self._time_series)].get('4. close'))
+            today_length = time_series.get_day_length()
+            self._time_series = time_series[:today_length]
+            self._current_price = time_series.close[0]
+            if today_length < len(time_series):
+                self._last_close_price = time_series.close[today_length]
             self._chart_widget.set_x_range(0, 78)
         elif current_range == "5D":
-            time_series_key = "Time Series (5min)"
-            time_series_list = self._get_time_series(time_series_key)
-            if not time_series_list:
-                return
-            today_str = time_series_list[0]['timestamp'][:10]
-            quotes_today = [element for element in time_series_list if element['timestamp'].startswith(today_str)]
-            quotes_previous = time_series_list[len(quotes_today):78 * 5]
-            self._time_series = (quotes_today + quotes_previous)[::4]
-            self._chart_widget.set_x_range(0, 98)
+            today_length = time_series.get_day_length()
+            self._time_series = time_series[:max(today_length, 78 * 5)]
+            self._chart_widget.set_x_range(0, 78 * 5)
         elif current_range == "1M":
-            time_series_key = "Time Series (60min)"
-            time_series_list = self._get_time_series(time_series_key)
-            if not time_series_list:
-                return
-            self._time_series = time_series_list[:154:2]
-            self._chart_widget.set_x_range(0, 77)
+            self._time_series = time_series[:154]
+            self._chart_widget.set_x_range(0, 154)
         elif current_range == "3M":
-            time_series_key = "Time Series (Daily)"
-            time_series_list = self._get_time_series(time_series_key)
-            if not time_series_list:
-                return
-            self._time_series = time_series_list[:66]
+            self._time_series = time_series[:66]
             self._chart_widget.set_x_range(0, 66)
         elif current_range == "6M":
-            time_series_key = "Time Series (Daily)"
-            time_series_list = self._get_time_series(time_series_key)
-            if not time_series_list:
-                return
-            self._time_series = time_series_list[:132]
+            self._time_series = time_series[:132]
             self._chart_widget.set_x_range(0, 132)
         elif current_range == "1Y":
-            time_series_key = "Time Series (Daily)"
-            time_series_list = self._get_time_series(time_series_key)
-            if not time_series_list:
-                return
-            self._time_series = time_series_list[:260:2]
-            self._chart_widget.set_x_range(0, 130)
+            self._time_series = time_series[:260]
+            self._chart_widget.set_x_range(0, 260)
         elif current_range == "5Y":
-            time_series_key = "Time Series (Daily)"
-            time_series_list = self._get_time_series(time_series_key)
-            if not time_series_list:
-                return
-            self._time_series = time_series_list[:1304:10]
-            self._chart_widget.set_x_range(0, 130)
+            self._time_series = time_series[:1304]
+            self._chart_widget.set_x_range(0, 1304)
         else:
-            time_series_key = "Time Series (Daily)"
-            time_series_list = self._get_time_series(time_series_key)
-            if not time_series_list:
-                return
-            ratio = len(time_series_list) // 100
-            self._time_series = time_series_list[::ratio]
-            self._chart_widget.set_x_range(0, 100)
+            self._time_series = time_series
+            self._chart_widget.set_x_range(0, len(time_series))
 
         if self.chart and self._time_series:
-            price_info = [(float(element['2. high']) + float(element['3. low'])) // 2 for element in self._time_series]
+            price_info = self._time_series.get_midpoints()
             self._chart_widget.set_info({"price": price_info})
             if current_range == "1D":
                 self._chart_widget.set_constants([self._last_close_price])
             else:
-                self._chart_widget.set_constants([float(self._time_series[-1].get('1. open'))])
-            self._chart_widget.set_y_range(min(price_info) * 0.975, max(price_info) * 1.025)
+                self._chart_widget.set_constants([self._time_series.open[-1]])
+            self._chart_widget.set_y_range(price_info.min() * 0.975, price_info.max() * 1.025)
             change = price_info[0] - self._last_close_price if current_range == "1D" else price_info[0] - price_info[-1]
             if change < 0:
                 self._chart_widget.set_info_colors({"price": 'red'})
@@ -1755,13 +1705,12 @@ class Stock(Widget):
                 self._chart_widget.set_info_colors({"price": 'green'})
 
     def _on_draw(self, screen):
-        if self._loading_thread and self._loading_thread.is_alive():
-            self._display_info(screen, "Loading stock info...")
-            return
-
         range_key = self._get_range_key()
         current_stock_info = self._stock_info[range_key]
         if current_stock_info is None:
+            # a cached response is shown while it is refreshed, so only wait on missing ones
+            if self._stock_symbol and self.parent.app.stock_scheduler.is_pending(self._get_payload()):
+                self._display_info(screen, "Loading stock info...")
             return
         elif current_stock_info.get("Note"):
             self._display_info(screen, "Searching is too frequent!")
@@ -1769,6 +1718,9 @@ class Stock(Widget):
         elif current_stock_info.get("Error Message"):
             self._display_info(screen, "Invalid stock symbol!")
             return
+        elif current_stock_info.get("Fetch Error"):
+            self._display_info(screen, "Unable to fetch stock info")
+            return
 
         self._draw_quote(screen)
 
@@ -1825,12 +1777,12 @@ class Stock(Widget):
     def reset(self):
         self._stock_symbol = ""
         self._stock_range_ind = 0
-        self._stock_info_queue = queue.Queue(maxsize=1)
+        self._stock_info_queue = queue.Queue()
         self._stock_info = {"intraday": None, "hourly": None, "daily": None}
+        self._stock_series = {"intraday": None, "hourly": None, "daily": None}
         self._current_price = 0
         self._last_close_price = 0
-        self._time_series = []
-        self._loading_thread = None
+        self._time_series = None
 
     def clear(self):
         self.reset()
@@ -1838,6 +1790,84 @@ class Stock(Widget):
         self._chart_widget.reset()
 
 
+class Watchlist(Widget):
+    def __init__(self, parent, x, y, max_symbols=5, refresh_interval=300):
+        super(Watchlist, self).__init__(parent, x, y)
+
+        self.max_symbols = max_symbols
+        self.refresh_interval = refresh_interval
+
+        self.quote_font = pygame.font.Font("fonts/FreeSans.ttf", 15)
+        self.quote_font_height = get_font_height(self.quote_font)
+
+        self._symbols = []
+        self._quotes = {}
+        self._quote_queue = queue.Queue()
+        self._last_refresh = 0
+
+    def _on_setup(self):
+        self._symbols = self.get_setting('stock_watchlist', default=[])[:self.max_symbols]
+        self.watch_setting('stock_watchlist', self._on_symbols_changed)
+
+    def _on_symbols_changed(self, name, symbols):
+        self._symbols = symbols[:self.max_symbols]
+        self._quotes = {symbol: quote for symbol, quote in self._quotes.items() if symbol in self._symbols}
+        self._last_refresh = 0
+
+    def _on_update(self):
+        current_time = time.time()
+        if self._symbols and current_time - self._last_refresh > self.refresh_interval:
+            # the scheduler spreads these out over the rate limit window
+            for symbol in self._symbols:
+                self.parent.app.stock_scheduler.request({"function": "GLOBAL_QUOTE", "symbol": symbol},
+                                                        self._quote_queue)
+            self._last_refresh = current_time
+
+        while not self._quote_queue.empty():
+            (symbol, _, _), stock_info = self._quote_queue.get()
+            quote = stock_info.get("Global Quote")
+            if not quote or not quote.get("05. price"):
+                continue
+            self._quotes[symbol] = (float(quote["05. price"]), float(quote["09. change"]),
+                                    quote["10. change percent"])
+
+    def _on_draw(self, screen):
+        y = self.y
+        for symbol in self._symbols:
+            if symbol not in self._quotes:
+                continue
+
+            price, change, percent = self._quotes[symbol]
+            if change > 0:
+                color = "green"
+                arrow = u'▲'
+            elif change < 0:
+                color = "red"
+                arrow = u'▼'
+            else:
+                color = "white"
+                arrow = u'▬'
+
+            symbol_text = self.quote_font.render(symbol, True, self._get_color('white'))
+            quote_text = self.quote_font.render(u'{:.2f} {} {}'.format(price, percent, arrow),
+                                                True, self._get_color(color))
+            screen.blit(symbol_text, (self.x, y))
+            screen.blit(quote_text, (self.x + 60, y))
+            y += self.quote_font_height
+
+    def _set_symbols_from_popup(self):
+        symbols = self.parent.popup.get_input()['Symbols']
+        self.set_setting('stock_watchlist', [symbol.strip().upper() for symbol in symbols.split(',')
+                                             if symbol.strip()][:self.max_symbols])
+
+    def set_symbols(self):
+        self.parent.create_popup('input', self.parent, 300, 200, input_width=150,
+                                 text="Symbols separated by commas:", entries=["Symbols"],
+                                 values=[', '.join(self._symbols)], required=[r'^[A-Za-z., ]*$'],
+                                 close_action=self._set_symbols_from_popup)
+        self.parent.popup.set_title('Set Watchlist')
+
+
 class SystemInfo(Widget):
     def __init__(self, parent, x, y, font=None,
                  cpu_info=True, memory_info=True, disk_info=True,
@@ -1857,10 +1887,6 @@ class SystemInfo(Widget):
         self._cpu_temp = 0.0
         self._memory_percent = 0.0
         self._disk_percent = 0.0
-        self._disk_partitions = [partition.mountpoint for partition in psutil.disk_partitions()]
-        self._disk_total = 0
-        self._last_net_sent_bytes = psutil.net_io_counters().bytes_sent
-        self._last_net_recv_bytes = psutil.net_io_counters().bytes_recv
         self._net_sent_speed = 0
         self._net_recv_speed = 0
 
@@ -1872,46 +1898,40 @@ class SystemInfo(Widget):
 
         self._private_ip = ""
         self._public_ip = ""
+        self._ip_queue = queue.Queue()
+        self._ip_fetching = False
 
     def _update_info(self):
-        self._memory_percent = psutil.virtual_memory().percent
-        self._cpu_percent = psutil.cpu_percent()
-
-        try:
-            temperatures = psutil.sensors_temperatures()
-        except AttributeError:
-            temperatures = []
-        for sensor_name in temperatures:
-            if sensor_name.find('cpu') != -1:
-                cpu_temps = temperatures[sensor_name]
-                if len(cpu_temps) > 0:
-                    self._cpu_temp = cpu_temps[0].current
-        
-        try:
-            disk_used = float(sum(psutil.disk_usage(path).used for path in self._disk_partitions))
-            if not self._disk_total:
-                self._disk_total = float(sum(psutil.disk_usage(path).total for path in self._disk_partitions))
-            self._disk_percent = disk_used / self._disk_total * 100
-        except WindowsError:
-            self._disk_percent = 0.0
-
-        current_sent_bytes = psutil.net_io_counters().bytes_sent
-        current_recv_bytes = psutil.net_io_counters().bytes_recv
-        self._net_sent_speed = current_sent_bytes - self._last_net_sent_bytes
-        self._net_recv_speed = current_recv_bytes - self._last_net_recv_bytes
-        self._last_net_sent_bytes = current_sent_bytes
-        self._last_net_recv_bytes = current_recv_bytes
+        metrics = self.parent.app.metrics
+        self._cpu_percent = metrics.cpu.latest()
+        self._cpu_temp = metrics.cpu_temp.latest()
+        self._memory_percent = metrics.memory.latest()
+        self._disk_percent = metrics.disk.latest()
+        self._net_sent_speed = metrics.net_sent.latest()
+        self._net_recv_speed = metrics.net_recv.latest()
 
     def _update_ip_info(self):
-        if not self._private_ip or self._private_ip == 'unknown':
-            self._private_ip = get_private_ip()
-        if not self._public_ip or self._public_ip == 'unknown':
-            self._public_ip = get_public_ip()
-
-        if not self._private_ip:
-            self._private_ip = 'unknown'
-        if not self._public_ip:
-            self._public_ip = 'unknown'
+        # the public address is looked up on a worker, so building the panel doesn't wait on it
+        if not self._ip_fetching:
+            self._ip_fetching = True
+            FetchThread(self._ip_queue, self._fetch_ip_info, self._private_ip, self._public_ip).start()
+
+    def _fetch_ip_info(self, private_ip, public_ip):
+        if not private_ip or private_ip == 'unknown':
+            private_ip = get_private_ip()
+        if not public_ip or public_ip == 'unknown':
+            public_ip = get_public_ip()
+        return private_ip, public_ip
+
+    def _check_ip_info(self):
+        while not self._ip_queue.empty():
+            self._ip_fetching = False
+            self._private_ip, self._public_ip = self._ip_queue.get() or ("", "")
+
+            if not self._private_ip:
+                self._private_ip = 'unknown'
+            if not self._public_ip:
+                self._public_ip = 'unknown'
 
     def _add_percent_bar(self, percent, x, y):
         if percent <= 80:
@@ -1929,6 +1949,8 @@ class SystemInfo(Widget):
         self._update_ip_info()
 
     def _on_update(self):
+        self._check_ip_info()
+
         current_time = time.time()
         if current_time - self._last_update > self._update_interval:
             self._update_info()
@@ -1994,8 +2016,9 @@ class Time(Widget):
     def __init__(self, parent):
         super(Time, self).__init__(parent, 0, 0)
 
-        self.date_str = dt.now().strftime("%A, %b %d")
-        self.time_str = dt.now().strftime("%H:%M")
+        now = dt.fromtimestamp(time.time())
+        self.date_str = now.strftime("%A, %b %d")
+        self.time_str = now.strftime("%H:%M")
 
         self.date_font = pygame.font.SysFont(self.default_font_name, 30)
         self.time_font = pygame.font.SysFont(self.default_font_name, 65)
@@ -2004,8 +2027,9 @@ class Time(Widget):
         pass
 
     def _on_update(self):
-        self.date_str = dt.now().strftime("%A, %b %d")
-        self.time_str = dt.now().strftime("%H:%M")
+        now = dt.fromtimestamp(time.time())
+        self.date_str = now.strftime("%A, %b %d")
+        self.time_str = now.strftime("%H:%M")
 
     def _on_draw(self, screen):
         date_text = self.date_font.render(self.date_str, True, self._get_color('white'))
@@ -2019,8 +2043,9 @@ class NightTime(Time):
     def __init__(self, parent):
         super(NightTime, self).__init__(parent)
 
-        self.date_str = dt.now().strftime("%A, %b %d")
-        self.time_str = dt.now().strftime("%H:%M")
+        now = dt.fromtimestamp(time.time())
+        self.date_str = now.strftime("%A, %b %d")
+        self.time_str = now.strftime("%H:%M")
         self.night_date_font = pygame.font.SysFont(self.default_font_name, 50)
         self.night_time_font = pygame.font.SysFont(self.default_font_name, 150)
 
@@ -2063,16 +2088,18 @@ class Content(Widget):
     def _on_setup(self):
         self.content_texts = []
         x, y = self.x, self.y
+        # the text wraps in what the prefix leaves of max_width, which is kept as is for the next setup
+        max_width = self.max_width
         if self.prefix:
             self.prefix_text = self.font.render(self.prefix, True, self.color)
             self.content_texts.append([self.prefix, [x, y]])
             self.prefix_width = self.prefix_text.get_width()
             self.prefix_height = self.prefix_text.get_height()
             x += self.prefix_width
-            self.max_width -= self.prefix_width
+            max_width -= self.prefix_width
 
         content_text = self.font.render(str(self.text), True, self.color)
-        if self.max_width <= 0 or content_text.get_width() <= self.max_width:
+        if max_width <= 0 or content_text.get_width() <= max_width:
             self.content_texts.append([self.text, [x, y]])
             return
 
@@ -2082,7 +2109,7 @@ class Content(Widget):
         space_width = self.font.render(' ', True, self.color).get_width()
         for word in words:
             word_width = self.font.render(word, True, self.color).get_width()
-            if current_width + word_width + space_width > self.max_width:
+            if current_width + word_width + space_width > max_width:
                 line = ' '.join(line_words)
                 line_text = self.font.render(line, True, self.color)
                 self.content_texts.append([line, [x, y]])
@@ -2277,7 +2304,6 @@ class Search(Widget):
     def _search(self):
         self._page_index = 0
         self._search_result_pages = []
-        page_contents = []
         
         search_str = self._search_str_widget.get_text()
         if not search_str or search_str.isspace():
@@ -2296,11 +2322,15 @@ class Search(Widget):
         except requests.exceptions.Timeout:
             self._display_error("Request Timeout. Please check Internet status.")
             return
+        registry.observe("fetch_seconds", res.elapsed.total_seconds(), source="search")
 
+        # imported on the first search instead of at startup, it takes a while to load
+        from bs4 import BeautifulSoup
         soup = BeautifulSoup(res.content, 'html.parser')
         search_results = soup.find_all('li', class_="b_algo")
 
         item_x, item_y = self._search_result_pos
+        title_contents = []
         for item in search_results:
             title = item.find('h2').get_text()
 
@@ -2309,19 +2339,17 @@ class Search(Widget):
                                     max_width=self.max_width, 
                                     prefix="- ")
             title_content.setup()
-            item_y += title_content.get_height()
-
-            if item_y > self.y + self.max_height:
-                item_y = self._search_result_pos[1]
-                title_content.set_pos(item_x, item_y)
-                title_content.setup()
-                self._search_result_pages.append(page_contents)
-                page_contents = []
-
-            page_contents.append(title_content)
-
-        if page_contents:
+            title_contents.append(title_content)
+
+        # the results are measured once and split into pages from their offsets
+        result_offsets = VirtualList(content.get_height() for content in title_contents)
+        for start, end in result_offsets.get_pages(self.y + self.max_height - item_y):
+            page_contents = title_contents[start:end]
+            for ind, title_content in enumerate(page_contents, start):
+                title_content.set_pos(item_x, item_y + result_offsets.get_offset(ind) - result_offsets.get_offset(start))
             self._search_result_pages.append(page_contents)
+
+        if title_contents:
             self._search_str_widget.set_active(False)
         else:
             self._display_error("Can't find anything about {}...".format(search_str))
@@ -2532,6 +2560,8 @@ class Chart(Widget):
         self.background_color = background_color
         self.background_alpha = background_alpha
 
+        self._curve_cache = {}
+
     def _on_setup(self):
         pass
 
@@ -2593,25 +2623,32 @@ class Chart(Widget):
         x_unit_distance = float(self.width) / (self.max_x - self.min_x - 1) * self.x_unit
         y_unit_distance = float(self.height) / (self.max_y - self.min_y) * self.y_unit
         for key, vals in self.info.items():
-            if isinstance(vals, queue.Queue) and vals.qsize() <= 1:
-                continue
-            elif isinstance(vals, list) and len(vals) <= 1:
+            val_list = vals.queue if isinstance(vals, queue.Queue) else vals
+            if len(val_list) <= 1:
                 continue
 
-            points = []
-            val_list = vals if isinstance(vals, list) else vals.queue
-            for ind, val in enumerate(reversed(val_list)):
+            # missing values break the curve into separate lines
+            segments = [[]]
+            for ind, val in self._get_curve_values(key, vals, val_list):
+                if math.isnan(val):
+                    if segments[-1]:
+                        segments.append([])
+                    continue
                 pos_x = int(self.x + x_unit_distance * (ind - self.min_x))
                 pos_y = int(self.y + self.height - y_unit_distance * (val - self.min_y))
                 if pos_x <= self.x + self.width:
-                    points.append((pos_x, pos_y))
+                    segments[-1].append((pos_x, pos_y))
 
             color_name = self.info_colors.get(key) if self.info_colors else "white"
             color = self._get_color(color_name)
             if not color:
                 color = self._get_color('white')
-            curve = Lines(color, False, points, anti_alias=False, width=self.line_width)
-            self.add_shape(curve)
+            for points in segments:
+                if points:
+                    # a single point is drawn as a line to itself
+                    curve = Lines(color, False, points if len(points) > 1 else points * 2,
+                                  anti_alias=False, width=self.line_width)
+                    self.add_shape(curve)
 
         for constant in self.constants:
             y = int(self.y + self.height - y_unit_distance * (constant - self.min_y))
@@ -2621,11 +2658,37 @@ class Chart(Widget):
             self.add_shape(Text(rendered_label_text, (self.x + self.width - rendered_label_text.get_width(),
                                                       y - rendered_label_text.get_height())))
 
+    def _get_curve_values(self, key, vals, val_list):
+        """Return (index, value) pairs of a curve, oldest first, with at most one point per pixel column.
+        Missing values are NaN, and a NaN value is kept between points reduced across missing ones"""
+        if len(val_list) <= self.width:
+            return enumerate(reversed(val_list))
+
+        cached = self._curve_cache.get(key)
+        if cached and cached[0] is vals:
+            return cached[1]
+
+        values = np.asarray(val_list, dtype=np.float64)[::-1]
+        missing = np.isnan(values)
+        present = np.flatnonzero(~missing)
+        indices = present[lttb(values[present], self.width)].tolist()
+        missing_count = np.cumsum(missing)
+        curve = []
+        for ind in indices:
+            if curve and missing_count[ind] != missing_count[curve[-1][0]]:
+                curve.append((ind, float('nan')))
+            curve.append((ind, float(values[ind])))
+        if isinstance(vals, np.ndarray):
+            # arrays are replaced rather than modified, so the reduced curve can be reused across frames
+            self._curve_cache[key] = (vals, curve)
+        return curve
+
     def _on_draw(self, screen):
         pass
 
     def reset(self):
         self.info = None
+        self._curve_cache = {}
         self.clear_shapes()
         self._add_axis()
 
@@ -2642,6 +2705,12 @@ class Chart(Widget):
         self.min_x = min_x
         self.max_x = max_x
 
+    def set_x_unit(self, x_unit):
+        self.x_unit = x_unit
+
+    def set_x_label_interval(self, x_label_interval):
+        self.x_label_interval = x_label_interval
+
     def set_y_range(self, min_y, max_y):
         self.min_y = min_y
         self.max_y = max_y
@@ -2755,6 +2824,7 @@ class Map(Widget):
 
         try:
             direction_res = requests.get(self._direction_url, params=self._direction_payload)
+            registry.observe("fetch_seconds", direction_res.elapsed.total_seconds(), source="directions")
             self._direction_info = direction_res.json()
         except ConnectionError:
             self._direction_info = {}
@@ -2791,6 +2861,7 @@ class Map(Widget):
         polyline_x = self._map_x + (self.map_width - polyline_width) // 2
         polyline_y = self._map_y + (self.map_height - polyline_height) // 2
 
+        import polyline
         points = polyline.decode(self._direction_info['routes'][0]['overview_polyline']['points'])
         latitudes = [point[0] for point in points]
         longitudes = [point[1] for point in points]
@@ -2907,10 +2978,7 @@ class Map(Widget):
         self._dest_widget.bind_key(pygame.K_UP, self._toggle_input_widget)
 
         for mode in self._modes:
-            image_path = os.path.join(self._icon_directory, mode + ".png")
-            image = pygame.image.load(image_path)
-            image = pygame.transform.scale(image, (self._icon_size, self._icon_size))
-            self._icons.append(image.convert_alpha())
+            self._icons.append(assets.get(os.path.join(self._icon_directory, mode + ".png"), self._icon_size))
 
     def _on_update(self):
         pass
@@ -2957,9 +3025,11 @@ class Map(Widget):
 
 
 class Camera(Widget):
-    def __init__(self, parent, x, y):
+    def __init__(self, parent, x, y, source=0, source_fps=0):
         super(Camera, self).__init__(parent, x, y)
 
+        self.source = source
+        self.source_fps = source_fps
         self.camera = None
 
         self._camera_font = pygame.font.Font("fonts/FreeSans.ttf", 15)
@@ -2968,33 +3038,34 @@ class Camera(Widget):
         self._camera_resolution = (self._screen_width, self._screen_height)
         self._camera_framerate = 0
         self._frame = None
+        self._frame_sequence = 0
+        self._frame_surface = None
+        self._frame_surface_ready = False
         self._frame_last_update = time.time()
         self._text_last_update = time.time()
         self._camera_paused = False
+        self._camera_stop_timeout = 1
 
     def _on_setup(self):
         pass
 
     def _on_update(self):
         if self.camera:
-            ret, self._frame = self.camera.read()
+            sequence, frame = self.camera.get_frame(self._frame_sequence)
+            if sequence != self._frame_sequence:
+                self._frame_sequence = sequence
+                self._frame = frame
+                self._frame_surface_ready = False
 
     def _on_draw(self, screen):
-        if self._frame is None or not self._frame.any():
+        if self._frame is None:
             self._draw_message(screen)
             return
 
-        image_arr = cv2.cvtColor(self._frame, cv2.COLOR_BGR2RGB)
-
-        image = Image.fromarray(image_arr)
-
-        mode = image.mode
-        size = image.size
-        data = image.tobytes()
-
-        rendered_image = pygame.image.fromstring(data, size, mode)
-        rotated_image = pygame.transform.rotate(rendered_image, self._camera_rotation)
-        screen.blit(rotated_image, (0, 0))
+        if not self._frame_surface_ready:
+            self._load_frame_surface()
+            self._frame_surface_ready = True
+        screen.blit(self._frame_surface, (0, 0))
 
         self._add_framerate(screen)
 
@@ -3010,13 +3081,40 @@ class Camera(Widget):
                                         120, color=self._get_color('black'))
             screen.blit(message_text, (message_x, message_y))
 
+    def _load_frame_surface(self):
+        # rotate and swap BGR to RGB with array views, so the frame is only copied
+        # once, straight into the pixels of a surface that is reused across frames
+        rotated_frame = np.rot90(self._frame, self._camera_rotation // 90)
+        frame_pixels = rotated_frame.swapaxes(0, 1)[:, :, ::-1]
+        frame_size = frame_pixels.shape[:2]
+        if self._frame_surface is None or self._frame_surface.get_size() != frame_size:
+            self._frame_surface = pygame.Surface(frame_size)
+
+        # copying channel by channel is noticeably faster than one strided copy
+        surface_pixels = pygame.surfarray.pixels3d(self._frame_surface)
+        for channel in range(3):
+            surface_pixels[:, :, channel] = frame_pixels[:, :, channel]
+        del surface_pixels
+
     def _on_enter(self):
-        self.camera = cv2.VideoCapture(0)
+        if self.source == "test":
+            self.camera = CaptureThread(test_pattern(*self._camera_resolution[::-1]), fps=self.source_fps or 30)
+        else:
+            self.camera = CaptureThread(self.source, fps=self.source_fps)
+        # the paused frame of the last session is dropped, instead of showing until the first new one
+        self._frame = None
+        self._frame_surface_ready = False
+        self._frame_sequence = 0
         self._camera_paused = False
+        self.camera.start()
     
     def _on_exit(self):
         if self.camera:
-            self.camera.release()
+            # the device is released before returning, so entering again right away can open it
+            self.camera.stop()
+            self.camera.join(self._camera_stop_timeout)
+            if self.camera.is_alive():
+                log_to_file("Camera capture did not stop within {} s".format(self._camera_stop_timeout))
             self._camera_paused = True
 
         self.camera = None
@@ -3030,7 +3128,9 @@ class Camera(Widget):
             self._camera_framerate = int(1.0 / update_interval)
             self._text_last_update = current_time
 
-        framerate_text = self._camera_font.render("FPS: {}".format(self._camera_framerate), True, self._get_color('green'))
+        capture_framerate = self.camera.capture_fps if self.camera else 0
+        framerate_text = self._camera_font.render("FPS: {} | Capture: {}".format(self._camera_framerate, capture_framerate),
+                                                  True, self._get_color('green'))
         screen.blit(framerate_text, (10, 10))
 
     def _draw_message(self, screen):
@@ -3058,7 +3158,9 @@ class List(Widget):
         self.item_font = pygame.font.Font("fonts/FreeSans.ttf", 17)
 
         self._selected_ind = 0
+        self._start_index = 0
         self._rendered_texts = []
+        self._item_offsets = VirtualList()
         self._selector_color = self._get_color("lightblue")
         self._selector_size = 10
 
@@ -3074,6 +3176,7 @@ class List(Widget):
         for item in self.items:
             rendered_item = self.item_font.render(item, True, self._get_color("white"))
             self._rendered_texts.append(rendered_item)
+        self._item_offsets.set_heights(text.get_height() + self.line_padding for text in self._rendered_texts)
 
     def _on_update(self):
         pass
@@ -3083,7 +3186,9 @@ class List(Widget):
             return
 
         x, y = self.x, self.y
-        for ind, text in enumerate(self._rendered_texts):
+        end = self._item_offsets.get_end(self._start_index, self.max_height)
+        for ind in range(self._start_index, end):
+            text = self._rendered_texts[ind]
             if not self.selectable:
                 screen.blit(text, (x, y))
             else:
@@ -3110,18 +3215,24 @@ class List(Widget):
             return
 
         self._selected_ind -= 1
+        self._scroll_to_selected()
 
     def _row_down(self):
         if not self.items or self._selected_ind == len(self.items) - 1:
             return
 
         self._selected_ind += 1
+        self._scroll_to_selected()
+
+    def _scroll_to_selected(self):
+        self._start_index = self._item_offsets.scroll_to(self._start_index, self._selected_ind, self.max_height)
 
     def get_selected(self):
         return self._selected_ind
 
     def reset(self):
         self._selected_ind = 0
+        self._start_index = 0
 
 
 class Calculator(Widget):
@@ -3255,6 +3366,7 @@ class QRCode(Widget):
                                    font=self._input_font, width=self.width,
                                    enter_key_event=self._validate_and_generate)
 
+        import qrcode
         self._total_levels = 4
         self._level = 1
         self._levels = [qrcode.constants.ERROR_CORRECT_L, qrcode.constants.ERROR_CORRECT_M,
@@ -3264,6 +3376,12 @@ class QRCode(Widget):
         self._setting_width = 150
         self._qr_text = ''
         self._qr_image = None
+        self._qr_key = None
+        self._qr_queue = queue.Queue()
+        # keys being generated, so asking again before a code is ready doesn't start another worker
+        self._qr_pending = set()
+        self._qr_cache = OrderedDict()
+        self._qr_cache_size = 32
         self._qr_padding = 20
         self._qr_image_size = self.height - self._input_font_height - self._qr_padding * 2
         self._qr_image_x = self._input_x + (self.width - self._qr_image_size + self._setting_width) // 2
@@ -3323,7 +3441,18 @@ class QRCode(Widget):
         self.add_shape(DashLine(line_color, bl, tl, dash_length=line_dash_length, width=line_width))
 
     def _on_update(self):
-        pass
+        while not self._qr_queue.empty():
+            key, pixels = self._qr_queue.get()
+            self._qr_pending.discard(key)
+            if pixels is False:
+                # not cached, so generating the same code again retries it
+                if key == self._qr_key:
+                    self._qr_image = None
+                continue
+            image = None if pixels is None else pygame.surfarray.make_surface(pixels)
+            self._cache_qr_image(key, image)
+            if key == self._qr_key:
+                self._show_qr_image(image)
 
     def _on_draw(self, screen):
         if self._qr_image is None:
@@ -3369,21 +3498,33 @@ class QRCode(Widget):
 
         self._qr_text = input_text
 
-        qr = qrcode.QRCode(
-            version=None,
-            error_correction=self._levels[self._level],
-            box_size=10,
-            border=1,
-        )
-        qr.add_data(self._qr_text)
-        qr.make(fit=True)
-
-        image = qr.make_image(fill_color='black', back_color='white')
-        image_mode = 'RGB'
-        image = image.convert(image_mode)
-        raw_str = image.tobytes('raw', image_mode)
-        image = pygame.image.fromstring(raw_str, image.size, image.mode)
-        self._qr_image = pygame.transform.scale(image, (self._qr_image_size, self._qr_image_size))
+        version_text = self._version_input.get_text()
+        version = None if version_text.lower() == self._version_default else int(version_text)
+        self._qr_key = (self._qr_text, version, self._levels[self._level])
+        if self._qr_key in self._qr_cache:
+            self._qr_cache.move_to_end(self._qr_key)
+            self._show_qr_image(self._qr_cache[self._qr_key])
+            return
+        if self._qr_key in self._qr_pending:
+            return
+
+        # the matrix is built and scaled on a worker, so long inputs don't stall the frame
+        self._qr_pending.add(self._qr_key)
+        QRCodeThread(self._qr_queue, self._qr_key, self._qr_image_size).start()
+
+    def _cache_qr_image(self, key, image):
+        self._qr_cache[key] = image
+        self._qr_cache.move_to_end(key)
+        while len(self._qr_cache) > self._qr_cache_size:
+            self._qr_cache.popitem(last=False)
+
+    def _show_qr_image(self, image):
+        self._qr_image = image
+        if image is None:
+            # the text doesn't fit in the selected version
+            self._version_widget.set_text_color(self._get_color('red'))
+        else:
+            self._version_widget.set_text_color(self._get_color('white'))
 
     def _toggle_input_widget(self):
         if self._input_widget.is_active:
@@ -3416,6 +3557,9 @@ class QRCode(Widget):
                                                                   new_level_text)
         self._level_widget.set_text(self._level_widget_text)
 
+        if self._qr_text:
+            self._validate_and_generate()
+
     def _draw_background(self, screen):
         self._draw_transparent_rect(screen, 0, 0, self._screen_width, self._screen_height,
                                     self._background_alpha, color=self._get_color('black'))
@@ -3428,6 +3572,7 @@ class QRCode(Widget):
         self._input_widget.reset()
         self._qr_text = ''
         self._qr_image = None
+        self._qr_key = None
 
 
 class StatusBar(Widget):
@@ -3446,11 +3591,7 @@ class StatusBar(Widget):
         self.internet_status = "no-internet"
 
     def _on_setup(self):
-        for image_path in glob.glob(os.path.join(self._internet_icon_dir, '*')):
-            image_name = os.path.basename(image_path).split('.')[0]
-            image = pygame.image.load(image_path)
-            image = pygame.transform.scale(image, (self._internet_icon_size, self._internet_icon_size))
-            self._internet_icons[image_name] = image.convert_alpha()
+        self._internet_icons = assets.get_directory(self._internet_icon_dir, self._internet_icon_size, pattern='*')
         
         self._update_internet_status()
 
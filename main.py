@@ -13,6 +13,20 @@ if __name__ == '__main__':
                         default=False, help="enable debug mode")
     parser.add_argument('-r', '--dryrun', action='store', type=int,
                         default=-1, help="dryrun testing, time in seconds")
+    parser.add_argument('--profile', action='store_true',
+                        default=False, help="record frame timings from the start, F11 shows them and F12 saves them")
+    parser.add_argument('--record', action='store',
+                        default=None, help="record input events to this file")
+    parser.add_argument('--replay', action='store',
+                        default=None, help="replay input events from a recording")
+    parser.add_argument('--replay-speed', action='store', choices=["real", "max"],
+                        default="real", help="replay at the recorded frame rate or as fast as possible")
+    parser.add_argument('--seed', action='store', type=int,
+                        default=None, help="seed of the random generators, recordings keep their own")
+    parser.add_argument('--metrics-port', action='store', type=int,
+                        default=None, help="serve Prometheus metrics on this local port")
+    parser.add_argument('--metrics-file', action='store',
+                        default=None, help="write Prometheus metrics to this file")
     args = parser.parse_args()
     app = App(args=args)
     app.start()